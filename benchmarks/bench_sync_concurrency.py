@@ -0,0 +1,72 @@
+"""Wall time of ``Generator.sync`` against ``FakeStrava`` per detail concurrency.
+
+    python -m benchmarks.bench_sync_concurrency --latency 0.1 --workers 1 2 4 8
+
+Each run syncs into a fresh temporary database, so every level performs the
+same requests; only the number of overlapping ``get_activity`` calls changes.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import os
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+import stravalib
+
+from benchmarks.fake_strava import FakeStrava, make_activities
+from generator import Generator
+
+
+def run_sync(fake: FakeStrava, db_path: Path, workers: int) -> float:
+    with contextlib.redirect_stdout(io.StringIO()):
+        generator = Generator(str(db_path), detail_workers=workers)
+        generator.client = stravalib.Client(requests_session=fake.session())
+        generator.set_strava_config("client-id", "client-secret", "refresh-token")
+        started = time.perf_counter()
+        try:
+            generator.sync(False)
+        finally:
+            generator.close()
+    return time.perf_counter() - started
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--activities", type=int, default=40)
+    parser.add_argument(
+        "--latency", type=float, default=0.05, help="Seconds per fake request."
+    )
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args(argv)
+    os.environ.setdefault("SILENCE_TOKEN_WARNINGS", "true")
+
+    with FakeStrava(make_activities(args.activities), args.latency) as fake:
+        print(
+            f"{'workers':>7} {'details':>7} {'rows':>5} {'seconds':>8} {'speedup':>7}"
+        )
+        baseline = None
+        for workers in args.workers:
+            with tempfile.TemporaryDirectory() as tmp:
+                db_path = Path(tmp) / "data.db"
+                before = fake.requests["detail"]
+                elapsed = run_sync(fake, db_path, workers)
+                details = fake.requests["detail"] - before
+                with contextlib.closing(sqlite3.connect(db_path)) as connection:
+                    (rows,) = connection.execute(
+                        "SELECT COUNT(*) FROM activities"
+                    ).fetchone()
+            baseline = baseline or elapsed
+            print(
+                f"{workers:>7} {details:>7} {rows:>5} {elapsed:>8.3f} "
+                f"{baseline / elapsed:>6.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""End-to-end ``run_strava_sync`` throughput against ``FakeStrava``.
+
+    python -m benchmarks.bench_sync_e2e --activities 500 --latency 0.05
+
+Runs the real sync entry point (token refresh, paging, details, parsing,
+chunked commits, rate-limit budget, CSV export) into a temporary database and
+reports activities/s, the requests the fake served and the time spent
+writing to SQLite. ``--error-rate`` / ``--drop-rate`` inject 5xx responses and
+dropped connections; ``StravaSession`` retries them (``--retries``), and the
+report shows the retries and, if they ran out, how far the sync got.
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fake_strava import FakeStrava, make_activities
+from generator import DEFAULT_DETAIL_WORKERS
+from generator.rate_limit import RequestBudget
+from generator.strava_http import DEFAULT_RETRIES
+from pushup_page.strava_sync import export_activities_to_csv, run_strava_sync
+
+
+def run_once(fake: FakeStrava, workdir: Path, workers: int, retries: int) -> dict:
+    db_path = str(workdir / "data.db")
+    budget = RequestBudget(workdir / "rate-limit.json", reserve=0)
+    error = None
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        try:
+            stats = run_strava_sync(
+                client_id="client-id",
+                client_secret="client-secret",
+                refresh_token="refresh-token",
+                export_csv=False,
+                detail_workers=workers,
+                budget=budget,
+                db_path=db_path,
+                requests_session=fake.mount(
+                    budget.session(retries=retries, pool_size=workers)
+                ),
+            )
+        except Exception as exc:  # injected errors surface as stravalib faults
+            stats, error = None, exc
+        sync_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        exported = export_activities_to_csv(db_path, str(workdir / "pushups.csv"))
+        export_seconds = time.perf_counter() - started
+    return {
+        "stats": stats,
+        "error": error,
+        "sync_seconds": sync_seconds,
+        "exported": exported,
+        "export_seconds": export_seconds,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--activities", type=int, default=300)
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="Seconds per fake request."
+    )
+    parser.add_argument("--workers", type=int, default=DEFAULT_DETAIL_WORKERS)
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Share of failed API calls."
+    )
+    parser.add_argument(
+        "--drop-rate", type=float, default=0.0, help="Share of dropped connections."
+    )
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES)
+    args = parser.parse_args(argv)
+    os.environ.setdefault("SILENCE_TOKEN_WARNINGS", "true")
+
+    with (
+        FakeStrava(
+            make_activities(args.activities),
+            args.latency,
+            error_rate=args.error_rate,
+            drop_rate=args.drop_rate,
+        ) as fake,
+        tempfile.TemporaryDirectory() as tmp,
+    ):
+        result = run_once(fake, Path(tmp), args.workers, args.retries)
+
+    stats = result["stats"]
+    stored = result["exported"]
+    print(
+        f"{args.activities} activities, {args.latency * 1000:.0f} ms latency, "
+        f"{args.workers} detail workers"
+    )
+    if result["error"] is not None:
+        print(f"sync stopped: {type(result['error']).__name__}: {result['error']}")
+    print(
+        f"  sync:      {result['sync_seconds']:.3f}s, "
+        f"{stored / result['sync_seconds']:.1f} stored activities/s"
+    )
+    if stats is not None:
+        print(
+            f"  db writes: {stats['db_write_seconds'] * 1000:.1f} ms "
+            f"({stats['created']} created, {stats['updated']} updated)"
+        )
+        print(f"  retries:   {stats['http_retries']}")
+    print(f"  csv:       {result['export_seconds'] * 1000:.1f} ms, {stored} rows")
+    print(
+        "  requests:  "
+        + ", ".join(f"{name}={count}" for name, count in sorted(fake.requests.items()))
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""A local stand-in for the parts of the Strava API that ``Generator`` uses.
+
+``FakeStrava`` serves ``POST /oauth/token``, ``GET /api/v3/athlete/activities``
+(paged, honouring ``after``/``before``) and ``GET /api/v3/activities/{id}``
+from a generated data set, with rate-limit headers, optional injected errors
+and ``latency`` seconds of delay per request so benchmarks see realistic
+round trips.
+``FakeStrava.session()`` returns a ``requests.Session`` that redirects
+``https://www.strava.com`` to the fake, for ``stravalib.Client(requests_session=...)``.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import json
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+STRAVA_URL = "https://www.strava.com"
+FIRST_START = dt.datetime(2025, 1, 1, 7, 30, tzinfo=dt.timezone.utc)
+
+
+def make_activities(count: int, *, start: dt.datetime = FIRST_START) -> list[dict]:
+    """Detailed activity payloads, one per day, every fifth one not a push-up."""
+    activities = []
+    for i in range(count):
+        start_date = start + dt.timedelta(days=i)
+        pushups = i % 5 != 4
+        reps = 40 + i % 30
+        activities.append(
+            {
+                "id": 10_000_000_000 + i,
+                "resource_state": 3,
+                "name": "Push-Ups" if pushups else "Morning Run",
+                "type": "Workout" if pushups else "Run",
+                "sport_type": "Workout" if pushups else "Run",
+                "start_date": start_date.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "start_date_local": start_date.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "timezone": "(GMT+00:00) Africa/Abidjan",
+                "elapsed_time": 60 + i % 120,
+                "moving_time": 60 + i % 120,
+                "distance": 0.0,
+                "description": (
+                    f"Total Reps: {reps}\n"
+                    "Average Time per Push-Up: 0.67s\n"
+                    f"Burned Calories: {reps * 0.3:.2f}\n\n"
+                    "Data from Puuush App"
+                    if pushups
+                    else None
+                ),
+            }
+        )
+    return activities
+
+
+def _summary(activity: dict) -> dict:
+    return {
+        key: value
+        for key, value in activity.items()
+        if key != "description" and key != "resource_state"
+    } | {"resource_state": 2}
+
+
+def _epoch(activity: dict) -> int:
+    return int(
+        dt.datetime.strptime(activity["start_date"], "%Y-%m-%dT%H:%M:%S%z").timestamp()
+    )
+
+
+class FakeStrava:
+    """Serve ``activities`` like the Strava API.
+
+    ``error_rate`` is the share of list/detail requests answered with
+    ``error_status``, ``drop_rate`` the share whose connection is closed
+    without an answer (both decided by a seeded RNG, so runs are repeatable).
+    ``rate_limits`` are the 15-minute and daily read limits reported in the
+    rate-limit headers; API requests beyond the 15-minute one get a 429.
+    ``requests`` counts requests per endpoint and per injected failure.
+    """
+
+    def __init__(
+        self,
+        activities: list[dict] | None = None,
+        latency: float = 0.0,
+        *,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        drop_rate: float = 0.0,
+        rate_limits: tuple[int, int] = (600, 30_000),
+        seed: int = 0,
+    ):
+        self.activities = activities if activities is not None else make_activities(30)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.drop_rate = drop_rate
+        self.rate_limits = rate_limits
+        self.requests: Counter[str] = Counter()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        assert self._server is not None, "FakeStrava is not running"
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> FakeStrava:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive like the real API; without TCP_NODELAY the split
+            # header/body writes stall on delayed ACKs
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                fake._handle(self, "GET")
+
+            def do_POST(self):
+                fake._handle(self, "POST")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-strava", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> FakeStrava:
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def mount(self, session: requests.Session) -> requests.Session:
+        """Send ``session``'s Strava requests to this server instead."""
+        session.mount(STRAVA_URL, _RedirectAdapter(STRAVA_URL, self.url))
+        return session
+
+    def session(self) -> requests.Session:
+        """A session that sends Strava API requests to this server."""
+        return self.mount(requests.Session())
+
+    def _handle(self, handler: BaseHTTPRequestHandler, method: str) -> None:
+        if self.latency:
+            time.sleep(self.latency)
+        url = urlsplit(handler.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        if method == "POST":
+            # drain the form body so the connection can be reused
+            handler.rfile.read(int(handler.headers.get("Content-Length") or 0))
+
+        if method == "POST" and url.path == "/oauth/token":
+            endpoint = "token"
+        elif method == "GET" and url.path == "/api/v3/athlete/activities":
+            endpoint = "list"
+        elif method == "GET" and url.path.startswith("/api/v3/activities/"):
+            endpoint = "detail"
+        else:
+            endpoint = "unknown"
+
+        headers = {}
+        with self._lock:
+            self.requests[endpoint] += 1
+            if endpoint in ("list", "detail"):
+                self.requests["api"] += 1
+                usage = self.requests["api"]
+                headers = {
+                    "X-ReadRateLimit-Limit": "{},{}".format(*self.rate_limits),
+                    "X-ReadRateLimit-Usage": f"{usage},{usage}",
+                }
+                roll = self._random.random()
+                if usage > self.rate_limits[0]:
+                    endpoint = "rate_limited"
+                elif roll < self.error_rate:
+                    endpoint = "error"
+                elif roll < self.error_rate + self.drop_rate:
+                    endpoint = "dropped"
+                if endpoint in ("rate_limited", "error", "dropped"):
+                    self.requests[endpoint] += 1
+
+        if endpoint == "dropped":
+            handler.close_connection = True
+            return
+
+        if endpoint == "token":
+            status, body = 200, {
+                "access_token": "fake-access-token",
+                "refresh_token": "fake-refresh-token",
+                "expires_at": int(time.time()) + 6 * 3600,
+            }
+        elif endpoint == "list":
+            status, body = 200, self._list(query)
+        elif endpoint == "detail":
+            status, body = self._detail(url.path.rsplit("/", 1)[-1])
+        elif endpoint == "rate_limited":
+            status, body = 429, {"message": "Rate Limit Exceeded", "errors": []}
+        elif endpoint == "error":
+            status, body = self.error_status, {"message": "Injected error"}
+        else:
+            status, body = 404, {"message": "Record Not Found", "errors": []}
+
+        payload = json.dumps(body).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(payload)))
+        for name, value in headers.items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def _list(self, query: dict[str, str]) -> list[dict]:
+        activities = self.activities
+        if "after" in query:
+            after = int(float(query["after"]))
+            activities = [a for a in activities if _epoch(a) > after]
+        if "before" in query:
+            before = int(float(query["before"]))
+            activities = [a for a in activities if _epoch(a) < before]
+        page = int(query.get("page", 1))
+        per_page = int(query.get("per_page", 30))
+        page_items = activities[(page - 1) * per_page : page * per_page]
+        return [_summary(activity) for activity in page_items]
+
+    def _detail(self, activity_id: str) -> tuple[int, dict]:
+        for activity in self.activities:
+            if str(activity["id"]) == activity_id:
+                return 200, activity
+        return 404, {"message": "Record Not Found", "errors": []}
+
+
+class _RedirectAdapter(HTTPAdapter):
+    def __init__(self, prefix: str, target: str) -> None:
+        super().__init__()
+        self.prefix = prefix
+        self.target = target
+
+    def send(self, request, **kwargs):
+        request.url = self.target + request.url[len(self.prefix) :]
+        return super().send(request, **kwargs)
@@ -1,38 +1,193 @@
 from __future__ import annotations
 
 import datetime as dt
+import queue
 import re
 import sys
-from typing import Iterable
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, Iterator, NamedTuple
+from urllib.parse import urlsplit
 
-import arrow
+import requests
 import stravalib
-from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+from stravalib.model import DetailedActivity
 
-from .db import Activity, init_db, update_or_create_activity
+from .db import (
+    SKIP_NO_COUNT,
+    SKIP_NOT_PUSHUPS,
+    SYNC_LOOKBACK,
+    Activity,
+    activity_to_row,
+    advance_backfill_partition,
+    advance_sync_journal,
+    backfill_partitions,
+    bulk_upsert_activities,
+    delete_activities,
+    epoch_to_datetime,
+    finish_backfill_partition,
+    finish_sync_journal,
+    init_db,
+    journal_processed_ids,
+    load_known_fingerprints,
+    open_sync_journal,
+    remember_activities,
+    start_sync_journal,
+    summary_fingerprint,
+    sync_window_start,
+)
+from .description import parse_description
+from .rate_limit import PER_PAGE, RequestBudget
+from .raw_cache import RawActivityCache
+from .strava_http import DEFAULT_RETRIES, DEFAULT_TIMEOUT, StravaSession
 
-COUNT_RE = re.compile(r"Total Reps: (\d+)")
-AVG_RE = re.compile(r"Average Time per Push-Up: (\d+(\.\d+)?)s")
-CALORIES_RE = re.compile(r"Burned Calories: (\d+(\.\d+)?)")
+# the detail request whose response body ``raw_cache`` keeps
+DETAIL_PATH_RE = re.compile(r"/activities/(\d+)$")
+
+# concurrent get_activity requests during a sync; 1 fetches sequentially
+DEFAULT_DETAIL_WORKERS = 4
+# parsed activities written and committed together during a sync (default)
+SYNC_CHUNK_SIZE = 50
+# length of the time partitions a backfill is split into (default)
+BACKFILL_PARTITION_DAYS = 30
+
+
+# SyncItem.skip_reason of summaries whose fingerprint is already known
+UNCHANGED = "unchanged"
+
+
+class SyncItem(NamedTuple):
+    id: int
+    activity: Any
+    fingerprint: str
+    start_epoch: int | None
+    skip_reason: str | None
+
+
+@dataclass
+class SyncChunk:
+    """Work parsed since the last commit of a sync."""
+
+    watermark: int
+    rows: list[dict] = field(default_factory=list)
+    remembered: list[dict] = field(default_factory=list)
+    run_ids: list[int] = field(default_factory=list)
+
+
+def _skip_reason(activity) -> str | None:
+    """``None`` for push-up activities, else why they are not synced."""
+    return None if "push-ups" in str(activity.name).lower() else SKIP_NOT_PUSHUPS
+
+
+def _worker_name(prefix: str) -> str:
+    """Name worker threads after the thread starting them, e.g.
+    ``strava-account_0/strava-detail_1``, so their output can be traced back
+    to it (see ``multi_sync``)."""
+    return f"{threading.current_thread().name}/{prefix}"
+
+
+def _oldest_first(page: list[SyncItem]) -> Iterator[SyncItem]:
+    """A page of summaries sorted by start date (undated ones first, as they
+    cannot move a watermark)."""
+    for item in sorted(page, key=lambda item: item.start_epoch or 0):
+        print("activity", item.id, item.activity.start_date)
+        yield item
+
+
+def _detail_item(activity_detail) -> SyncItem:
+    """A ``SyncItem`` for a detail fetched (or cached) without its summary."""
+    fingerprint, start_epoch = summary_fingerprint(activity_detail)
+    return SyncItem(
+        int(activity_detail.id),
+        activity_detail,
+        fingerprint,
+        start_epoch,
+        _skip_reason(activity_detail),
+    )
+
+
+def _known(run_id, fingerprint, start_epoch, skip_reason=None) -> dict:
+    return {
+        "run_id": int(run_id),
+        "fingerprint": fingerprint,
+        "start_epoch": start_epoch,
+        "skip_reason": skip_reason,
+    }
 
 
 class Generator:
-    def __init__(self, db_path: str):
-        self.client = stravalib.Client()
+    def __init__(
+        self,
+        db_path: str,
+        detail_workers: int = DEFAULT_DETAIL_WORKERS,
+        budget: RequestBudget | None = None,
+        requests_session: requests.Session | None = None,
+        raw_cache: RawActivityCache | None = None,
+        chunk_size: int | None = None,
+        timeout: float | None = None,
+        retries: int = DEFAULT_RETRIES,
+    ):
+        """Without ``requests_session`` a ``StravaSession`` is built, with
+        ``timeout`` (read timeout, seconds) and ``retries``."""
+        if requests_session is None:
+            # pooled, retrying and (with a budget) paced; see strava_http
+            requests_session = StravaSession(
+                budget,
+                timeout=(DEFAULT_TIMEOUT[0], timeout) if timeout else DEFAULT_TIMEOUT,
+                retries=retries,
+                pool_size=detail_workers,
+            )
+        self.requests_session = requests_session
+        self.budget = budget
+        if budget is not None:
+            # the hook reads the usage headers of every response
+            self.client = stravalib.Client(
+                rate_limiter=budget, requests_session=requests_session
+            )
+        else:
+            self.client = stravalib.Client(requests_session=requests_session)
         self.session = init_db(db_path)
+        self.detail_workers = max(1, detail_workers)
+        self.raw_cache = raw_cache
+        # the last detail payload received on each thread, for raw_cache
+        self._payloads = threading.local()
+        if raw_cache is not None:
+            requests_session.hooks["response"].append(self._keep_payload)
+        self.chunk_size = max(1, chunk_size or SYNC_CHUNK_SIZE)
+        self.stats: Counter[str] = Counter()
 
         self.client_id = ""
         self.client_secret = ""
         self.refresh_token = ""
         self.access_token = ""
+        self.expires_at = 0
 
     def close(self) -> None:
         self.session.close()
+        if self.budget is not None:
+            self.budget.close()
 
-    def set_strava_config(self, client_id: str, client_secret: str, refresh_token: str):
+    def set_strava_config(
+        self,
+        client_id: str,
+        client_secret: str,
+        refresh_token: str,
+        access_token: str | None = None,
+        expires_at: int = 0,
+    ):
+        """``access_token``/``expires_at`` from an earlier run are reused by
+        ``ensure_access`` while they are still valid."""
         self.client_id = client_id
         self.client_secret = client_secret
         self.refresh_token = refresh_token
+        if access_token:
+            self.access_token = access_token
+            self.expires_at = int(expires_at or 0)
+            self.client.access_token = access_token
 
     def check_access(self) -> None:
         try:
@@ -51,65 +206,500 @@ class Generator:
         # Update the authdata object
         self.access_token = response["access_token"]
         self.refresh_token = response["refresh_token"]
+        self.expires_at = int(response.get("expires_at") or 0)
 
         self.client.access_token = response["access_token"]
         print("Access ok")
 
-    def sync(self, force: bool, start_date: dt.datetime | None = None) -> None:
+    def ensure_access(self, margin: int = 300) -> bool:
+        """Refresh the access token only if it expires within ``margin``
+        seconds; returns whether it was refreshed."""
+        if self.access_token and self.expires_at - margin > time.time():
+            return False
+        self.check_access()
+        return True
+
+    def sync(
+        self,
+        force: bool,
+        start_date: dt.datetime | None = None,
+        *,
+        lookback: dt.timedelta = SYNC_LOOKBACK,
+    ) -> None:
         """
         Sync activities means sync from strava
+
+        Work happens in a ``sync_journal`` window. An unfinished window left by
+        an interrupted run is resumed at its watermark, skipping the ids it
+        already processed, unless ``start_date`` or ``force`` asks for a
+        different window. A new window (closing the unfinished one) starts at
+        ``start_date`` (default: ``sync_window_start`` with ``lookback``) and
+        ends now.
         """
-        self.check_access()
+        if not self.ensure_access():
+            print("Access ok (cached token)")
 
         print("Start syncing")
-        if start_date:
-            filters = {"after": start_date}
+        start_epoch = int(start_date.timestamp()) if start_date else None
+        journal = open_sync_journal(self.session)
+        if journal is not None and start_epoch is None and not force:
+            print("resuming sync from", epoch_to_datetime(journal.watermark))
+            processed = journal_processed_ids(self.session, journal)
         else:
-            last_activity_date_str = self.session.query(
-                func.max(Activity.start_date)
-            ).scalar()
-            print("last activity date:", last_activity_date_str)
-            if last_activity_date_str:
-                last_activity_date = arrow.get(last_activity_date_str)
-                last_activity_date = last_activity_date.shift(days=-7)
-                filters = {"after": last_activity_date.datetime}
-            else:
-                filters = {"before": dt.datetime.now(dt.timezone.utc)}
-        activities = list(self.client.get_activities(**filters, limit=10))
-
-        for activity in activities:
-            print("activity", activity.id, activity.start_date)
-            if "push-ups" not in str(activity.name).lower():
-                continue
+            if start_epoch is None:
+                start_epoch = sync_window_start(self.session, lookback) or 0
+            now = int(dt.datetime.now(dt.timezone.utc).timestamp())
+            journal = start_sync_journal(self.session, start_epoch, now)
+            self.session.commit()
+            processed = set()
+        # ``after`` is exclusive; step back a second for ids sharing the watermark
+        after = journal.watermark - 1 if processed else journal.watermark
+        filters = {
+            "after": epoch_to_datetime(after),
+            "before": epoch_to_datetime(journal.window_end),
+        }
 
-            activity_detail = self.client.get_activity(activity.id)
-            # description='Total Reps: 57\nAverage Time per Push-Up: 0.67s\nBurned Calories: 18.06\n\nData from Puuush App\nhttps://puuush.wsfu.co/andyzhou'
-            desc = activity_detail.description
-            # get count ,avg, coliries, from description
-            if not desc or "Total Reps" not in desc:
-                print(f"skip activity {activity.id} since no count found")
-                continue
+        # run_id -> summary fingerprint of activities that need no detail fetch
+        known = {} if force else load_known_fingerprints(self.session, after)
 
-            count_match = COUNT_RE.search(desc)
-            avg_match = AVG_RE.search(desc)
-            calories_match = CALORIES_RE.search(desc)
+        self.stats = Counter()
+        chunk = SyncChunk(watermark=journal.watermark)
+        try:
+            for item, activity_detail in self.fetch_details(
+                self.iter_summaries(filters, known, processed),
+                wanted=lambda item: item.skip_reason is None,
+            ):
+                if len(chunk.run_ids) >= self.chunk_size:
+                    self.write_chunk(chunk, journal)
+                chunk.run_ids.append(item.id)
+                if item.start_epoch is not None:
+                    chunk.watermark = max(chunk.watermark, item.start_epoch)
 
-            count = int(count_match.group(1)) if count_match else 0
-            avg_time = float(avg_match.group(1)) if avg_match else 0.0
-            calories = float(calories_match.group(1)) if calories_match else 0.0
+                self.add_detail(chunk, item, activity_detail)
 
-            created = update_or_create_activity(
-                self.session, activity_detail, count, avg_time, calories
+            self.write_chunk(chunk, journal)
+            finish_sync_journal(self.session, journal)
+            self.session.commit()
+        except stravalib.exc.RateLimitExceeded:
+            # a rate-limit stop keeps everything parsed before it
+            self.write_chunk(chunk, journal)
+            raise
+        finally:
+            print(
+                f"\n{self.stats['created']} activities created, "
+                f"{self.stats['updated']} updated, "
+                f"{self.stats['details']} details fetched, "
+                f"{self.stats['unchanged']} unchanged skipped"
             )
-            if created:
-                sys.stdout.write("+")
-            else:
-                sys.stdout.write(".")
-            sys.stdout.flush()
+
+    def backfill(
+        self,
+        start_date: dt.datetime,
+        end_date: dt.datetime,
+        *,
+        partition_days: int = BACKFILL_PARTITION_DAYS,
+        jobs: int | None = None,
+        force: bool = False,
+    ) -> None:
+        """Import the history in ``[start_date, end_date)`` partition by partition.
+
+        The range is cut into disjoint ``partition_days`` windows, recorded in
+        ``backfill_partitions``. Up to ``jobs`` (default ``detail_workers``)
+        of them are listed and fetched at once, each on its own thread and one
+        request at a time, so they share the rate-limit budget and the
+        connection pool. Their results are parsed and committed here, chunk by
+        chunk together with the partition's watermark; a partition is marked
+        finished once it is exhausted. Running the same range again skips the
+        finished partitions and resumes the others at their watermarks.
+        """
+        if partition_days < 1:
+            raise ValueError(f"partition_days must be at least 1, got {partition_days}")
+        if not self.ensure_access():
+            print("Access ok (cached token)")
+
+        start_epoch = int(start_date.timestamp())
+        end_epoch = int(end_date.timestamp())
+        partitions = backfill_partitions(
+            self.session, start_epoch, end_epoch, partition_days * 24 * 60 * 60
+        )
         self.session.commit()
+        pending = [
+            partition for partition in partitions if partition.finished_at is None
+        ]
+        print(
+            f"Backfilling {start_date} .. {end_date}: "
+            f"{len(pending)} of {len(partitions)} partitions left"
+        )
+        known = {} if force else load_known_fingerprints(self.session, start_epoch)
+        self.stats = Counter()
+        if not pending:
+            return
+
+        jobs = max(1, jobs or self.detail_workers)
+        # (partition index, item, detail); item None ends a partition, and a
+        # detail that is an exception says why it ended early
+        results: queue.Queue = queue.Queue(maxsize=2 * self.chunk_size)
+        stopping = threading.Event()
+
+        def put(entry) -> bool:
+            while not stopping.is_set():
+                try:
+                    results.put(entry, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def fetch_partition(index: int, after: int, before: int) -> None:
+            try:
+                filters = {
+                    "after": epoch_to_datetime(after),
+                    "before": epoch_to_datetime(before),
+                }
+                for item in self.iter_summaries(filters, known):
+                    if stopping.is_set():
+                        return
+                    detail = None
+                    if item.skip_reason is None:
+                        detail = self.get_activity(item.id)
+                    if not put((index, item, detail)):
+                        return
+                put((index, None, None))
+            except Exception as exc:
+                put((index, None, exc))
+
+        chunks = [SyncChunk(watermark=partition.watermark) for partition in pending]
+        executor = ThreadPoolExecutor(
+            max_workers=jobs, thread_name_prefix=_worker_name("strava-backfill")
+        )
+        try:
+            for index, partition in enumerate(pending):
+                # ``after`` is exclusive; step back a second for the window
+                # start or for ids sharing the watermark
+                executor.submit(
+                    fetch_partition,
+                    index,
+                    partition.watermark - 1,
+                    partition.window_end,
+                )
+            remaining = len(pending)
+            while remaining:
+                index, item, activity_detail = results.get()
+                partition, chunk = pending[index], chunks[index]
+                if item is None:
+                    remaining -= 1
+                    if activity_detail is not None:
+                        raise activity_detail
+                    self.write_chunk(chunk, partition=partition)
+                    finish_backfill_partition(self.session, partition)
+                    self.session.commit()
+                    self.stats["partitions"] += 1
+                    continue
+                if len(chunk.run_ids) >= self.chunk_size:
+                    self.write_chunk(chunk, partition=partition)
+                chunk.run_ids.append(item.id)
+                if item.start_epoch is not None:
+                    chunk.watermark = max(chunk.watermark, item.start_epoch)
+                self.add_detail(chunk, item, activity_detail)
+        except stravalib.exc.RateLimitExceeded:
+            # a rate-limit stop keeps everything parsed before it
+            for partition, chunk in zip(pending, chunks):
+                self.write_chunk(chunk, partition=partition)
+            raise
+        finally:
+            stopping.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+            print(
+                f"\n{self.stats['partitions']} of {len(pending)} partitions finished, "
+                f"{self.stats['created']} activities created, "
+                f"{self.stats['updated']} updated, "
+                f"{self.stats['details']} details fetched, "
+                f"{self.stats['unchanged']} unchanged skipped"
+            )
+
+    def add_detail(self, chunk: SyncChunk, item: SyncItem, activity_detail) -> None:
+        """Parse one fetched (or skipped) activity into ``chunk``."""
+        if item.skip_reason == UNCHANGED:
+            self.stats["unchanged"] += 1
+            return
+        if item.skip_reason is not None:
+            chunk.remembered.append(
+                _known(
+                    item.id,
+                    item.fingerprint,
+                    item.start_epoch,
+                    item.skip_reason,
+                )
+            )
+            return
+
+        self.stats["details"] += 1
+        # description='Total Reps: 57\nAverage Time per Push-Up: 0.67s\nBurned Calories: 18.06\n\nData from Puuush App\nhttps://puuush.wsfu.co/andyzhou'
+        parsed = parse_description(activity_detail.description)
+        if not parsed.has_count:
+            print(f"skip activity {item.id} since no count found")
+            self.stats["no_count"] += 1
+            chunk.remembered.append(
+                _known(item.id, item.fingerprint, item.start_epoch, SKIP_NO_COUNT)
+            )
+            return
+        if parsed.missing:
+            print(f"activity {item.id} is missing {', '.join(parsed.missing)}")
+            self.stats["partial"] += 1
+
+        count = parsed.count
+        avg_time = parsed.avg_time or 0.0
+        calories = parsed.calories or 0.0
+
+        try:
+            row = activity_to_row(activity_detail, count, avg_time, calories)
+        except (TypeError, ValueError) as exc:
+            print(f"skip activity {item.id} since it could not be read: {exc}")
+            self.stats["failed"] += 1
+            return
+        chunk.rows.append(row)
+        chunk.remembered.append(_known(item.id, item.fingerprint, item.start_epoch))
+
+    def sync_activities(self, run_ids: Iterable[int]) -> None:
+        """Fetch and store just ``run_ids``, e.g. those named by webhook events.
+
+        Costs one detail request per activity and no listing; ids Strava no
+        longer returns are skipped. The access token must already be valid
+        (see ``ensure_access``).
+        """
+        chunk = SyncChunk(watermark=0)
+        try:
+            for run_id in dict.fromkeys(int(run_id) for run_id in run_ids):
+                try:
+                    activity_detail = self.get_activity(run_id)
+                except stravalib.exc.ObjectNotFound:
+                    print(f"skip activity {run_id} since Strava no longer has it")
+                    self.stats["not_found"] += 1
+                    continue
+                chunk.run_ids.append(run_id)
+                self.add_detail(chunk, _detail_item(activity_detail), activity_detail)
+                if len(chunk.run_ids) >= self.chunk_size:
+                    self.write_chunk(chunk)
+        except stravalib.exc.RateLimitExceeded:
+            # a rate-limit stop keeps everything parsed before it
+            self.write_chunk(chunk)
+            raise
+        self.write_chunk(chunk)
+
+    def reparse(self) -> None:
+        """Rebuild ``activities`` from the payloads in ``raw_cache``, offline.
+
+        Every cached activity goes through the same parsing as a sync;
+        activities synced before the cache existed are left as they are.
+        """
+        if self.raw_cache is None:
+            raise RuntimeError("reparse needs a raw payload cache")
+        self.stats = Counter()
+        try:
+            self.store_details(
+                DetailedActivity.model_validate(payload)
+                for _, payload in self.raw_cache.iter_latest()
+            )
+        finally:
+            print(
+                f"\n{self.stats['created']} activities created, "
+                f"{self.stats['updated']} updated from the raw payload cache"
+            )
+
+    def store_details(self, activities: Iterable) -> None:
+        """Parse and store detail activities obtained without the API.
+
+        Anything with the ``id``, ``name``, ``start_date``, ``elapsed_time``
+        and ``description`` of a ``DetailedActivity`` works. They are filtered
+        and parsed like the details a sync fetches, and remembered in
+        ``known_activities`` so a later sync does not fetch them again.
+        """
+        chunk = SyncChunk(watermark=0)
+        for activity_detail in activities:
+            if len(chunk.run_ids) >= self.chunk_size:
+                self.write_chunk(chunk)
+            item = _detail_item(activity_detail)
+            chunk.run_ids.append(item.id)
+            self.add_detail(chunk, item, activity_detail)
+        self.write_chunk(chunk)
+
+    def delete_activities(self, run_ids: Iterable[int]) -> int:
+        """Forget activities deleted on Strava; returns how many were stored."""
+        deleted = delete_activities(self.session, run_ids)
+        self.session.commit()
+        self.stats["deleted"] += deleted
+        return deleted
+
+    def iter_summaries(
+        self,
+        filters: dict,
+        known: dict[int, str] | None = None,
+        processed: set[int] | None = None,
+    ) -> Iterator[SyncItem]:
+        """Stream the summaries in the window, fetching pages as needed.
+
+        Each page comes out oldest first, whatever order Strava lists it in,
+        so a watermark advanced item by item never passes a summary of the
+        same page that is still to come.
+
+        Ids in ``processed`` are dropped. The rest come out as ``SyncItem``s;
+        ``skip_reason`` is set when no detail is needed: the fingerprint
+        matches ``known`` (``UNCHANGED``) or it is not a push-up activity.
+        """
+        known = known or {}
+        processed = processed or set()
+        page: list[SyncItem] = []
+        # one pass only: stravalib restarts the listing once it is exhausted
+        for listed, activity in enumerate(self.client.get_activities(**filters), 1):
+            run_id = int(activity.id)
+            if run_id not in processed:
+                fingerprint, start_epoch = summary_fingerprint(activity)
+                if known.get(run_id) == fingerprint:
+                    skip_reason = UNCHANGED
+                else:
+                    skip_reason = _skip_reason(activity)
+                page.append(
+                    SyncItem(run_id, activity, fingerprint, start_epoch, skip_reason)
+                )
+            # stravalib requests PER_PAGE summaries at a time
+            if listed % PER_PAGE == 0:
+                yield from _oldest_first(page)
+                page = []
+        yield from _oldest_first(page)
+
+    def get_activity(self, run_id: int):
+        """``client.get_activity``, keeping the raw response in ``raw_cache``."""
+        activity_detail = self.client.get_activity(run_id)
+        if self.raw_cache is None:
+            return activity_detail
+        kept = getattr(self._payloads, "detail", None)
+        self._payloads.detail = None
+        if kept is not None and kept[0] == run_id:
+            fingerprint, _ = summary_fingerprint(activity_detail)
+            self.raw_cache.put(run_id, fingerprint, kept[1])
+        return activity_detail
+
+    def _keep_payload(self, response, *args, **kwargs) -> None:
+        """``requests`` response hook: note the body of a detail response.
+
+        Hooks run on the thread that sent the request, so ``get_activity``
+        finds the payload of its own request afterwards.
+        """
+        match = DETAIL_PATH_RE.search(urlsplit(response.url).path)
+        if match is not None and response.ok:
+            self._payloads.detail = (int(match[1]), response.json())
+
+    def write_chunk(self, chunk: SyncChunk, journal=None, partition=None) -> None:
+        """Commit ``chunk`` together with the journal or backfill partition
+        progress (if any), then empty it."""
+        if not chunk.run_ids:
+            return
+        rows, remembered, run_ids = chunk.rows, chunk.remembered, chunk.run_ids
+        # cleared first so a failed write is not retried by the final flush
+        chunk.rows, chunk.remembered, chunk.run_ids = [], [], []
+        started = time.perf_counter()
+        created, updated, failed = self.upsert_rows(rows)
+        if failed:
+            # not remembered, so the next sync fetches them again
+            remembered = [
+                entry for entry in remembered if entry["run_id"] not in failed
+            ]
+        remember_activities(self.session, remembered)
+        if journal is not None:
+            advance_sync_journal(self.session, journal, chunk.watermark, run_ids)
+        if partition is not None:
+            advance_backfill_partition(
+                self.session, partition, chunk.watermark, len(run_ids)
+            )
+        self.session.commit()
+        self.stats["db_write_seconds"] += time.perf_counter() - started
+        self.stats["created"] += created
+        self.stats["updated"] += updated
+        # "+" per created activity, "." per updated one, as before bulk writes
+        sys.stdout.write("+" * created + "." * updated)
+        sys.stdout.flush()
+
+    def upsert_rows(self, rows: list[dict]) -> tuple[int, int, set[int]]:
+        """``bulk_upsert_activities`` in a SAVEPOINT; if the batch fails, retry
+        row by row so a bad record costs only itself.
+
+        Returns ``(created, updated, failed run_ids)``.
+        """
+        try:
+            with self.session.begin_nested():
+                created, updated = bulk_upsert_activities(self.session, rows)
+            return created, updated, set()
+        except SQLAlchemyError:
+            pass
+
+        created = updated = 0
+        failed = set()
+        for row in rows:
+            try:
+                with self.session.begin_nested():
+                    row_created, row_updated = bulk_upsert_activities(
+                        self.session, [row]
+                    )
+            except SQLAlchemyError as exc:
+                print(f"skip activity {row['run_id']} since it failed to save: {exc}")
+                self.stats["failed"] += 1
+                failed.add(row["run_id"])
+                continue
+            created += row_created
+            updated += row_updated
+        return created, updated, failed
+
+    def fetch_details(
+        self, activities: Iterable, wanted: Callable[[Any], bool] | None = None
+    ) -> Iterator[tuple]:
+        """Yield ``(activity, detail)`` pairs in input order.
+
+        ``activities`` is consumed lazily, so list pages are fetched while
+        detail requests for earlier summaries are still running. Items for
+        which ``wanted`` is false pass through in order with a ``None`` detail.
+
+        Up to ``detail_workers`` ``get_activity`` requests run at once, with at
+        most twice that many in flight, so a long backfill does not queue every
+        request up front. The caller consumes the pairs on its own thread; the
+        first failed request (e.g. ``RateLimitExceeded``) is raised there and
+        the requests not yet started are cancelled.
+        """
+        if wanted is None:
+
+            def wanted(activity):
+                return True
+
+        if self.detail_workers == 1:
+            for activity in activities:
+                detail = self.get_activity(activity.id) if wanted(activity) else None
+                yield activity, detail
+            return
+
+        window = 2 * self.detail_workers
+        with ThreadPoolExecutor(
+            max_workers=self.detail_workers,
+            thread_name_prefix=_worker_name("strava-detail"),
+        ) as executor:
+            pending: deque = deque()
+            try:
+                for activity in activities:
+                    if len(pending) >= window:
+                        done, future = pending.popleft()
+                        yield done, future and future.result()
+                    future = None
+                    if wanted(activity):
+                        future = executor.submit(self.get_activity, activity.id)
+                    pending.append((activity, future))
+                while pending:
+                    done, future = pending.popleft()
+                    yield done, future and future.result()
+            finally:
+                for _, future in pending:
+                    if future is not None:
+                        future.cancel()
 
     def load(self) -> list[dict]:
         activities: Iterable[Activity] = self.session.query(Activity).order_by(
-            Activity.start_date
+            Activity.start_epoch
         )
         return [activity.to_dict() for activity in activities]
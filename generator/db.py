@@ -1,15 +1,26 @@
+import atexit
 import datetime
+import os
+import threading
 
+from dateutil.parser import parse
 from sqlalchemy import (
     Column,
     Float,
     Integer,
     String,
+    UniqueConstraint,
     create_engine,
-    inspect,
+    delete,
+    event,
+    func,
+    select,
     text,
+    update,
 )
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import declarative_base, scoped_session, sessionmaker, validates
 
 Base = declarative_base()
 
@@ -31,11 +42,32 @@ class Activity(Base):
     run_id = Column(Integer, primary_key=True)
     name = Column(String)
     start_date = Column(String)
+    # UTC epoch seconds and the UTC offset (seconds) of ``start_date``; derived
+    # from ``start_date`` so readers can order and filter without parsing it.
+    start_epoch = Column(Integer, index=True)
+    utc_offset = Column(Integer)
     elapsed_time = Column(Integer)
     count = Column(Integer)
     avg_time = Column(Float)
     calories = Column(Float)
 
+    @validates("start_date")
+    def _derive_start_epoch(self, key, value):
+        self.start_epoch, self.utc_offset = start_date_to_epoch(value)
+        return value
+
+    @property
+    def start_datetime(self):
+        if self.start_epoch is None:
+            return None
+        return epoch_to_datetime(self.start_epoch, self.utc_offset)
+
+    @property
+    def local_date(self):
+        if self.start_epoch is None:
+            return None
+        return local_date_for(self.start_epoch, self.utc_offset)
+
     def to_dict(self):
         out = {}
         for key in ACTIVITY_KEYS:
@@ -47,73 +79,711 @@ class Activity(Base):
         return out
 
 
+class DailyTotal(Base):
+    """Per-day aggregate of ``activities``, kept in step by the write paths."""
+
+    __tablename__ = "daily_totals"
+
+    # YYYY-MM-DD in the activity's own UTC offset
+    local_date = Column(String, primary_key=True)
+    reps = Column(Integer, nullable=False, default=0)
+    sessions = Column(Integer, nullable=False, default=0)
+    elapsed_time = Column(Integer, nullable=False, default=0)
+    calories = Column(Float, nullable=False, default=0.0)
+
+
+# KnownActivity.skip_reason values
+SKIP_NOT_PUSHUPS = "not push-ups"
+SKIP_NO_COUNT = "no count"
+
+# how far back a sync without a start date lists again, for recent edits
+SYNC_LOOKBACK = datetime.timedelta(days=7)
+
+
+class KnownActivity(Base):
+    """Strava activities seen by a sync, keyed by a fingerprint of the summary.
+
+    Rows with a ``skip_reason`` are the negative cache: activities whose
+    detail did not yield an ``activities`` row (or was never needed).
+    """
+
+    __tablename__ = "known_activities"
+
+    run_id = Column(Integer, primary_key=True)
+    fingerprint = Column(String, nullable=False)
+    start_epoch = Column(Integer)
+    skip_reason = Column(String)
+
+
+class ActivityEdit(Base):
+    """When an exported column of a stored activity last changed or a row was
+    deleted, kept by triggers on ``activities`` (one row, ``id`` 1).
+
+    The CSV export compares it with the file's modification time to tell
+    whether appending new rows still mirrors the table.
+    """
+
+    __tablename__ = "activity_edits"
+
+    id = Column(Integer, primary_key=True)
+    edited_at = Column(Float, nullable=False)
+
+
+def start_date_to_epoch(start_date):
+    """Return ``(epoch_seconds, utc_offset_seconds)`` for a start date.
+
+    Accepts a ``datetime`` or the string stored in ``Activity.start_date``.
+    Naive values are treated as UTC. Returns ``(None, None)`` if unparsable.
+    """
+    if isinstance(start_date, str):
+        try:
+            start_date = datetime.datetime.fromisoformat(start_date)
+        except ValueError:
+            try:
+                start_date = parse(start_date)
+            except (ValueError, TypeError, OverflowError):
+                return None, None
+    if not isinstance(start_date, datetime.datetime):
+        return None, None
+    if start_date.tzinfo is None:
+        start_date = start_date.replace(tzinfo=datetime.timezone.utc)
+    offset = start_date.utcoffset() or datetime.timedelta(0)
+    return int(start_date.timestamp()), int(offset.total_seconds())
+
+
+def epoch_to_datetime(epoch, utc_offset=0):
+    """Inverse of ``start_date_to_epoch``: an aware datetime in its own offset."""
+    tz = datetime.timezone(datetime.timedelta(seconds=utc_offset or 0))
+    return datetime.datetime.fromtimestamp(epoch, tz)
+
+
+def local_date_for(epoch, utc_offset=0):
+    return epoch_to_datetime(epoch, utc_offset).date().isoformat()
+
+
+def apply_daily_total_deltas(session, deltas):
+    """Add ``deltas`` (dicts keyed like ``DailyTotal`` columns) to ``daily_totals``."""
+    if not deltas:
+        return
+    stmt = insert(DailyTotal.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailyTotal.local_date],
+        set_={
+            key: getattr(DailyTotal, key) + stmt.excluded[key]
+            for key in ("reps", "sessions", "elapsed_time", "calories")
+        },
+    )
+    session.execute(stmt, deltas)
+
+
+def _daily_total_delta(local_date, reps=0, sessions=0, elapsed_time=0, calories=0.0):
+    return {
+        "local_date": local_date,
+        "reps": reps or 0,
+        "sessions": sessions,
+        "elapsed_time": elapsed_time or 0,
+        "calories": calories or 0.0,
+    }
+
+
+def rebuild_daily_totals(session):
+    """Recompute ``daily_totals`` from scratch; returns the number of days."""
+    session.execute(text("DELETE FROM daily_totals"))
+    session.execute(
+        text(
+            "INSERT INTO daily_totals "
+            "(local_date, reps, sessions, elapsed_time, calories) "
+            "SELECT date(start_epoch + COALESCE(utc_offset, 0), 'unixepoch'), "
+            "COALESCE(SUM(count), 0), COUNT(*), COALESCE(SUM(elapsed_time), 0), "
+            "COALESCE(SUM(calories), 0.0) "
+            "FROM activities WHERE start_epoch IS NOT NULL GROUP BY 1"
+        )
+    )
+    return session.execute(text("SELECT COUNT(*) FROM daily_totals")).scalar()
+
+
 def update_or_create_activity(
     session, run_activity, count=0, avg_time=0.0, calories=0.0
 ):
+    """Store one activity; on failure only its own changes are rolled back."""
     created = False
     try:
-        activity = (
-            session.query(Activity).filter_by(run_id=int(run_activity.id)).first()
-        )
-
-        if not activity:
-            activity = Activity(
-                run_id=run_activity.id,
-                name=run_activity.name,
-                elapsed_time=run_activity.elapsed_time,
-                start_date=str(run_activity.start_date),
-                count=count,
-                avg_time=avg_time,
-                calories=calories,
+        with session.begin_nested():
+            activity = (
+                session.query(Activity).filter_by(run_id=int(run_activity.id)).first()
             )
-            session.add(activity)
-            created = True
-        else:
-            activity.name = run_activity.name
-            activity.count = count
-            activity.avg_time = avg_time
-            activity.calories = calories
-    except Exception as e:
+
+            if not activity:
+                activity = Activity(
+                    run_id=run_activity.id,
+                    name=run_activity.name,
+                    elapsed_time=run_activity.elapsed_time,
+                    start_date=str(run_activity.start_date),
+                    count=count,
+                    avg_time=avg_time,
+                    calories=calories,
+                )
+                session.add(activity)
+                session.flush()
+                created = True
+                if activity.local_date is not None:
+                    delta = _daily_total_delta(
+                        activity.local_date, count, 1, activity.elapsed_time, calories
+                    )
+                    apply_daily_total_deltas(session, [delta])
+            else:
+                if activity.local_date is not None:
+                    delta = _daily_total_delta(
+                        activity.local_date,
+                        (count or 0) - (activity.count or 0),
+                        calories=(calories or 0.0) - (activity.calories or 0.0),
+                    )
+                    apply_daily_total_deltas(session, [delta])
+                activity.name = run_activity.name
+                activity.count = count
+                activity.avg_time = avg_time
+                activity.calories = calories
+                session.flush()
+    except SQLAlchemyError as e:
         print(f"something wrong with {run_activity.id}")
         print(str(e))
-        session.rollback()
+        created = False
 
     return created
 
 
-def add_missing_columns(engine, model):
-    inspector = inspect(engine)
-    table_name = model.__tablename__
-    columns = {col["name"] for col in inspector.get_columns(table_name)}
-    missing_columns = []
-
-    for column in model.__table__.columns:
-        if column.name not in columns:
-            missing_columns.append(column)
-    if missing_columns:
-        print(f"Adding missing columns {missing_columns} to {table_name}")
-        with engine.connect() as conn:
-            for column in missing_columns:
-                column_type = str(column.type)
-                conn.execute(
-                    text(
-                        f"ALTER TABLE {table_name} ADD COLUMN {column.name} {column_type}"
+def activity_to_row(run_activity, count=0, avg_time=0.0, calories=0.0):
+    """Build a plain ``activities`` row for ``bulk_upsert_activities``."""
+    start_date = str(run_activity.start_date)
+    start_epoch, utc_offset = start_date_to_epoch(start_date)
+    elapsed_time = run_activity.elapsed_time
+    return {
+        "run_id": int(run_activity.id),
+        "name": run_activity.name,
+        "start_date": start_date,
+        "start_epoch": start_epoch,
+        "utc_offset": utc_offset,
+        "elapsed_time": int(elapsed_time) if elapsed_time is not None else None,
+        "count": count,
+        "avg_time": avg_time,
+        "calories": calories,
+    }
+
+
+class SyncJournal(Base):
+    """One sync window and how far into it the committed work reaches.
+
+    ``watermark`` is the start epoch of the last summary whose chunk has been
+    committed; Strava lists ``after`` windows oldest first, so everything in
+    ``[window_start, watermark]`` is done. ``finished_at`` stays NULL until
+    the window is exhausted, which is how a restarted sync finds it again.
+    """
+
+    __tablename__ = "sync_journal"
+
+    id = Column(Integer, primary_key=True)
+    window_start = Column(Integer, nullable=False)
+    window_end = Column(Integer, nullable=False)
+    watermark = Column(Integer, nullable=False)
+    processed = Column(Integer, nullable=False, default=0)
+    started_at = Column(Integer, nullable=False)
+    finished_at = Column(Integer)
+
+
+class SyncJournalId(Base):
+    """Summaries already processed in an unfinished ``sync_journal`` window."""
+
+    __tablename__ = "sync_journal_ids"
+
+    journal_id = Column(Integer, primary_key=True)
+    run_id = Column(Integer, primary_key=True)
+
+
+class BackfillPartition(Base):
+    """One slice of a ``--backfill`` range and how far into it the committed
+    work reaches.
+
+    Partitions of one backfill are disjoint ``[window_start, window_end)``
+    ranges listed and fetched concurrently; ``watermark`` works as in
+    ``SyncJournal``, and ``finished_at`` marks the partitions a resumed
+    backfill skips.
+    """
+
+    __tablename__ = "backfill_partitions"
+    __table_args__ = (UniqueConstraint("window_start", "window_end"),)
+
+    id = Column(Integer, primary_key=True)
+    window_start = Column(Integer, nullable=False)
+    window_end = Column(Integer, nullable=False)
+    watermark = Column(Integer, nullable=False)
+    processed = Column(Integer, nullable=False, default=0)
+    finished_at = Column(Integer)
+
+
+def activity_fingerprint(name, elapsed_time, start_epoch):
+    """Fingerprint of the summary fields that can change between syncs."""
+    return f"{elapsed_time}:{start_epoch}:{name}"
+
+
+def summary_fingerprint(run_activity):
+    """``(fingerprint, start_epoch)`` of a Strava summary or detail activity."""
+    start_epoch, _ = start_date_to_epoch(str(run_activity.start_date))
+    elapsed_time = run_activity.elapsed_time
+    elapsed_time = int(elapsed_time) if elapsed_time is not None else None
+    return (
+        activity_fingerprint(run_activity.name, elapsed_time, start_epoch),
+        start_epoch,
+    )
+
+
+def load_known_fingerprints(session, since_epoch=None):
+    """Map run_id -> fingerprint for known activities starting at/after ``since_epoch``."""
+    query = select(KnownActivity.run_id, KnownActivity.fingerprint)
+    if since_epoch is not None:
+        query = query.where(KnownActivity.start_epoch >= since_epoch)
+    return dict(session.execute(query).all())
+
+
+def remember_activities(session, entries):
+    """Upsert ``known_activities`` rows (dicts keyed like its columns)."""
+    if not entries:
+        return
+    entries = list({entry["run_id"]: entry for entry in entries}.values())
+    stmt = insert(KnownActivity.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[KnownActivity.run_id],
+        set_={
+            key: stmt.excluded[key]
+            for key in ("fingerprint", "start_epoch", "skip_reason")
+        },
+    )
+    session.execute(stmt, entries)
+
+
+def open_sync_journal(session):
+    """The unfinished sync window, if a previous sync stopped partway."""
+    return session.scalars(
+        select(SyncJournal)
+        .where(SyncJournal.finished_at.is_(None))
+        .order_by(SyncJournal.id.desc())
+        .limit(1)
+    ).first()
+
+
+def start_sync_journal(session, window_start, window_end):
+    """Open a new window, closing any unfinished one it replaces."""
+    now = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
+    for journal in session.scalars(
+        select(SyncJournal).where(SyncJournal.finished_at.is_(None))
+    ):
+        finish_sync_journal(session, journal, finished_at=now)
+    journal = SyncJournal(
+        window_start=window_start,
+        window_end=window_end,
+        watermark=window_start,
+        processed=0,
+        started_at=now,
+    )
+    session.add(journal)
+    session.flush()
+    return journal
+
+
+def advance_sync_journal(session, journal, watermark, run_ids):
+    """Record ``run_ids`` as processed; call in the transaction that commits them."""
+    if run_ids:
+        session.execute(
+            insert(SyncJournalId.__table__).on_conflict_do_nothing(),
+            [{"journal_id": journal.id, "run_id": run_id} for run_id in run_ids],
+        )
+    session.execute(
+        update(SyncJournal)
+        .where(SyncJournal.id == journal.id)
+        .values(
+            watermark=max(journal.watermark, watermark),
+            processed=SyncJournal.processed + len(run_ids),
+        )
+    )
+    session.refresh(journal)
+
+
+def finish_sync_journal(session, journal, finished_at=None):
+    if finished_at is None:
+        finished_at = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
+    journal.finished_at = finished_at
+    session.execute(delete(SyncJournalId).where(SyncJournalId.journal_id == journal.id))
+
+
+def journal_processed_ids(session, journal):
+    return set(
+        session.scalars(
+            select(SyncJournalId.run_id).where(SyncJournalId.journal_id == journal.id)
+        )
+    )
+
+
+def backfill_partitions(session, start_epoch, end_epoch, size):
+    """The partitions of ``[start_epoch, end_epoch)`` in ``size``-second steps,
+    oldest first; rows a previous run created are reused with their progress."""
+    windows = [
+        (window_start, min(window_start + size, end_epoch))
+        for window_start in range(start_epoch, end_epoch, max(1, size))
+    ]
+    existing = {
+        (partition.window_start, partition.window_end): partition
+        for partition in session.scalars(
+            select(BackfillPartition).where(
+                BackfillPartition.window_start >= start_epoch,
+                BackfillPartition.window_end <= end_epoch,
+            )
+        )
+    }
+    partitions = []
+    for window in windows:
+        partition = existing.get(window)
+        if partition is None:
+            partition = BackfillPartition(
+                window_start=window[0],
+                window_end=window[1],
+                watermark=window[0],
+                processed=0,
+            )
+            session.add(partition)
+        partitions.append(partition)
+    session.flush()
+    return partitions
+
+
+def advance_backfill_partition(session, partition, watermark, processed):
+    """Move ``partition`` past ``processed`` more summaries; call in the
+    transaction that commits them."""
+    partition.watermark = max(partition.watermark, watermark)
+    partition.processed += processed
+
+
+def finish_backfill_partition(session, partition, finished_at=None):
+    if finished_at is None:
+        finished_at = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
+    partition.finished_at = finished_at
+
+
+def sync_window_start(session, lookback=SYNC_LOOKBACK):
+    """Where a sync without an explicit start date begins, as an epoch.
+
+    Resumes an unfinished window at its watermark. Otherwise starts
+    ``lookback`` before the end of the last finished window (or the newest
+    stored activity), so recent edits are picked up; every run lists that
+    span again, a list request per 200 activities in it. ``None`` means the
+    whole history.
+    """
+    journal = open_sync_journal(session)
+    if journal is not None:
+        return journal.watermark
+    last_end = session.execute(
+        select(SyncJournal.window_end)
+        .where(SyncJournal.finished_at.is_not(None))
+        .order_by(SyncJournal.id.desc())
+        .limit(1)
+    ).scalar()
+    if last_end is None:
+        last_end = session.execute(select(func.max(Activity.start_epoch))).scalar()
+    if last_end is None:
+        return None
+    return last_end - int(lookback.total_seconds())
+
+
+# Columns refreshed when an already stored activity is synced again; mirrors
+# the update branch of update_or_create_activity.
+UPSERT_UPDATE_KEYS = ["name", "count", "avg_time", "calories"]
+
+
+def bulk_upsert_activities(session, rows):
+    """Insert or update many activity rows with one executemany.
+
+    ``rows`` are dicts as built by ``activity_to_row``. The statement runs in
+    the session's current transaction; committing is left to the caller.
+    ``daily_totals`` is adjusted in the same transaction.
+    Returns ``(created, updated)`` counts.
+    """
+    rows = list({row["run_id"]: row for row in rows}.values())
+    if not rows:
+        return 0, 0
+
+    run_ids = [row["run_id"] for row in rows]
+    existing = {}
+    # stay well below SQLite's bound-parameter limit
+    for i in range(0, len(run_ids), 500):
+        for stored in session.execute(
+            select(
+                Activity.run_id,
+                Activity.start_epoch,
+                Activity.utc_offset,
+                Activity.count,
+                Activity.calories,
+            ).where(Activity.run_id.in_(run_ids[i : i + 500]))
+        ):
+            existing[stored.run_id] = stored
+
+    deltas = []
+    for row in rows:
+        stored = existing.get(row["run_id"])
+        if stored is None:
+            if row["start_epoch"] is not None:
+                local_date = local_date_for(row["start_epoch"], row["utc_offset"])
+                deltas.append(
+                    _daily_total_delta(
+                        local_date,
+                        row["count"],
+                        1,
+                        row["elapsed_time"],
+                        row["calories"],
                     )
                 )
-            conn.commit()
+        elif stored.start_epoch is not None:
+            local_date = local_date_for(stored.start_epoch, stored.utc_offset)
+            deltas.append(
+                _daily_total_delta(
+                    local_date,
+                    (row["count"] or 0) - (stored.count or 0),
+                    calories=(row["calories"] or 0.0) - (stored.calories or 0.0),
+                )
+            )
+
+    stmt = insert(Activity.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Activity.run_id],
+        set_={key: stmt.excluded[key] for key in UPSERT_UPDATE_KEYS},
+    )
+    session.execute(stmt, rows)
+    apply_daily_total_deltas(session, deltas)
+
+    updated = len(existing)
+    return len(rows) - updated, updated
+
+
+def delete_activities(session, run_ids):
+    """Remove activities (and their ``known_activities`` rows); returns the
+    number of activities deleted.
+
+    Their contribution is subtracted from ``daily_totals``, dropping days left
+    without a session. Committing is left to the caller.
+    """
+    run_ids = [int(run_id) for run_id in run_ids]
+    if not run_ids:
+        return 0
+    deltas = []
+    for stored in session.execute(
+        select(
+            Activity.start_epoch,
+            Activity.utc_offset,
+            Activity.count,
+            Activity.elapsed_time,
+            Activity.calories,
+        ).where(Activity.run_id.in_(run_ids))
+    ):
+        if stored.start_epoch is not None:
+            deltas.append(
+                _daily_total_delta(
+                    local_date_for(stored.start_epoch, stored.utc_offset),
+                    -(stored.count or 0),
+                    -1,
+                    -(stored.elapsed_time or 0),
+                    -(stored.calories or 0.0),
+                )
+            )
+    apply_daily_total_deltas(session, deltas)
+    session.execute(delete(DailyTotal).where(DailyTotal.sessions <= 0))
+    deleted = session.execute(delete(Activity).where(Activity.run_id.in_(run_ids)))
+    session.execute(delete(KnownActivity).where(KnownActivity.run_id.in_(run_ids)))
+    return deleted.rowcount
 
 
-def init_db(db_path):
-    engine = create_engine(
-        f"sqlite:///{db_path}", connect_args={"check_same_thread": False}
+# Per-connection tuning. busy_timeout lets readers and the writer wait for each
+# other instead of failing with "database is locked"; the rest only applies once
+# the file is in WAL mode, where synchronous=NORMAL is still crash-safe.
+BUSY_TIMEOUT_MS = 10_000
+WAL_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": -32_000,  # KiB
+    "mmap_size": 256 * 1024 * 1024,
+}
+
+
+def _configure_connection(dbapi_connection, connection_record):
+    # pysqlite's own transaction handling only begins before DML, so a
+    # SAVEPOINT would run outside any transaction; _begin opens them instead
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        journal_mode = cursor.execute("PRAGMA journal_mode").fetchone()[0]
+        if journal_mode.lower() == "wal":
+            for name, value in WAL_PRAGMAS.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+    finally:
+        cursor.close()
+
+
+def _begin(conn):
+    """Open the transaction SQLAlchemy is starting on ``conn``.
+
+    The ``sqlite_begin`` execution option picks the kind: ``"IMMEDIATE"``
+    takes the write lock up front (``migrate``), ``None`` runs the statements
+    in autocommit, e.g. PRAGMAs that refuse to run inside a transaction.
+    """
+    mode = conn.get_execution_options().get("sqlite_begin", "DEFERRED")
+    if mode is not None:
+        conn.exec_driver_sql(f"BEGIN {mode}")
+
+
+# Engines, session factories and thread-local session registries, keyed by the
+# absolute database path and access mode. Schema migrations (generator.migrations)
+# run once per path per process, always through the writable engine.
+_engines = {}
+_session_factories = {}
+_scoped_sessions = {}
+_engines_lock = threading.Lock()
+
+
+def _engine_key(db_path, read_only=False, immutable=False):
+    db_path = str(db_path)
+    if db_path != ":memory:":
+        db_path = os.path.abspath(db_path)
+    if immutable:
+        return db_path, "immutable"
+    return db_path, "ro" if read_only else "rw"
+
+
+def _engine_url(key):
+    db_path, mode = key
+    if mode == "rw":
+        return f"sqlite:///{db_path}"
+    params = "mode=ro&immutable=1" if mode == "immutable" else "mode=ro"
+    return f"sqlite:///file:{db_path}?{params}&uri=true"
+
+
+def _new_engine(key):
+    engine = create_engine(_engine_url(key), connect_args={"check_same_thread": False})
+    event.listen(engine, "connect", _configure_connection)
+    event.listen(engine, "begin", _begin)
+    return engine
+
+
+def _check_schema(engine, db_path, *, migrate_outdated=False):
+    """Make sure ``migrate`` has brought the database up to date.
+
+    An outdated schema is migrated once through a short-lived writable engine
+    with ``migrate_outdated``, and refused otherwise.
+    """
+    from .migrations import LATEST_VERSION, migrate, schema_version
+
+    if not os.path.exists(db_path):
+        raise RuntimeError(f"No database at {db_path}; run a sync first.")
+    with engine.connect() as conn:
+        version = schema_version(conn)
+    if version >= LATEST_VERSION:
+        return
+    if migrate_outdated:
+        writer = _new_engine((db_path, "rw"))
+        try:
+            migrate(writer)
+        finally:
+            writer.dispose()
+        return
+    engine.dispose()
+    raise RuntimeError(
+        f"{db_path} has schema version {version}, this code needs "
+        f"{LATEST_VERSION}; run `pdm run db migrate` (or a sync) first, or "
+        "open it without immutable."
     )
-    Base.metadata.create_all(engine)
 
-    # check missing columns
-    add_missing_columns(engine, Activity)
 
-    sm = sessionmaker(bind=engine)
-    session = sm()
-    # apply the changes
-    session.commit()
-    return session
+def get_engine(db_path, *, read_only=False, immutable=False):
+    """Return the cached engine for ``db_path``.
+
+    ``read_only`` opens the file with ``mode=ro`` for render-only commands.
+    ``immutable`` additionally tells SQLite the file cannot change while open
+    (no locking, no WAL lookups); only use it when no writer can be running
+    and the schema is current. Neither mode creates a missing file (that
+    raises ``RuntimeError``). An outdated schema, e.g. a freshly checked out
+    ``data.db``, is migrated once by ``read_only`` opens; ``immutable`` ones
+    refuse it, since nothing may change the file while they are open.
+    """
+    key = _engine_key(db_path, read_only, immutable)
+    with _engines_lock:
+        engine = _engines.get(key)
+        if engine is None:
+            engine = _new_engine(key)
+            if key[1] == "rw":
+                from .migrations import migrate
+
+                try:
+                    migrate(engine)
+                except BaseException:
+                    engine.dispose()
+                    raise
+            else:
+                _check_schema(engine, key[0], migrate_outdated=key[1] == "ro")
+
+            _engines[key] = engine
+            _session_factories[key] = sessionmaker(bind=engine)
+            _scoped_sessions[key] = scoped_session(_session_factories[key])
+    return engine
+
+
+def enable_wal(db_path):
+    """Switch ``db_path`` to WAL journaling so readers and the writer run concurrently.
+
+    The journal mode is stored in the database file, so every later connection,
+    from any process, uses WAL as well.
+    """
+    engine = get_engine(db_path)
+    with engine.connect().execution_options(sqlite_begin=None) as conn:
+        mode = conn.exec_driver_sql("PRAGMA journal_mode = WAL").scalar()
+    # reconnect so pooled connections pick up the WAL-only pragmas
+    engine.dispose()
+    return mode
+
+
+def checkpoint(db_path):
+    """Fold the WAL back into the main file, e.g. before committing ``data.db``."""
+    engine = get_engine(db_path)
+    with engine.connect().execution_options(sqlite_begin=None) as conn:
+        conn.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def get_session_factory(db_path, *, read_only=False, immutable=False):
+    get_engine(db_path, read_only=read_only, immutable=immutable)
+    return _session_factories[_engine_key(db_path, read_only, immutable)]
+
+
+def get_scoped_session(db_path, *, read_only=False, immutable=False):
+    """Thread-local session registry; call ``.remove()`` when a worker is done."""
+    get_engine(db_path, read_only=read_only, immutable=immutable)
+    return _scoped_sessions[_engine_key(db_path, read_only, immutable)]
+
+
+def dispose_engines():
+    """Close pooled connections and forget cached engines (e.g. after a file swap)."""
+    with _engines_lock:
+        for registry in _scoped_sessions.values():
+            registry.remove()
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+        _session_factories.clear()
+        _scoped_sessions.clear()
+
+
+atexit.register(dispose_engines)
+
+
+def init_db(db_path, *, wal=False, read_only=False, immutable=False):
+    """Return a new session bound to the cached engine for ``db_path``.
+
+    ``wal`` switches the file to WAL journaling first (see ``enable_wal``);
+    ``read_only``/``immutable`` are passed through to ``get_engine``.
+    """
+    if wal and not (read_only or immutable):
+        enable_wal(db_path)
+    return get_session_factory(db_path, read_only=read_only, immutable=immutable)()
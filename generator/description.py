@@ -0,0 +1,94 @@
+"""Parse the stats Puuush writes into a Strava activity description.
+
+The app's English template is
+
+    Total Reps: 57
+    Average Time per Push-Up: 0.67s
+    Burned Calories: 18.06
+
+    Data from Puuush App
+
+which ``parse_description`` recognizes with a single anchored match. Anything
+else (reordered or missing lines, decimal commas) goes through one ``findall``
+over the text, looking each ``label: value`` pair up in ``LABELS``. Only
+labels seen in real descriptions are listed; supporting another template
+(e.g. a localized one) means adding its labels there.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Iterable, NamedTuple
+
+FIELDS = ("count", "avg_time", "calories")
+
+# lower-cased label -> field; colons may be ASCII or full-width
+LABELS = {
+    "total reps": "count",
+    "average time per push-up": "avg_time",
+    "burned calories": "calories",
+}
+# a description with this label but no readable count is stored with count 0
+COUNT_LABEL = "Total Reps"
+
+# ASCII classes and literal newlines keep the common case to one cheap match
+_TEMPLATE_RE = re.compile(
+    r"Total Reps: ([0-9]+)\n"
+    r"Average Time per Push-Up: ([0-9.]+)s\n"
+    r"Burned Calories: ([0-9.]+)"
+)
+# "label: number" at the start of a line
+_LINE_RE = re.compile(r"^[ \t]*([^:：\n]+)[:：][ \t]*(\d+(?:[.,]\d+)?)", re.MULTILINE)
+
+
+class ParsedDescription(NamedTuple):
+    count: int | None
+    avg_time: float | None
+    calories: float | None
+    # FIELDS the description did not provide
+    missing: tuple[str, ...]
+
+    @property
+    def has_count(self) -> bool:
+        return self.count is not None
+
+
+NOT_PARSED = ParsedDescription(None, None, None, FIELDS)
+
+
+def parse_description(description: str | None) -> ParsedDescription:
+    if not description:
+        return NOT_PARSED
+
+    match = _TEMPLATE_RE.match(description)
+    if match is not None:
+        count, avg_time, calories = match.groups()
+        try:
+            return ParsedDescription(int(count), float(avg_time), float(calories), ())
+        except ValueError:
+            pass  # e.g. "1.2.3"; let the general pass sort it out
+
+    values: dict[str, str] = {}
+    for label, value in _LINE_RE.findall(description):
+        field = LABELS.get(label.rstrip().lower())
+        if field is not None and field not in values:
+            values[field] = value.replace(",", ".")
+
+    count = values.get("count")
+    if count is None and COUNT_LABEL in description:
+        # stored with count 0 (and reported as missing), as sync always did
+        count = "0"
+    avg_time = values.get("avg_time")
+    calories = values.get("calories")
+    return ParsedDescription(
+        int(float(count)) if count is not None else None,
+        float(avg_time) if avg_time is not None else None,
+        float(calories) if calories is not None else None,
+        tuple(field for field in FIELDS if field not in values),
+    )
+
+
+def parse_descriptions(descriptions: Iterable[str | None]) -> list[ParsedDescription]:
+    """Parse many descriptions, e.g. when re-parsing stored raw payloads."""
+    parse = parse_description
+    return [parse(description) for description in descriptions]
@@ -0,0 +1,244 @@
+"""Versioned schema migrations for ``data.db``.
+
+The schema version lives in ``PRAGMA user_version``. ``migrate`` applies the
+steps newer than the stored version, in order, inside one ``BEGIN IMMEDIATE``
+transaction, so concurrent starters serialize and a failed step leaves the file
+untouched. Once a database is current, startup costs a single PRAGMA read.
+
+Steps must be idempotent: databases created before versioning (user_version 0)
+may already contain some of the objects they create.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable
+
+from sqlalchemy import text
+
+from .db import (
+    ACTIVITY_KEYS,
+    activity_fingerprint,
+    rebuild_daily_totals,
+    start_date_to_epoch,
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    apply: Callable
+
+
+MIGRATIONS: list[Migration] = []
+
+
+def migration(description):
+    def register(func):
+        MIGRATIONS.append(Migration(len(MIGRATIONS) + 1, description, func))
+        return func
+
+    return register
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+
+
+def _add_column(conn, table, name, column_type):
+    if name not in _columns(conn, table):
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
+
+@migration("create activities")
+def _create_activities(conn):
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS activities ("
+        "run_id INTEGER NOT NULL, "
+        "name VARCHAR, "
+        "start_date VARCHAR, "
+        "elapsed_time INTEGER, "
+        "count INTEGER, "
+        "avg_time FLOAT, "
+        "calories FLOAT, "
+        "PRIMARY KEY (run_id))"
+    )
+
+
+@migration("add indexed start_epoch and utc_offset to activities")
+def _add_start_epoch(conn):
+    _add_column(conn, "activities", "start_epoch", "INTEGER")
+    _add_column(conn, "activities", "utc_offset", "INTEGER")
+
+    rows = conn.execute(
+        text(
+            "SELECT run_id, start_date FROM activities "
+            "WHERE start_epoch IS NULL AND start_date IS NOT NULL"
+        )
+    ).fetchall()
+    updates = []
+    for run_id, start_date in rows:
+        start_epoch, utc_offset = start_date_to_epoch(start_date)
+        if start_epoch is not None:
+            updates.append(
+                {"run_id": run_id, "epoch": start_epoch, "offset": utc_offset}
+            )
+    if updates:
+        print(f"Backfilling start_epoch for {len(updates)} activities")
+        conn.execute(
+            text(
+                "UPDATE activities SET start_epoch = :epoch, utc_offset = :offset "
+                "WHERE run_id = :run_id"
+            ),
+            updates,
+        )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_activities_start_epoch "
+        "ON activities (start_epoch)"
+    )
+
+
+@migration("create daily_totals")
+def _create_daily_totals(conn):
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS daily_totals ("
+        "local_date VARCHAR NOT NULL, "
+        "reps INTEGER NOT NULL, "
+        "sessions INTEGER NOT NULL, "
+        "elapsed_time INTEGER NOT NULL, "
+        "calories FLOAT NOT NULL, "
+        "PRIMARY KEY (local_date))"
+    )
+    rebuild_daily_totals(conn)
+
+
+@migration("create known_activities")
+def _create_known_activities(conn):
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS known_activities ("
+        "run_id INTEGER NOT NULL, "
+        "fingerprint VARCHAR NOT NULL, "
+        "start_epoch INTEGER, "
+        "skip_reason VARCHAR, "
+        "PRIMARY KEY (run_id))"
+    )
+    # seed from stored activities so the first sync skips their details too
+    rows = conn.execute(
+        text("SELECT run_id, name, elapsed_time, start_epoch FROM activities")
+    ).fetchall()
+    if rows:
+        conn.execute(
+            text(
+                "INSERT OR IGNORE INTO known_activities "
+                "(run_id, fingerprint, start_epoch) "
+                "VALUES (:run_id, :fingerprint, :start_epoch)"
+            ),
+            [
+                {
+                    "run_id": run_id,
+                    "fingerprint": activity_fingerprint(
+                        name, elapsed_time, start_epoch
+                    ),
+                    "start_epoch": start_epoch,
+                }
+                for run_id, name, elapsed_time, start_epoch in rows
+            ],
+        )
+
+
+@migration("create sync_journal")
+def _create_sync_journal(conn):
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS sync_journal ("
+        "id INTEGER NOT NULL, "
+        "window_start INTEGER NOT NULL, "
+        "window_end INTEGER NOT NULL, "
+        "watermark INTEGER NOT NULL, "
+        "processed INTEGER NOT NULL, "
+        "started_at INTEGER NOT NULL, "
+        "finished_at INTEGER, "
+        "PRIMARY KEY (id))"
+    )
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS sync_journal_ids ("
+        "journal_id INTEGER NOT NULL, "
+        "run_id INTEGER NOT NULL, "
+        "PRIMARY KEY (journal_id, run_id))"
+    )
+
+
+@migration("create backfill_partitions")
+def _create_backfill_partitions(conn):
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS backfill_partitions ("
+        "id INTEGER NOT NULL, "
+        "window_start INTEGER NOT NULL, "
+        "window_end INTEGER NOT NULL, "
+        "watermark INTEGER NOT NULL, "
+        "processed INTEGER NOT NULL, "
+        "finished_at INTEGER, "
+        "PRIMARY KEY (id), "
+        "UNIQUE (window_start, window_end))"
+    )
+
+
+@migration("track activity edits")
+def _track_activity_edits(conn):
+    # when an exported column of a stored activity last changed, so the CSV
+    # export can tell that appending new rows is no longer enough
+    conn.exec_driver_sql(
+        "CREATE TABLE IF NOT EXISTS activity_edits ("
+        "id INTEGER NOT NULL, "
+        "edited_at FLOAT NOT NULL, "
+        "PRIMARY KEY (id))"
+    )
+    changed = " OR ".join(
+        f"OLD.{key} IS NOT NEW.{key}" for key in ACTIVITY_KEYS if key != "run_id"
+    )
+    conn.exec_driver_sql(
+        "INSERT OR IGNORE INTO activity_edits (id, edited_at) VALUES (1, 0)"
+    )
+    # an UPDATE: the upsert's ON CONFLICT clause would override an OR REPLACE
+    touch = (
+        "UPDATE activity_edits "
+        "SET edited_at = (julianday('now') - 2440587.5) * 86400.0 WHERE id = 1;"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS activities_edited "
+        f"AFTER UPDATE ON activities WHEN {changed} BEGIN {touch} END"
+    )
+    conn.exec_driver_sql(
+        "CREATE TRIGGER IF NOT EXISTS activities_deleted "
+        f"AFTER DELETE ON activities BEGIN {touch} END"
+    )
+
+
+LATEST_VERSION = len(MIGRATIONS)
+
+
+def schema_version(conn):
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def migrate(engine):
+    """Bring the database behind ``engine`` to ``LATEST_VERSION``; returns it.
+
+    ``engine`` comes from ``get_engine``, whose ``begin`` listener emits the
+    ``BEGIN IMMEDIATE`` (pysqlite would commit DDL outside a transaction).
+    """
+    with engine.connect() as conn:
+        if schema_version(conn) >= LATEST_VERSION:
+            return schema_version(conn)
+        conn.rollback()
+
+        # take the write lock up front so concurrent starters run steps once
+        conn.execution_options(sqlite_begin="IMMEDIATE")
+        with conn.begin():
+            version = schema_version(conn)
+            for step in MIGRATIONS[version:]:
+                print(f"Migrating data.db to v{step.version}: {step.description}")
+                step.apply(conn)
+                conn.exec_driver_sql(f"PRAGMA user_version = {step.version}")
+                version = step.version
+    return version
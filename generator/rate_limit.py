@@ -0,0 +1,230 @@
+"""Client-side accounting of Strava's API rate limits.
+
+Strava allows a fixed number of requests per 15-minute window (reset on the
+quarter hour) and per UTC day, and reports the usage of both in the
+``X-ReadRateLimit-*`` / ``X-RateLimit-*`` response headers. ``RequestBudget``
+keeps its own count of both windows, takes one token before every API request
+and corrects the counts from those headers. The state is saved to a JSON file
+when a window rolls over, when a limit is reached and on ``close``, so a
+budget spent by one run is still known to the next.
+
+When the 15-minute window is spent the request waits for the next quarter;
+when the daily budget is spent (or the wait would exceed ``max_wait``) it
+raises ``RateLimitExceeded``, which ``Generator.sync`` treats as a clean stop.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from sqlalchemy import func, select
+from stravalib.exc import RateLimitExceeded
+from stravalib.util.limiter import get_rates_from_response_headers
+
+from .db import SKIP_NOT_PUSHUPS, KnownActivity
+from .strava_http import StravaSession
+
+SHORT_WINDOW = 15 * 60
+LONG_WINDOW = 24 * 60 * 60
+# Strava's default read limits, used until a response reports the real ones
+DEFAULT_SHORT_LIMIT = 100
+DEFAULT_LONG_LIMIT = 1000
+# requests left untouched in each window, for other users of the same app
+DEFAULT_RESERVE = 5
+
+PER_PAGE = 200
+DEFAULT_ACTIVITIES_PER_DAY = 2.0
+
+
+@dataclass
+class BudgetState:
+    short_window: int = 0
+    short_usage: int = 0
+    short_limit: int = DEFAULT_SHORT_LIMIT
+    long_window: int = 0
+    long_usage: int = 0
+    long_limit: int = DEFAULT_LONG_LIMIT
+
+
+class RequestBudget:
+    def __init__(
+        self,
+        state_path: Path | None = None,
+        *,
+        reserve: int = DEFAULT_RESERVE,
+        max_wait: float = SHORT_WINDOW,
+        clock=time.time,
+        sleep=time.sleep,
+    ) -> None:
+        self.state_path = state_path
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.state = self._load()
+
+    def _load(self) -> BudgetState:
+        if self.state_path is None:
+            return BudgetState()
+        try:
+            data = json.loads(Path(self.state_path).read_text("utf-8"))
+            return BudgetState(**data)
+        except (OSError, ValueError, TypeError):
+            return BudgetState()
+
+    def save(self) -> None:
+        if self.state_path is None:
+            return
+        path = Path(self.state_path)
+        temporary_path = path.with_suffix(f"{path.suffix}.tmp")
+        temporary_path.write_text(json.dumps(asdict(self.state)) + "\n", "utf-8")
+        temporary_path.replace(path)
+
+    def _roll(self, now: float) -> None:
+        """Start new windows (with a full budget) once their period is over."""
+        short_window = int(now // SHORT_WINDOW * SHORT_WINDOW)
+        long_window = int(now // LONG_WINDOW * LONG_WINDOW)
+        if (short_window, long_window) == (
+            self.state.short_window,
+            self.state.long_window,
+        ):
+            return
+        if short_window != self.state.short_window:
+            self.state.short_window, self.state.short_usage = short_window, 0
+        if long_window != self.state.long_window:
+            self.state.long_window, self.state.long_usage = long_window, 0
+        self.save()
+
+    def remaining(self) -> tuple[int, int]:
+        """Requests still available in the current 15-minute window and day."""
+        with self._lock:
+            self._roll(self._clock())
+            return (
+                self.state.short_limit - self.reserve - self.state.short_usage,
+                self.state.long_limit - self.reserve - self.state.long_usage,
+            )
+
+    def acquire(self) -> None:
+        """Take one request from both windows, waiting for the next quarter
+        hour if the short one is spent."""
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._roll(now)
+                state = self.state
+                if state.long_usage >= state.long_limit - self.reserve:
+                    self.save()
+                    resume = state.long_window + LONG_WINDOW
+                    print(
+                        "Daily Strava request budget used; resume after "
+                        + time.strftime("%Y-%m-%d %H:%M UTC", time.gmtime(resume))
+                    )
+                    raise RateLimitExceeded(
+                        "daily budget", timeout=resume - now, limit=state.long_limit
+                    )
+                if state.short_usage < state.short_limit - self.reserve:
+                    state.short_usage += 1
+                    state.long_usage += 1
+                    return
+                wait = state.short_window + SHORT_WINDOW - now + 1
+                if wait > self.max_wait:
+                    self.save()
+                    print(f"15-minute Strava request budget used; next in {wait:.0f}s")
+                    raise RateLimitExceeded(
+                        "15-minute budget", timeout=wait, limit=state.short_limit
+                    )
+            # sleep without the lock, so other workers (and the response hook)
+            # are not held up; every waiter checks the new window on waking
+            print(f"Strava request budget used, waiting {wait:.0f}s")
+            self._sleep(wait)
+
+    def __call__(self, headers, method) -> None:
+        """stravalib ``rate_limiter`` hook: adopt the usage Strava reports."""
+        rates = get_rates_from_response_headers(headers, method)
+        with self._lock:
+            self._roll(self._clock())
+            if rates is not None:
+                state = self.state
+                state.short_limit, state.long_limit = (
+                    rates.short_limit,
+                    rates.long_limit,
+                )
+                # local counts include requests still in flight
+                state.short_usage = max(state.short_usage, rates.short_usage)
+                state.long_usage = max(state.long_usage, rates.long_usage)
+
+    def close(self) -> None:
+        """Save the usage counted since the last window change."""
+        with self._lock:
+            self.save()
+
+    def session(self, **kwargs) -> StravaSession:
+        """A ``StravaSession`` that takes a token before each API request
+        (retries included); ``kwargs`` are passed on."""
+        return StravaSession(self, **kwargs)
+
+
+@dataclass
+class SyncPlan:
+    start_epoch: int
+    end_epoch: int
+    known: int
+    estimated_new: int
+    list_calls: int
+    detail_calls: int
+
+    @property
+    def total_calls(self) -> int:
+        return self.list_calls + self.detail_calls
+
+
+def plan_sync(session, start_epoch: int, end_epoch: int, *, force: bool = False):
+    """Estimate the API calls a sync of ``[start_epoch, end_epoch)`` needs.
+
+    Activities already in ``known_activities`` cost list entries only (or a
+    detail each with ``force``). The part of the window not covered by known
+    activities is extrapolated from their average rate; every new activity is
+    assumed to need a detail request, so the detail count is an upper bound.
+    """
+    in_window = (KnownActivity.start_epoch >= start_epoch) & (
+        KnownActivity.start_epoch < end_epoch
+    )
+    known, known_pushups = session.execute(
+        select(
+            func.count(),
+            func.count().filter(
+                KnownActivity.skip_reason.is_distinct_from(SKIP_NOT_PUSHUPS)
+            ),
+        ).where(in_window)
+    ).one()
+    first, last, total = session.execute(
+        select(
+            func.min(KnownActivity.start_epoch),
+            func.max(KnownActivity.start_epoch),
+            func.count(),
+        )
+    ).one()
+
+    if total:
+        span_days = max((last - first) / LONG_WINDOW, 1.0)
+        per_day = total / span_days
+        covered = max(0, min(end_epoch, last) - max(start_epoch, first))
+    else:
+        per_day, covered = DEFAULT_ACTIVITIES_PER_DAY, 0
+    uncovered_days = max(0, end_epoch - start_epoch - covered) / LONG_WINDOW
+    estimated_new = math.ceil(per_day * uncovered_days)
+
+    return SyncPlan(
+        start_epoch=start_epoch,
+        end_epoch=end_epoch,
+        known=known,
+        estimated_new=estimated_new,
+        list_calls=(known + estimated_new) // PER_PAGE + 1,
+        detail_calls=estimated_new + (known_pushups if force else 0),
+    )
@@ -0,0 +1,121 @@
+"""Local cache of the raw activity payloads Strava returned.
+
+``Generator`` keeps only a few numbers from each detail response; with a
+``RawActivityCache`` it also stores the response itself, so ``reparse`` can
+rebuild ``activities`` after a parser fix or schema change without a single
+API call.
+
+The cache is a separate SQLite file (it can grow well past ``data.db`` and is
+not committed). Payloads are stored once per content hash, zlib-compressed,
+and indexed by ``(run_id, fingerprint)``, the same fingerprint
+``known_activities`` uses to tell an edited activity from an unchanged one.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from itertools import groupby
+from typing import Iterator
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS payloads (
+    digest TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS raw_activities (
+    run_id INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    digest TEXT NOT NULL REFERENCES payloads (digest),
+    fetched_at INTEGER NOT NULL,
+    PRIMARY KEY (run_id, fingerprint)
+);
+"""
+
+
+def encode_payload(payload: dict) -> tuple[str, bytes]:
+    """``(sha256 of the canonical JSON, compressed JSON)`` for ``payload``."""
+    data = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha256(data).hexdigest(), zlib.compress(data)
+
+
+def decode_payload(data: bytes) -> dict:
+    return json.loads(zlib.decompress(data))
+
+
+class RawActivityCache:
+    """Thread-safe: ``Generator`` stores payloads from its detail workers."""
+
+    def __init__(self, path: str) -> None:
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode = WAL")
+        self._connection.execute("PRAGMA synchronous = NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def __enter__(self) -> RawActivityCache:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        """Number of cached activities."""
+        with self._lock:
+            (count,) = self._connection.execute(
+                "SELECT COUNT(DISTINCT run_id) FROM raw_activities"
+            ).fetchone()
+        return count
+
+    def put(self, run_id: int, fingerprint: str, payload: dict) -> str:
+        """Store ``payload`` as the version ``fingerprint`` of ``run_id``."""
+        digest, data = encode_payload(payload)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR IGNORE INTO payloads (digest, data) VALUES (?, ?)",
+                (digest, data),
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO raw_activities "
+                "(run_id, fingerprint, digest, fetched_at) VALUES (?, ?, ?, ?)",
+                (int(run_id), fingerprint, digest, int(time.time())),
+            )
+        return digest
+
+    def get(self, run_id: int) -> dict | None:
+        """The most recently fetched payload of ``run_id``."""
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT data FROM raw_activities JOIN payloads USING (digest) "
+                "WHERE run_id = ? ORDER BY fetched_at DESC, raw_activities.rowid DESC LIMIT 1",
+                (int(run_id),),
+            ).fetchone()
+        return decode_payload(row[0]) if row else None
+
+    def iter_latest(self) -> Iterator[tuple[int, dict]]:
+        """``(run_id, payload)`` of the newest version of every activity."""
+        for run_id, versions in groupby(self._iter_rows(), key=lambda row: row[0]):
+            *_, (_, data) = versions
+            yield run_id, decode_payload(data)
+
+    def _iter_rows(self, batch_size: int = 500) -> Iterator[tuple[int, bytes]]:
+        with self._lock:
+            cursor = self._connection.execute(
+                "SELECT run_id, data FROM raw_activities JOIN payloads "
+                "USING (digest) ORDER BY run_id, fetched_at, raw_activities.rowid"
+            )
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
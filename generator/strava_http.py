@@ -0,0 +1,95 @@
+"""The HTTP session ``Generator`` hands to ``stravalib.Client``.
+
+``StravaSession`` keeps a connection pool sized for the detail workers (so
+concurrent requests reuse keep-alive connections instead of reconnecting),
+applies a default timeout to every request and retries idempotent requests
+that failed transiently (connection errors, timeouts, 5xx) with exponential
+backoff and full jitter. With a ``RequestBudget`` every attempt, retries
+included, takes a token first, so retries are paced like any other request.
+A 429 is not retried here: stravalib raises ``RateLimitExceeded`` for it.
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# (connect, read) seconds
+DEFAULT_TIMEOUT = (5.0, 30.0)
+DEFAULT_RETRIES = 3
+DEFAULT_POOL_SIZE = 10
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+
+RETRY_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+RETRY_STATUSES = frozenset({500, 502, 503, 504})
+RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout)
+
+
+class StravaSession(requests.Session):
+    def __init__(
+        self,
+        budget=None,
+        *,
+        timeout: float | tuple[float, float] | None = DEFAULT_TIMEOUT,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = BACKOFF_BASE,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        sleep=time.sleep,
+        jitter=random.random,
+    ) -> None:
+        super().__init__()
+        self.budget = budget
+        self.timeout = timeout
+        self.retries = max(0, retries)
+        self.backoff = backoff
+        self._sleep = sleep
+        self._jitter = jitter
+        # attempts repeated after a transient failure, by any worker thread
+        self.retried = 0
+        self._retried_lock = threading.Lock()
+        adapter = HTTPAdapter(
+            pool_connections=2, pool_maxsize=max(1, pool_size), pool_block=True
+        )
+        self.mount("https://", adapter)
+        self.mount("http://", adapter)
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Full jitter: uniform in ``[0, backoff * 2**attempt]``, capped."""
+        return self._jitter() * min(BACKOFF_MAX, self.backoff * 2**attempt)
+
+    def request(self, method, url, *args, **kwargs):
+        if self.timeout is not None:
+            kwargs.setdefault("timeout", self.timeout)
+        # token refreshes do not count against the API limits
+        budgeted = self.budget is not None and "/oauth/" not in url
+        retries = self.retries if method.upper() in RETRY_METHODS else 0
+        attempt = 0
+        while True:
+            if budgeted:
+                self.budget.acquire()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except RETRY_EXCEPTIONS as exc:
+                if attempt >= retries:
+                    raise
+                reason = type(exc).__name__
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt >= retries:
+                    return response
+                reason = f"HTTP {response.status_code}"
+                response.close()
+            delay = self.backoff_delay(attempt)
+            attempt += 1
+            with self._retried_lock:
+                self.retried += 1
+            print(
+                f"{method} {urlsplit(url).path} failed ({reason}); "
+                f"retry {attempt}/{retries} in {delay:.1f}s"
+            )
+            self._sleep(delay)
@@ -1,11 +1,22 @@
 from __future__ import annotations
 
+import os
 from pathlib import Path
 
 REPO_ROOT = Path(__file__).resolve().parents[1]
 ASSETS_DIR = REPO_ROOT / "assets"
 DB_PATH = REPO_ROOT / "data.db"
 CSV_PATH = REPO_ROOT / "pushup_data.csv"
+SNAPSHOT_DIR = REPO_ROOT / ".snapshot"
+# raw Strava activity payloads, for ``db reparse`` (see generator.raw_cache)
+RAW_CACHE_PATH = REPO_ROOT / ".strava-cache.db"
 
 # Backwards-compatible alias used throughout the project.
 SQL_FILE = str(DB_PATH)
+
+# SQLite storage options (see generator.db.init_db). PUSHUP_DB_WAL=1 switches
+# data.db to WAL so sync and rendering can run side by side;
+# PUSHUP_DB_IMMUTABLE=1 lets render-only commands open it as an immutable file
+# (its schema must be current: run `pdm run db migrate` once after a checkout).
+DB_WAL = os.getenv("PUSHUP_DB_WAL", "").lower() in {"1", "true", "yes"}
+DB_IMMUTABLE = os.getenv("PUSHUP_DB_IMMUTABLE", "").lower() in {"1", "true", "yes"}
@@ -0,0 +1,83 @@
+"""Read activities from the committed ``pushup_data.csv``.
+
+Render commands use this with ``--source csv`` to skip SQLAlchemy and
+``generator.db`` entirely; keep the imports here to the standard library.
+"""
+
+from __future__ import annotations
+
+import csv
+import datetime as dt
+from collections import namedtuple
+from typing import Iterator
+
+from pushup_page.config import CSV_PATH
+from pushup_page.stats import ACTIVITY_KEYS, DayTotal, aggregate_daily_totals
+
+# the header written by the CSV export
+CSV_COLUMNS = ACTIVITY_KEYS
+
+CsvActivity = namedtuple(
+    "CsvActivity", CSV_COLUMNS + ["start_epoch", "utc_offset", "local_date"]
+)
+
+
+def parse_start_date(start_date: str) -> tuple[int, int, str]:
+    """Return ``(epoch, utc_offset, local_date)`` for an exported ``start_date``.
+
+    The export writes ``str(datetime)`` ("2025-05-09 21:14:19+00:00"), which
+    ``datetime.fromisoformat`` parses directly. Naive values are UTC.
+    """
+    start = dt.datetime.fromisoformat(start_date)
+    if start.tzinfo is None:
+        start = start.replace(tzinfo=dt.timezone.utc)
+    offset = start.utcoffset() or dt.timedelta(0)
+    return int(start.timestamp()), int(offset.total_seconds()), start_date[:10]
+
+
+def _int(value: str) -> int | None:
+    return int(value) if value else None
+
+
+def _float(value: str) -> float | None:
+    return float(value) if value else None
+
+
+def iter_csv_activities(csv_path: str = str(CSV_PATH)) -> Iterator[CsvActivity]:
+    """Stream the CSV rows in file order.
+
+    Rows without a start date are skipped; malformed rows (wrong number of
+    fields, unparsable values) are reported and skipped.
+    """
+    with open(csv_path, newline="", encoding="utf-8") as csvfile:
+        reader = csv.reader(csvfile)
+        header = next(reader, None)
+        if header != CSV_COLUMNS:
+            raise ValueError(f"Unexpected CSV header in {csv_path}: {header}")
+        for row in reader:
+            try:
+                run_id, name, start_date, elapsed, count, avg_time, calories = row
+                if not start_date:
+                    continue
+                start_epoch, utc_offset, local_date = parse_start_date(start_date)
+                activity = CsvActivity(
+                    int(run_id),
+                    name,
+                    start_date,
+                    _int(elapsed),
+                    _int(count),
+                    _float(avg_time),
+                    _float(calories),
+                    start_epoch,
+                    utc_offset,
+                    local_date,
+                )
+            except ValueError:
+                print(f"Could not parse CSV row: {row}")
+                continue
+            yield activity
+
+
+def load_daily_totals(csv_path: str = str(CSV_PATH)) -> list[DayTotal]:
+    """Per-day totals from the CSV, shaped like ``DailyTotal`` rows."""
+    return aggregate_daily_totals(iter_csv_activities(csv_path))
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import argparse
+import os
+
+from generator.db import rebuild_daily_totals
+from pushup_page.config import CSV_PATH, RAW_CACHE_PATH, SNAPSHOT_DIR, SQL_FILE
+from pushup_page.storage import open_session
+
+
+def run_rebuild_daily_totals(db_path: str = SQL_FILE) -> int:
+    with open_session(db_path) as session:
+        days = rebuild_daily_totals(session)
+        session.commit()
+    return days
+
+
+def run_reparse(db_path: str = SQL_FILE, cache_path: str = str(RAW_CACHE_PATH)):
+    """Re-parse every cached raw payload into ``db_path``; returns the stats."""
+    from generator import Generator
+    from generator.raw_cache import RawActivityCache
+
+    if not os.path.exists(cache_path):
+        raise SystemExit(f"No raw payload cache at {cache_path}; run a sync first.")
+    with RawActivityCache(cache_path) as raw_cache:
+        generator = Generator(db_path, raw_cache=raw_cache)
+        try:
+            generator.reparse()
+        finally:
+            generator.close()
+    return generator.stats
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Maintenance tasks for data.db.")
+    parser.add_argument(
+        "--db", dest="db_path", default=SQL_FILE, help="Path to the SQLite database."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("migrate", help="Apply pending schema migrations.")
+    subparsers.add_parser(
+        "rebuild-daily-totals", help="Recompute daily_totals from activities."
+    )
+    snapshot_parser = subparsers.add_parser(
+        "build-snapshot", help="Write the columnar activity snapshot."
+    )
+    snapshot_parser.add_argument(
+        "--output", dest="snapshot_dir", default=str(SNAPSHOT_DIR), metavar="DIR"
+    )
+    reparse_parser = subparsers.add_parser(
+        "reparse", help="Rebuild activities from the raw Strava payload cache."
+    )
+    reparse_parser.add_argument(
+        "--cache", dest="cache_path", default=str(RAW_CACHE_PATH), metavar="FILE"
+    )
+    export_parser = subparsers.add_parser(
+        "export-csv", help="Mirror activities into pushup_data.csv."
+    )
+    export_parser.add_argument(
+        "--output", dest="csv_path", default=str(CSV_PATH), metavar="FILE"
+    )
+    export_parser.add_argument(
+        "--full",
+        dest="incremental",
+        action="store_false",
+        help="Rewrite the whole file instead of appending new rows.",
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "migrate":
+        from generator.db import get_engine
+        from generator.migrations import schema_version
+
+        with get_engine(args.db_path).connect() as conn:
+            print(f"data.db schema version: {schema_version(conn)}")
+    elif args.command == "rebuild-daily-totals":
+        days = run_rebuild_daily_totals(args.db_path)
+        print(f"Rebuilt daily_totals: {days} days")
+    elif args.command == "build-snapshot":
+        from pushup_page.snapshot import build_snapshot
+
+        header = build_snapshot(args.db_path, args.snapshot_dir)
+        print(f"Wrote snapshot of {header['rows']} activities to {args.snapshot_dir}")
+    elif args.command == "reparse":
+        run_reparse(args.db_path, args.cache_path)
+    elif args.command == "export-csv":
+        from pushup_page.strava_sync import export_activities_to_csv
+
+        export_activities_to_csv(
+            args.db_path, args.csv_path, incremental=args.incremental
+        )
+
+
+if __name__ == "__main__":
+    main()
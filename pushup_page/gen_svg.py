@@ -15,7 +15,7 @@ from gpxtrackposter import (
     track_loader,
 )
 from gpxtrackposter.exceptions import ParameterError, PosterError
-from pushup_page.config import ASSETS_DIR, SQL_FILE
+from pushup_page.config import ASSETS_DIR, DB_IMMUTABLE, SQL_FILE
 from pushup_page.stats import activity_dates_from_tracks, calculate_streak
 
 # from flopp great repo
@@ -145,6 +145,16 @@ def main():
         help="activities db file",
     )
 
+    args_parser.add_argument(
+        "--source",
+        dest="source",
+        choices=["db", "snapshot", "csv"],
+        default="db",
+        help='Where to read activities from; "snapshot" uses the memory-mapped '
+        'columnar snapshot of data.db, rebuilt when it is stale, "csv" reads '
+        'pushup_data.csv without the database (default: "db").',
+    )
+
     args_parser.add_argument(
         "--github-style",
         dest="github_style",
@@ -199,8 +209,18 @@ def main():
 
     loader.set_min_count(args.min_count)
 
-    # Only support loading tracks from DB
-    tracks = loader.load_tracks_from_db(SQL_FILE, args.type == "grid")
+    if args.source == "csv":
+        from pushup_page.csv_source import iter_csv_activities
+
+        tracks = loader.load_tracks_from_rows(iter_csv_activities())
+    elif args.source == "snapshot":
+        from pushup_page.snapshot import load_snapshot
+
+        tracks = loader.load_tracks_from_rows(load_snapshot(SQL_FILE).iter_rows())
+    else:
+        tracks = loader.load_tracks_from_db(
+            SQL_FILE, args.type == "grid", immutable=DB_IMMUTABLE
+        )
 
     if not tracks:
         return
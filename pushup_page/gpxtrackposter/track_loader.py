@@ -22,7 +22,6 @@ from .exceptions import ParameterError, TrackLoadError
 from .timezone_adjuster import TimezoneAdjuster
 from .track import Track
 from .year_range import YearRange
-from generator.db import init_db, Activity
 
 log = logging.getLogger(__name__)
 
@@ -156,22 +155,53 @@ class TrackLoader:
         self._store_strava_tracks_to_cache(tracks)
         return self._filter_and_merge_tracks(tracks)
 
-    def load_tracks_from_db(self, db_file, with_polyine) -> typing.List[Track]:
-        session = init_db(db_file)
-        activities = session.query(Activity).all()
+    def load_tracks_from_db(
+        self, db_file, with_polyine, immutable=False
+    ) -> typing.List[Track]:
+        # imported here so CSV/snapshot rendering does not load SQLAlchemy
+        from generator.db import init_db
+        from pushup_page.storage import iter_activities
+
+        session = init_db(db_file, read_only=True, immutable=immutable)
+        # narrow the scan by year; the exact check stays in _filter_tracks
+        start = end = None
+        if self.year_range.from_year is not None:
+            start = datetime.datetime(
+                self.year_range.from_year, 1, 1, tzinfo=datetime.timezone.utc
+            ) - datetime.timedelta(days=1)
+        if self.year_range.to_year is not None:
+            end = datetime.datetime(
+                self.year_range.to_year + 1, 1, 1, tzinfo=datetime.timezone.utc
+            ) + datetime.timedelta(days=1)
+        activities = iter_activities(
+            session,
+            ("run_id", "start_epoch", "utc_offset", "elapsed_time", "count"),
+            start=start,
+            end=end,
+        )
+        try:
+            return self.load_tracks_from_rows(activities)
+        finally:
+            session.close()
+
+    def load_tracks_from_rows(self, activities) -> typing.List[Track]:
+        """Build tracks from rows with run_id, start_epoch, utc_offset,
+        elapsed_time and count (DB rows, snapshot rows, ...)."""
         tracks = []
         for activity in activities:
+            if activity.start_epoch is None:
+                continue
             t = Track()
             t.file_names = [str(activity.run_id)]
-            start_date = datetime.datetime.fromisoformat(activity.start_date)
+            tz = datetime.timezone(
+                datetime.timedelta(seconds=activity.utc_offset or 0)
+            )
+            start_date = datetime.datetime.fromtimestamp(activity.start_epoch, tz)
             t.set_start_time(start_date)
             t.set_end_time(
                 start_date + datetime.timedelta(seconds=activity.elapsed_time)
             )
             t.count = activity.count
-            if with_polyine:
-                # TODO: get polyline from db
-                pass
             tracks.append(t)
         return self._filter_and_merge_tracks(tracks)
 
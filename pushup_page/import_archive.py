@@ -0,0 +1,179 @@
+"""Import push-up sessions from a Strava bulk-export archive.
+
+Strava's "Download or delete your account" export is a ZIP whose
+``activities.csv`` lists every activity with its name, description and
+elapsed time. ``import_archive`` streams that member straight out of the ZIP
+(nothing is extracted to disk) and stores it through ``Generator``, so the
+rows are filtered and parsed exactly like a sync would and are remembered in
+``known_activities``. Rebuilding years of history takes seconds and no API
+calls; a later ``strava_sync`` then starts after the newest imported session
+and only lists what is newer.
+
+    pdm run import-archive export_12345678.zip
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import datetime as dt
+import io
+import zipfile
+from collections import Counter
+from contextlib import contextmanager
+from typing import IO, Iterator, NamedTuple
+
+from dateutil.parser import parse
+
+from generator import Generator
+from generator.db import checkpoint, enable_wal
+from pushup_page.config import CSV_PATH, DB_WAL, SQL_FILE
+from pushup_page.strava_sync import export_activities_to_csv
+
+ACTIVITIES_CSV = "activities.csv"
+# rows committed together; the archive is local, so chunks can be large
+IMPORT_CHUNK_SIZE = 500
+
+ID_COLUMN = "Activity ID"
+DATE_COLUMN = "Activity Date"
+NAME_COLUMN = "Activity Name"
+DESCRIPTION_COLUMN = "Activity Description"
+ELAPSED_TIME_COLUMN = "Elapsed Time"
+REQUIRED_COLUMNS = (ID_COLUMN, DATE_COLUMN, NAME_COLUMN, DESCRIPTION_COLUMN)
+
+
+class ArchiveActivity(NamedTuple):
+    """The ``DetailedActivity`` fields ``Generator`` reads, from one CSV row."""
+
+    id: int
+    name: str
+    start_date: dt.datetime
+    elapsed_time: int | None
+    description: str | None
+
+
+@contextmanager
+def open_activities_csv(archive_path: str) -> Iterator[IO[str]]:
+    """Open ``activities.csv`` inside the export ZIP (or a plain CSV) as text."""
+    if not zipfile.is_zipfile(archive_path):
+        with open(archive_path, newline="", encoding="utf-8-sig") as csvfile:
+            yield csvfile
+        return
+    with zipfile.ZipFile(archive_path) as archive:
+        # the export may wrap everything in a top-level directory
+        members = sorted(
+            (
+                name
+                for name in archive.namelist()
+                if name.rsplit("/", 1)[-1] == ACTIVITIES_CSV
+            ),
+            key=len,
+        )
+        if not members:
+            raise SystemExit(f"No {ACTIVITIES_CSV} in {archive_path}")
+        with archive.open(members[0]) as member:
+            yield io.TextIOWrapper(member, encoding="utf-8-sig", newline="")
+
+
+def iter_archive_activities(
+    csvfile: IO[str], stats: Counter | None = None
+) -> Iterator[ArchiveActivity]:
+    """Stream the rows of an export's ``activities.csv``.
+
+    Column positions come from the header; where it repeats a name (newer
+    exports list ``Elapsed Time`` twice) the first column wins. Rows without
+    a usable id or date are skipped and counted as ``unreadable``.
+    """
+    reader = csv.reader(csvfile)
+    header = next(reader, None) or []
+    columns: dict[str, int] = {}
+    for index, name in enumerate(header):
+        columns.setdefault(name.strip(), index)
+    missing = [name for name in REQUIRED_COLUMNS if name not in columns]
+    if missing:
+        raise SystemExit(
+            f"Not a Strava activities.csv: missing {', '.join(missing)} columns"
+        )
+
+    def value(row: list[str], name: str) -> str:
+        index = columns.get(name)
+        return row[index].strip() if index is not None and index < len(row) else ""
+
+    for row in reader:
+        try:
+            run_id = int(value(row, ID_COLUMN))
+            # exported dates are UTC, e.g. "Jan 5, 2025, 7:30:00 AM"
+            start_date = parse(value(row, DATE_COLUMN))
+        except (ValueError, OverflowError):
+            print(f"skip unreadable archive row {row[:2]}")
+            if stats is not None:
+                stats["unreadable"] += 1
+            continue
+        if start_date.tzinfo is None:
+            start_date = start_date.replace(tzinfo=dt.timezone.utc)
+        try:
+            elapsed_time = int(float(value(row, ELAPSED_TIME_COLUMN)))
+        except ValueError:
+            elapsed_time = None
+        yield ArchiveActivity(
+            run_id,
+            value(row, NAME_COLUMN),
+            start_date,
+            elapsed_time,
+            value(row, DESCRIPTION_COLUMN) or None,
+        )
+
+
+def import_archive(
+    archive_path: str,
+    *,
+    db_path: str = SQL_FILE,
+    csv_path: str = str(CSV_PATH),
+    export_csv: bool = True,
+    chunk_size: int = IMPORT_CHUNK_SIZE,
+) -> Counter:
+    """Store the push-up sessions of a Strava export in ``db_path``; returns
+    ``Generator.stats``."""
+    if DB_WAL:
+        enable_wal(db_path)
+    generator = Generator(db_path, chunk_size=chunk_size)
+    try:
+        with open_activities_csv(archive_path) as csvfile:
+            generator.store_details(iter_archive_activities(csvfile, generator.stats))
+    finally:
+        generator.close()
+    stats = generator.stats
+    print(
+        f"\n{stats['created']} activities created, {stats['updated']} updated "
+        f"from {archive_path}"
+    )
+
+    if DB_WAL:
+        checkpoint(db_path)
+    if export_csv:
+        export_activities_to_csv(db_path, csv_path, incremental=not stats["updated"])
+    return stats
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Import push-up activities from a Strava bulk-export archive."
+    )
+    parser.add_argument(
+        "archive", help="The export ZIP (or its activities.csv) from Strava."
+    )
+    parser.add_argument(
+        "--db", dest="db_path", default=SQL_FILE, help="Path to the SQLite database."
+    )
+    parser.add_argument(
+        "--no-export-csv",
+        dest="export_csv",
+        action="store_false",
+        help="Skip exporting DB rows to pushup_data.csv.",
+    )
+    args = parser.parse_args(argv)
+    import_archive(args.archive, db_path=args.db_path, export_csv=args.export_csv)
+
+
+if __name__ == "__main__":
+    main()
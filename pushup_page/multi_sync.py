@@ -0,0 +1,340 @@
+"""Sync several Strava accounts side by side.
+
+Accounts are listed in a TOML file::
+
+    # directory for accounts without explicit paths (default: accounts/)
+    data_dir = "accounts"
+    jobs = 4
+
+    [[accounts]]
+    name = "andy"
+    client_id = "12345"
+    client_secret_env = "ANDY_CLIENT_SECRET"
+    refresh_token_env = "ANDY_REFRESH_TOKEN"
+
+    [[accounts]]
+    name = "bea"
+    client_id = "12345"
+    client_secret_env = "BEA_CLIENT_SECRET"
+    refresh_token_env = "BEA_REFRESH_TOKEN"
+    db_path = "bea.db"
+
+Each secret may be given inline or, preferably, as the name of an
+environment variable (``<key>_env``). Every account gets its own database,
+CSV, encrypted token file and raw payload cache under
+``<data_dir>/<name>/`` unless paths are given; relative paths are resolved
+against the config file.
+
+Strava counts its rate limits per API application, not per athlete, so
+accounts sharing a ``client_id`` share one request budget, saved next to the
+config as ``.strava-rate-limit-<client_id>.json``; accounts on different
+applications are paced independently. Up to ``jobs`` accounts sync at once,
+so a run takes about as long as its slowest account. Their output is
+interleaved line by line, each line prefixed with ``[<name>]``. A failing
+account does not stop the others; the run report lists every account's
+outcome.
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import io
+import json
+import os
+import sys
+import threading
+import time
+import tomllib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable
+
+import requests
+
+from generator import DEFAULT_DETAIL_WORKERS
+from generator.rate_limit import RequestBudget
+from pushup_page.strava_sync import run_strava_sync
+from pushup_page.strava_token import StravaTokenStore
+
+DEFAULT_JOBS = 4
+DEFAULT_DATA_DIR = "accounts"
+
+
+@dataclass
+class AccountConfig:
+    name: str
+    client_id: str
+    client_secret: str
+    refresh_token: str | None
+    db_path: Path
+    csv_path: Path
+    token_path: Path
+    raw_cache_path: Path
+    start_date: dt.datetime | None = None
+    detail_workers: int = DEFAULT_DETAIL_WORKERS
+    export_csv: bool = True
+
+
+@dataclass
+class AccountReport:
+    name: str
+    status: str = "ok"
+    error: str | None = None
+    seconds: float = 0.0
+    stats: dict[str, Any] = field(default_factory=dict)
+
+
+def _secret(entry: dict, key: str, required: bool = True) -> str | None:
+    value = entry.get(key)
+    variable = entry.get(f"{key}_env")
+    if value is None and variable:
+        value = os.getenv(variable)
+    if value is None and required:
+        where = f"${variable}" if variable else f"{key} / {key}_env"
+        raise SystemExit(f"Account {entry.get('name')!r}: missing {key} ({where})")
+    return None if value is None else str(value)
+
+
+def load_accounts(config_path: Path) -> tuple[list[AccountConfig], int]:
+    """Parse the accounts config; returns the accounts and the ``jobs`` setting."""
+    config_path = Path(config_path)
+    config = tomllib.loads(config_path.read_text("utf-8"))
+    base = config_path.parent
+    data_dir = base / config.get("data_dir", DEFAULT_DATA_DIR)
+
+    accounts = []
+    names = set()
+    for entry in config.get("accounts", []):
+        name = entry.get("name")
+        if not name or name in names:
+            raise SystemExit(f"Every account needs a unique name, got {name!r}")
+        names.add(name)
+        account_dir = data_dir / name
+
+        def path(key: str, default: str, account_dir=account_dir) -> Path:
+            return base / entry[key] if key in entry else account_dir / default
+
+        start_date = entry.get("start_date")
+        if isinstance(start_date, str):
+            start_date = dt.datetime.fromisoformat(start_date)
+        accounts.append(
+            AccountConfig(
+                name=name,
+                client_id=_secret(entry, "client_id"),
+                client_secret=_secret(entry, "client_secret"),
+                refresh_token=_secret(entry, "refresh_token", required=False),
+                db_path=path("db_path", "data.db"),
+                csv_path=path("csv_path", "pushup_data.csv"),
+                token_path=path("token_path", ".strava-refresh-token.enc"),
+                raw_cache_path=path("raw_cache_path", ".strava-cache.db"),
+                start_date=start_date,
+                detail_workers=entry.get("detail_workers", DEFAULT_DETAIL_WORKERS),
+                export_csv=entry.get("export_csv", True),
+            )
+        )
+    if not accounts:
+        raise SystemExit(f"No [[accounts]] configured in {config_path}")
+    return accounts, int(config.get("jobs", DEFAULT_JOBS))
+
+
+class AccountOutput(io.TextIOBase):
+    """``sys.stdout`` while accounts sync: complete lines are written with the
+    ``[<name>]`` of the account whose thread wrote them.
+
+    A sync's worker threads are named after the thread that started them
+    (``<account thread>/strava-detail_0``), so their retries and progress are
+    attributed too. Output of other threads passes through unchanged.
+    """
+
+    def __init__(self, stream) -> None:
+        self.stream = stream
+        # thread name -> account name
+        self.accounts: dict[str, str] = {}
+        self._partial: dict[int, str] = {}
+        self._lock = threading.Lock()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        owner = threading.current_thread().name.split("/", 1)[0]
+        account = self.accounts.get(owner)
+        if account is None:
+            return self.stream.write(text)
+        thread = threading.get_ident()
+        with self._lock:
+            *lines, rest = (self._partial.pop(thread, "") + text).split("\n")
+            if rest:
+                self._partial[thread] = rest
+            for line in lines:
+                self.stream.write(f"[{account}] {line}\n")
+        return len(text)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+    def start(self, account: str) -> None:
+        """Attribute the current thread's output (and its workers') to ``account``."""
+        self.accounts[threading.current_thread().name] = account
+
+    def finish(self) -> None:
+        """End the current thread's last line and stop attributing its output."""
+        account = self.accounts.pop(threading.current_thread().name)
+        with self._lock:
+            rest = self._partial.pop(threading.get_ident(), "")
+            if rest:
+                self.stream.write(f"[{account}] {rest}\n")
+
+
+def shared_budgets(
+    accounts: list[AccountConfig], state_dir: Path
+) -> dict[str, RequestBudget]:
+    """One ``RequestBudget`` per Strava application (``client_id``)."""
+    budgets = {}
+    for account in accounts:
+        if account.client_id not in budgets:
+            state_path = state_dir / f".strava-rate-limit-{account.client_id}.json"
+            budgets[account.client_id] = RequestBudget(state_path)
+    return budgets
+
+
+def sync_account(
+    account: AccountConfig,
+    budget: RequestBudget,
+    requests_session: requests.Session | None = None,
+) -> AccountReport:
+    report = AccountReport(account.name)
+    started = time.perf_counter()
+    try:
+        for path in (account.db_path, account.csv_path, account.token_path):
+            path.parent.mkdir(parents=True, exist_ok=True)
+        token_store = StravaTokenStore(account.token_path, account.client_secret)
+        tokens = token_store.load_tokens(account.refresh_token)
+        stats = run_strava_sync(
+            client_id=account.client_id,
+            client_secret=account.client_secret,
+            refresh_token=tokens.refresh_token,
+            start_date=account.start_date,
+            export_csv=account.export_csv,
+            token_store=token_store,
+            detail_workers=account.detail_workers,
+            budget=budget,
+            db_path=str(account.db_path),
+            csv_path=str(account.csv_path),
+            requests_session=requests_session,
+            raw_cache_path=str(account.raw_cache_path),
+            access_token=tokens.access_token,
+            expires_at=tokens.expires_at,
+        )
+        report.stats = dict(stats)
+        if stats["rate_limited"]:
+            report.status = "rate-limited"
+    except (Exception, SystemExit) as exc:
+        report.status = "failed"
+        report.error = f"{type(exc).__name__}: {exc}"
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def sync_accounts(
+    accounts: list[AccountConfig],
+    *,
+    jobs: int = DEFAULT_JOBS,
+    budgets: dict[str, RequestBudget],
+    session_factory: Callable[[RequestBudget], requests.Session] | None = None,
+) -> list[AccountReport]:
+    """Sync ``accounts`` with up to ``jobs`` at once; reports keep their order.
+
+    ``session_factory`` builds each account's HTTP session from its budget
+    (default: ``budget.session()``).
+    """
+
+    output = AccountOutput(sys.stdout)
+
+    def run(account: AccountConfig) -> AccountReport:
+        budget = budgets[account.client_id]
+        session = session_factory(budget) if session_factory else budget.session()
+        output.start(account.name)
+        print(f"syncing into {account.db_path}")
+        try:
+            return sync_account(account, budget, session)
+        finally:
+            output.finish()
+            session.close()
+
+    with (
+        redirect_stdout(output),
+        ThreadPoolExecutor(
+            max_workers=max(1, jobs), thread_name_prefix="strava-account"
+        ) as executor,
+    ):
+        return list(executor.map(run, accounts))
+
+
+def print_report(reports: list[AccountReport], seconds: float) -> None:
+    width = max(len("account"), *(len(report.name) for report in reports))
+    print(
+        f"\n{'account':<{width}}  {'status':<12} {'created':>7} {'updated':>7} "
+        f"{'details':>7} {'seconds':>8}"
+    )
+    totals: Counter[str] = Counter()
+    for report in reports:
+        stats = report.stats
+        print(
+            f"{report.name:<{width}}  {report.status:<12} "
+            f"{stats.get('created', 0):>7} {stats.get('updated', 0):>7} "
+            f"{stats.get('details', 0):>7} {report.seconds:>8.1f}"
+        )
+        if report.error:
+            print(f"{'':<{width}}  {report.error}")
+        totals.update({key: stats.get(key, 0) for key in ("created", "updated")})
+    slowest = max(report.seconds for report in reports)
+    print(
+        f"{len(reports)} accounts: {totals['created']} activities created, "
+        f"{totals['updated']} updated in {seconds:.1f}s "
+        f"(slowest account {slowest:.1f}s)"
+    )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Sync push-up activities for several Strava accounts."
+    )
+    parser.add_argument("config", type=Path, help="TOML file listing the accounts.")
+    parser.add_argument(
+        "--jobs", type=int, help="Accounts to sync at once (default: from config)."
+    )
+    parser.add_argument(
+        "--report",
+        type=Path,
+        metavar="FILE",
+        help="Also write the run report as JSON.",
+    )
+    args = parser.parse_args(argv)
+
+    accounts, jobs = load_accounts(args.config)
+    budgets = shared_budgets(accounts, args.config.parent)
+    started = time.perf_counter()
+    reports = sync_accounts(accounts, jobs=args.jobs or jobs, budgets=budgets)
+    seconds = time.perf_counter() - started
+    print_report(reports, seconds)
+
+    if args.report is not None:
+        args.report.write_text(
+            json.dumps(
+                {"seconds": seconds, "accounts": [asdict(r) for r in reports]},
+                indent=2,
+            )
+            + "\n",
+            "utf-8",
+        )
+    if any(report.status == "failed" for report in reports):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,49 +1,51 @@
 from __future__ import annotations
 
+import argparse
 import datetime as dt
 from collections import defaultdict
 
 import svgwrite
-from dateutil.parser import parse
 
 from pushup_page.config import ASSETS_DIR
-from pushup_page.stats import (
-    activity_dates_from_start_date_strings,
-)
 from pushup_page.stats import (
     calculate_streak as calculate_date_streak,
 )
-from pushup_page.storage import list_activities, open_session
+from pushup_page.stats import epoch_to_datetime
+
+# The database modules pull in SQLAlchemy and stravalib; they are imported
+# lazily so `--source csv` runs on the standard library and svgwrite alone.
+
+
+def get_data(source: str = "db"):
+    """Fetches per-day totals from the database, its snapshot or the CSV."""
+    if source == "csv":
+        from pushup_page.csv_source import load_daily_totals
 
+        return load_daily_totals()
+    if source == "snapshot":
+        from pushup_page.snapshot import load_snapshot
 
-def get_data():
-    """Fetches activity data from the database."""
-    with open_session() as session:
-        return list_activities(session)
+        return load_snapshot().daily_totals()
 
+    from pushup_page.storage import list_daily_totals, open_session
 
-def parse_activity_datetime(start_date: str) -> dt.datetime | None:
-    try:
-        return dt.datetime.fromisoformat(start_date)
-    except ValueError:
-        try:
-            return parse(start_date)
-        except (ValueError, TypeError):
-            return None
+    with open_session(read_only=True) as session:
+        return list_daily_totals(session)
 
 
 def process_data(activities):
-    """Processes activities to get yearly, monthly, and weekly totals."""
+    """Processes activities to get yearly, monthly, and weekly totals.
+
+    Accepts ``Activity`` objects or rows from ``storage.iter_activities`` that
+    include ``start_epoch``, ``utc_offset`` and ``count``.
+    """
     yearly = defaultdict(int)
     monthly = defaultdict(int)
     weekly = defaultdict(int)
 
     for act in activities:
-        if act.start_date and act.count:
-            date = parse_activity_datetime(act.start_date)
-            if date is None:
-                print(f"Could not parse date: {act.start_date}")
-                continue
+        if act.start_epoch is not None and act.count:
+            date = epoch_to_datetime(act.start_epoch, act.utc_offset)
 
             yearly[date.year] += act.count
             monthly[date.strftime("%Y-%m")] += act.count
@@ -54,6 +56,24 @@ def process_data(activities):
     return yearly, monthly, weekly
 
 
+def process_daily_totals(daily_totals):
+    """Same as ``process_data`` but starting from the ``daily_totals`` rows."""
+    yearly = defaultdict(int)
+    monthly = defaultdict(int)
+    weekly = defaultdict(int)
+
+    for day in daily_totals:
+        if not day.reps:
+            continue
+        date = dt.date.fromisoformat(day.local_date)
+        yearly[date.year] += day.reps
+        monthly[date.strftime("%Y-%m")] += day.reps
+        first_day_of_week = date - dt.timedelta(days=(date.weekday() + 1) % 7)
+        weekly[first_day_of_week.strftime("%Y-%m-%d")] += day.reps
+
+    return yearly, monthly, weekly
+
+
 def draw_bar_chart(dwg, data, title, width, height, bar_padding=5):
     """Draws a single bar chart into the SVG drawing."""
     if not data:
@@ -138,22 +158,36 @@ def draw_bar_chart(dwg, data, title, width, height, bar_padding=5):
 
 def calculate_activity_streak(activities):
     """Backward-compatible wrapper for the old API."""
-    dates = activity_dates_from_start_date_strings(
-        act.start_date for act in activities if act.start_date
-    )
+    dates = [
+        epoch_to_datetime(act.start_epoch, act.utc_offset).date()
+        for act in activities
+        if act.start_epoch is not None
+    ]
     return calculate_date_streak(dates)
 
 
-def main():
+def main(argv: list[str] | None = None):
     """Main function to generate the bar chart SVG."""
-    activities = get_data()
-    if not activities:
+    parser = argparse.ArgumentParser(description="Generate push-up summary charts.")
+    parser.add_argument(
+        "--source",
+        choices=["db", "snapshot", "csv"],
+        default="db",
+        help='Where to read activities from; "csv" reads pushup_data.csv without '
+        'touching the database (default: "db").',
+    )
+    args = parser.parse_args(argv)
+
+    daily_totals = get_data(args.source)
+    if not daily_totals:
         print("No data found in database.")
         return
 
-    yearly_data, monthly_data, weekly_data = process_data(activities)
+    yearly_data, monthly_data, weekly_data = process_daily_totals(daily_totals)
 
-    streak = calculate_activity_streak(activities)
+    streak = calculate_date_streak(
+        dt.date.fromisoformat(day.local_date) for day in daily_totals
+    )
     print(f"Current streak: {streak} days")
 
     ASSETS_DIR.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,207 @@
+"""Columnar, memory-mapped snapshot of the ``activities`` table.
+
+Render commands can load the whole dataset from a handful of ``.npy`` files
+instead of going through SQLite and the ORM. The snapshot header records the
+size, mtime and hash of ``data.db``; a snapshot is reused until the database
+changes, and the file is only hashed when its size or mtime moved. NumPy is an
+optional dependency (``pdm install -G snapshot``).
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import json
+import os
+from collections import namedtuple
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterator
+
+from pushup_page.config import SNAPSHOT_DIR, SQL_FILE
+from pushup_page.stats import DayTotal
+
+SNAPSHOT_VERSION = 1
+HEADER_FILE = "header.json"
+
+# column name -> dtype; NULLs are stored as 0
+SNAPSHOT_COLUMNS = {
+    "run_id": "int64",
+    "start_epoch": "int64",
+    "utc_offset": "int32",
+    "elapsed_time": "int64",
+    "count": "int64",
+    "avg_time": "float64",
+    "calories": "float64",
+}
+
+SnapshotRow = namedtuple("SnapshotRow", list(SNAPSHOT_COLUMNS))
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError(
+            "Activity snapshots need NumPy; install it with `pdm install -G snapshot`."
+        ) from None
+    return numpy
+
+
+def _database_files(db_path: str) -> tuple[str, str]:
+    return db_path, f"{db_path}-wal"
+
+
+def database_stat(db_path: str = SQL_FILE) -> list[list[int] | None]:
+    """``[size, mtime_ns]`` of the database and its WAL file (``None`` if missing)."""
+    stats = []
+    for path in _database_files(db_path):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            stats.append(None)
+            continue
+        stats.append([stat.st_size, stat.st_mtime_ns])
+    return stats
+
+
+def database_hash(db_path: str = SQL_FILE) -> str:
+    """Content hash of the database, including an uncheckpointed WAL file."""
+    digest = hashlib.sha256()
+    for path in _database_files(db_path):
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class ActivitySnapshot:
+    header: dict[str, Any]
+    columns: dict[str, Any]
+
+    def __len__(self) -> int:
+        return int(self.header["rows"])
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self.__dict__["columns"][name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def iter_rows(self) -> Iterator[SnapshotRow]:
+        columns = [self.columns[name].tolist() for name in SNAPSHOT_COLUMNS]
+        for values in zip(*columns):
+            yield SnapshotRow(*values)
+
+    def daily_totals(self) -> list[DayTotal]:
+        """Per-day totals shaped like ``DailyTotal`` rows, ordered by date."""
+        np = _numpy()
+        if not len(self):
+            return []
+        local_days = (self.start_epoch + self.utc_offset) // 86400
+        days, index = np.unique(local_days, return_inverse=True)
+        reps = np.bincount(index, weights=self.count).astype("int64")
+        sessions = np.bincount(index)
+        elapsed = np.bincount(index, weights=self.elapsed_time).astype("int64")
+        calories = np.bincount(index, weights=self.calories)
+        epoch_day = dt.date(1970, 1, 1)
+        return [
+            DayTotal(
+                (epoch_day + dt.timedelta(days=day)).isoformat(),
+                int(reps[i]),
+                int(sessions[i]),
+                int(elapsed[i]),
+                float(calories[i]),
+            )
+            for i, day in enumerate(days.tolist())
+        ]
+
+
+def build_snapshot(
+    db_path: str = SQL_FILE, snapshot_dir: Path = SNAPSHOT_DIR
+) -> dict[str, Any]:
+    """Write the activities table as ``.npy`` columns and return the header."""
+    from pushup_page.storage import iter_activities, open_session
+
+    np = _numpy()
+    values: dict[str, list] = {name: [] for name in SNAPSHOT_COLUMNS}
+    with open_session(db_path, read_only=True) as session:
+        source_stat = database_stat(db_path)
+        source_hash = database_hash(db_path)
+        for row in iter_activities(session, list(SNAPSHOT_COLUMNS)):
+            if row.start_epoch is None:
+                continue
+            for name, value in zip(SNAPSHOT_COLUMNS, row):
+                values[name].append(value or 0)
+
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    for name, dtype in SNAPSHOT_COLUMNS.items():
+        temporary_path = snapshot_dir / f"{name}.tmp.npy"
+        np.save(temporary_path, np.asarray(values[name], dtype=dtype))
+        temporary_path.replace(snapshot_dir / f"{name}.npy")
+
+    header = {
+        "version": SNAPSHOT_VERSION,
+        "rows": len(values["run_id"]),
+        "source_hash": source_hash,
+        "source_stat": source_stat,
+        "columns": SNAPSHOT_COLUMNS,
+    }
+    # the header goes last, so a half-written snapshot is never considered fresh
+    _write_header(snapshot_dir, header)
+    return header
+
+
+def _write_header(snapshot_dir: Path, header: dict[str, Any]) -> None:
+    temporary_path = Path(snapshot_dir) / f"{HEADER_FILE}.tmp"
+    temporary_path.write_text(json.dumps(header, indent=2) + "\n", encoding="utf-8")
+    temporary_path.replace(Path(snapshot_dir) / HEADER_FILE)
+
+
+def read_header(snapshot_dir: Path = SNAPSHOT_DIR) -> dict[str, Any] | None:
+    try:
+        return json.loads((Path(snapshot_dir) / HEADER_FILE).read_text("utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def load_snapshot(
+    db_path: str = SQL_FILE,
+    snapshot_dir: Path = SNAPSHOT_DIR,
+    *,
+    rebuild: bool = True,
+) -> ActivitySnapshot | None:
+    """Open the snapshot memory-mapped, rebuilding it first if ``data.db`` changed.
+
+    Returns ``None`` when the snapshot is stale and ``rebuild`` is false.
+    """
+    np = _numpy()
+    header = read_header(snapshot_dir)
+    fresh = (
+        header is not None
+        and header.get("version") == SNAPSHOT_VERSION
+        and header.get("columns") == SNAPSHOT_COLUMNS
+    )
+    if fresh:
+        source_stat = database_stat(db_path)
+        if header.get("source_stat") != source_stat:
+            # e.g. a checkout rewrote an unchanged file: compare contents
+            fresh = header.get("source_hash") == database_hash(db_path)
+            if fresh:
+                header["source_stat"] = source_stat
+                _write_header(snapshot_dir, header)
+    if not fresh:
+        if not rebuild:
+            return None
+        header = build_snapshot(db_path, snapshot_dir)
+
+    # an empty file cannot be memory-mapped
+    mmap_mode = "r" if header["rows"] else None
+    columns = {
+        name: np.load(Path(snapshot_dir) / f"{name}.npy", mmap_mode=mmap_mode)
+        for name in SNAPSHOT_COLUMNS
+    }
+    return ActivitySnapshot(header, columns)
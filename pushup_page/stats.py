@@ -1,10 +1,35 @@
 from __future__ import annotations
 
 import datetime as dt
+from collections import namedtuple
 from collections.abc import Iterable
 from typing import Any
 
-from dateutil.parser import parse
+# Columns of the ``activities`` table as the CSV export writes them. A copy of
+# generator.db.ACTIVITY_KEYS, so the CSV read path never imports SQLAlchemy;
+# test_csv_columns_match_export keeps the two equal.
+ACTIVITY_KEYS = [
+    "run_id",
+    "name",
+    "start_date",
+    "elapsed_time",
+    "count",
+    "avg_time",
+    "calories",
+]
+
+# Per-day totals shaped like generator.db.DailyTotal rows, for sources that do
+# not go through the database (CSV, snapshot).
+DayTotal = namedtuple(
+    "DayTotal", ["local_date", "reps", "sessions", "elapsed_time", "calories"]
+)
+
+
+def epoch_to_datetime(epoch, utc_offset=0):
+    """Inverse of ``generator.db.start_date_to_epoch``, like its
+    ``epoch_to_datetime``: an aware datetime in its own offset."""
+    tz = dt.timezone(dt.timedelta(seconds=utc_offset or 0))
+    return dt.datetime.fromtimestamp(epoch, tz)
 
 
 def calculate_streak(dates: Iterable[dt.date], *, today: dt.date | None = None) -> int:
@@ -63,8 +88,28 @@ def activity_dates_from_start_date_strings(start_dates: Iterable[str]) -> list[d
         try:
             dates.append(dt.datetime.fromisoformat(start_date).date())
         except ValueError:
+            # dateutil is only needed for non-ISO strings
+            from dateutil.parser import parse
+
             try:
                 dates.append(parse(start_date).date())
             except (ValueError, TypeError):
                 continue
     return dates
+
+
+def aggregate_daily_totals(
+    activities: Iterable[Any], *, key: str = "local_date"
+) -> list[DayTotal]:
+    """Group rows with ``count``, ``elapsed_time`` and ``calories`` by ``key``."""
+    days: dict[str, list] = {}
+    for act in activities:
+        local_date = getattr(act, key)
+        if local_date is None:
+            continue
+        day = days.setdefault(local_date, [0, 0, 0, 0.0])
+        day[0] += act.count or 0
+        day[1] += 1
+        day[2] += act.elapsed_time or 0
+        day[3] += act.calories or 0.0
+    return [DayTotal(local_date, *days[local_date]) for local_date in sorted(days)]
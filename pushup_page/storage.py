@@ -2,18 +2,37 @@ from __future__ import annotations
 
 import datetime as dt
 from contextlib import contextmanager
-from typing import Iterator
+from typing import Iterator, Sequence
 
-from dateutil.parser import parse
+from sqlalchemy import Row, select
 from sqlalchemy.orm import Session
 
-from generator.db import Activity, init_db
-from pushup_page.config import DB_PATH
+from generator.db import (
+    ACTIVITY_KEYS,
+    Activity,
+    DailyTotal,
+    epoch_to_datetime,
+    init_db,
+    start_date_to_epoch,
+)
+from pushup_page.config import DB_IMMUTABLE, DB_PATH, DB_WAL
 
 
 @contextmanager
-def open_session(db_path: str | None = None) -> Iterator[Session]:
-    session = init_db(db_path or str(DB_PATH))
+def open_session(
+    db_path: str | None = None, *, read_only: bool = False
+) -> Iterator[Session]:
+    """Open a session on ``data.db``.
+
+    Render-only callers pass ``read_only=True``; the WAL and immutable options
+    come from ``pushup_page.config``.
+    """
+    if read_only:
+        session = init_db(
+            db_path or str(DB_PATH), read_only=True, immutable=DB_IMMUTABLE
+        )
+    else:
+        session = init_db(db_path or str(DB_PATH), wal=DB_WAL)
     try:
         yield session
     finally:
@@ -21,14 +40,57 @@ def open_session(db_path: str | None = None) -> Iterator[Session]:
 
 
 def get_latest_activity_datetime(session: Session) -> dt.datetime | None:
-    latest = session.query(Activity).order_by(Activity.start_date.desc()).first()
-    if not latest or not latest.start_date:
+    latest = (
+        session.query(Activity.start_epoch, Activity.utc_offset)
+        .filter(Activity.start_epoch.isnot(None))
+        .order_by(Activity.start_epoch.desc())
+        .first()
+    )
+    if latest is None:
         return None
-    try:
-        return dt.datetime.fromisoformat(latest.start_date)
-    except ValueError:
-        return parse(latest.start_date)
+    return epoch_to_datetime(latest.start_epoch, latest.utc_offset)
 
 
 def list_activities(session: Session) -> list[Activity]:
-    return session.query(Activity).order_by(Activity.start_date).all()
+    return session.query(Activity).order_by(Activity.start_epoch).all()
+
+
+def iter_activities(
+    session: Session,
+    columns: Sequence[str] | None = None,
+    *,
+    start: dt.datetime | None = None,
+    end: dt.datetime | None = None,
+    chunk_size: int = 500,
+) -> Iterator[Row]:
+    """Stream activity rows ordered by start time without hydrating ORM objects.
+
+    ``columns`` names the ``Activity`` columns to project (all exported columns
+    by default); rows are lightweight named tuples fetched ``chunk_size`` at a
+    time. ``start`` is inclusive and ``end`` exclusive; naive values are UTC.
+    """
+    selected = [getattr(Activity, name) for name in columns or ACTIVITY_KEYS]
+    stmt = select(*selected).order_by(Activity.start_epoch)
+    if start is not None:
+        stmt = stmt.where(Activity.start_epoch >= start_date_to_epoch(start)[0])
+    if end is not None:
+        stmt = stmt.where(Activity.start_epoch < start_date_to_epoch(end)[0])
+    result = session.execute(stmt.execution_options(yield_per=chunk_size))
+    try:
+        yield from result
+    finally:
+        result.close()
+
+
+def list_daily_totals(
+    session: Session,
+    start: dt.date | None = None,
+    end: dt.date | None = None,
+) -> list[DailyTotal]:
+    """Per-day totals ordered by date, optionally limited to ``start..end``."""
+    query = session.query(DailyTotal)
+    if start is not None:
+        query = query.filter(DailyTotal.local_date >= start.isoformat())
+    if end is not None:
+        query = query.filter(DailyTotal.local_date <= end.isoformat())
+    return query.order_by(DailyTotal.local_date).all()
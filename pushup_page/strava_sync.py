@@ -3,33 +3,213 @@ from __future__ import annotations
 import argparse
 import csv
 import datetime as dt
+import io
 import os
 import sqlite3
+from collections import Counter
+from contextlib import closing, contextmanager, redirect_stdout, suppress
+from functools import partial
+from typing import Iterator
 
+import requests
 import stravalib
+from sqlalchemy.orm import Session
 
-from generator import Generator
-from pushup_page.config import CSV_PATH, REPO_ROOT, SQL_FILE
-from pushup_page.storage import get_latest_activity_datetime, open_session
+from generator import (
+    BACKFILL_PARTITION_DAYS,
+    DEFAULT_DETAIL_WORKERS,
+    SYNC_CHUNK_SIZE,
+    Generator,
+)
+from generator.db import (
+    ACTIVITY_KEYS,
+    SYNC_LOOKBACK,
+    checkpoint,
+    enable_wal,
+    epoch_to_datetime,
+    init_db,
+    sync_window_start,
+)
+from generator.rate_limit import RequestBudget, plan_sync
+from generator.raw_cache import RawActivityCache
+from generator.strava_http import DEFAULT_RETRIES, DEFAULT_TIMEOUT
+from pushup_page.config import CSV_PATH, DB_WAL, RAW_CACHE_PATH, REPO_ROOT, SQL_FILE
+from pushup_page.storage import open_session
 from pushup_page.strava_token import StravaTokenStore
 
 DEFAULT_START_DATE = dt.datetime(2025, 1, 1, tzinfo=dt.timezone.utc)
 STRAVA_TOKEN_PATH = REPO_ROOT / ".strava-refresh-token.enc"
+RATE_LIMIT_STATE_PATH = REPO_ROOT / ".strava-rate-limit.json"
+
+
+# Derived columns (start_epoch, utc_offset) are not part of the export.
+EXPORT_QUERY = f"SELECT {', '.join(ACTIVITY_KEYS)} FROM activities"
+EXPORT_CHUNK_SIZE = 500
+# bytes read at a time while looking for the CSV's last line
+TAIL_BLOCK_SIZE = 4096
+# bytes read at a time while counting the CSV's lines
+COUNT_BLOCK_SIZE = 1 << 16
+
+
+def _format_row(row) -> list[str]:
+    """An activity row formatted the way ``csv.writer`` writes it."""
+    return ["" if value is None else str(value) for value in row]
+
+
+def _iter_export_rows(
+    connection: sqlite3.Connection, after_run_id: int | None = None
+) -> Iterator[list[str]]:
+    """Stream formatted activity rows by run_id, optionally only those after one."""
+    if after_run_id is None:
+        cursor = connection.execute(f"{EXPORT_QUERY} ORDER BY run_id")
+    else:
+        cursor = connection.execute(
+            f"{EXPORT_QUERY} WHERE run_id > ? ORDER BY run_id", (after_run_id,)
+        )
+    while rows := cursor.fetchmany(EXPORT_CHUNK_SIZE):
+        for row in rows:
+            yield _format_row(row)
+
+
+def _csv_last_row(csv_path: str) -> list[str] | None:
+    """The last row of an exported CSV, read from the ends of the file only.
+
+    Returns ``[]`` for a file holding just the header, and ``None`` when the
+    file cannot be appended to (missing, other header, no final newline, or
+    a last line that is not one complete row).
+    """
+    try:
+        with open(csv_path, "rb") as f:
+            header = f.readline()
+            if (
+                not header.endswith(b"\n")
+                or next(csv.reader([header.decode("utf-8")]), None) != ACTIVITY_KEYS
+            ):
+                return None
+            position = f.seek(0, os.SEEK_END)
+            if position == len(header):
+                return []
+            tail = b""
+            while True:
+                size = min(TAIL_BLOCK_SIZE, position)
+                position -= size
+                f.seek(position)
+                tail = f.read(size) + tail
+                # the newline that ends the line before the last one
+                start = tail.rfind(b"\n", 0, len(tail) - 1)
+                if start != -1 or position == 0:
+                    break
+        if not tail.endswith(b"\n"):
+            return None
+        rows = list(csv.reader(io.StringIO(tail[start + 1 :].decode("utf-8"))))
+    except (OSError, UnicodeDecodeError, csv.Error):
+        return None
+    if len(rows) != 1 or len(rows[0]) != len(ACTIVITY_KEYS):
+        return None
+    return rows[0]
+
+
+def _csv_row_count(csv_path: str) -> int:
+    """Rows after the header, counted as line breaks without parsing.
+
+    A name holding a line break is over-counted, which only costs a rewrite.
+    """
+    with open(csv_path, "rb") as f:
+        lines = sum(
+            block.count(b"\n") for block in iter(partial(f.read, COUNT_BLOCK_SIZE), b"")
+        )
+    return lines - 1
+
+
+def _last_edit(connection: sqlite3.Connection) -> float:
+    """When an exported column of a stored activity last changed (epoch
+    seconds), as recorded by the ``activity_edits`` triggers; 0 if never."""
+    try:
+        row = connection.execute(
+            "SELECT edited_at FROM activity_edits WHERE id = 1"
+        ).fetchone()
+    except sqlite3.OperationalError:
+        # not migrated yet: nothing records edits
+        return 0.0
+    return 0.0 if row is None else row[0]
+
+
+def _append_from(connection: sqlite3.Connection, csv_path: str) -> int | None:
+    """The run_id new rows are appended after (0 for a header-only file), or
+    ``None`` if the file no longer mirrors the database up to that run_id.
+
+    That is the case when the file's last row is missing or differs, when
+    rows were edited or deleted since the file was written, or when the
+    number of rows up to its last run_id differs (deletes, or activities
+    backfilled before it).
+    """
+    last_row = _csv_last_row(csv_path)
+    if last_row is None:
+        return None
+    if not last_row:
+        return 0
+    try:
+        run_id = int(last_row[0])
+    except ValueError:
+        return None
+    stored = connection.execute(
+        f"{EXPORT_QUERY} WHERE run_id = ?", (run_id,)
+    ).fetchone()
+    if stored is None or _format_row(stored) != last_row:
+        return None
+    if _last_edit(connection) >= os.path.getmtime(csv_path):
+        return None
+    (stored_rows,) = connection.execute(
+        "SELECT COUNT(*) FROM activities WHERE run_id <= ?", (run_id,)
+    ).fetchone()
+    if stored_rows != _csv_row_count(csv_path):
+        return None
+    return run_id
 
 
 def export_activities_to_csv(
-    db_path: str = SQL_FILE, csv_path: str = str(CSV_PATH)
-) -> None:
-    with sqlite3.connect(db_path) as connection:
-        cursor = connection.cursor()
-        cursor.execute("SELECT * FROM activities")
-        columns = [description[0] for description in cursor.description]
-        rows = cursor.fetchall()
+    db_path: str = SQL_FILE, csv_path: str = str(CSV_PATH), *, incremental: bool = True
+) -> int:
+    """Mirror the activities table into ``csv_path``; returns rows written.
+
+    In incremental mode only the rows whose run_id is beyond the file's last
+    row are queried and appended, so the database cost follows the new rows,
+    not the table. The file is rewritten atomically when that is asked for,
+    or when it no longer mirrors the rows before its end: its last row
+    changed, an exported column was edited or a row deleted after the file
+    was written (the ``activity_edits`` triggers record when), or its row
+    count differs from the database's up to its last run_id.
+    """
+    with closing(sqlite3.connect(db_path)) as connection:
+        if incremental:
+            after_run_id = _append_from(connection, csv_path)
+            if after_run_id is not None:
+                appended = 0
+                with open(csv_path, "a", newline="", encoding="utf-8") as csvfile:
+                    writer = csv.writer(csvfile)
+                    for row in _iter_export_rows(connection, after_run_id):
+                        writer.writerow(row)
+                        appended += 1
+                if appended:
+                    print(f"Appended {appended} activities to {csv_path}")
+                return appended
 
-    with open(csv_path, "w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(columns)
-        writer.writerows(rows)
+        written = 0
+        temporary_path = f"{csv_path}.tmp"
+        try:
+            with open(temporary_path, "w", newline="", encoding="utf-8") as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(ACTIVITY_KEYS)
+                for row in _iter_export_rows(connection):
+                    writer.writerow(row)
+                    written += 1
+            os.replace(temporary_path, csv_path)
+        except BaseException:
+            with suppress(OSError):
+                os.remove(temporary_path)
+            raise
+        print(f"Rewrote {csv_path} with {written} activities")
+        return written
 
 
 def resolve_strava_secrets(
@@ -60,42 +240,240 @@ def resolve_strava_secrets(
     return client_id, client_secret, refresh_token
 
 
+def resolve_start_date(
+    start_date: dt.datetime | None = None, db_path: str = SQL_FILE
+) -> dt.datetime | None:
+    """The explicit start date, else ``None`` so the sync journal picks the window.
+
+    A database with no sync history starts at ``DEFAULT_START_DATE``.
+    """
+    if start_date is not None:
+        return start_date
+    with open_session(db_path) as session:
+        if sync_window_start(session) is None:
+            return DEFAULT_START_DATE
+    return None
+
+
+def parse_backfill_range(value: str) -> tuple[dt.datetime, dt.datetime]:
+    """``FROM..TO`` as two ISO 8601 dates or datetimes (UTC unless given).
+
+    The range ends before ``TO``; a plain date ``TO`` includes that whole day.
+    """
+    try:
+        start, end = value.split("..")
+        start_date = dt.datetime.fromisoformat(start)
+        end_date = dt.datetime.fromisoformat(end)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"expected FROM..TO (e.g. 2020-01-01..2024-12-31), got {value!r}"
+        ) from None
+    with suppress(ValueError):
+        # a plain date, in any ISO 8601 form (2024-12-31, 20241231, ...)
+        dt.date.fromisoformat(end)
+        end_date += dt.timedelta(days=1)
+    start_date, end_date = (
+        date if date.tzinfo else date.replace(tzinfo=dt.timezone.utc)
+        for date in (start_date, end_date)
+    )
+    if end_date <= start_date:
+        raise argparse.ArgumentTypeError(f"empty backfill range {value!r}")
+    return start_date, end_date
+
+
+def parse_partition_days(value: str) -> int:
+    """``--partition-days``: a whole number of days, at least 1."""
+    try:
+        days = int(value)
+    except ValueError:
+        days = 0
+    if days < 1:
+        raise argparse.ArgumentTypeError(
+            f"expected a number of days of at least 1, got {value!r}"
+        )
+    return days
+
+
+@contextmanager
+def _plan_session(db_path: str) -> Iterator[Session]:
+    """A read-only session on ``db_path``, or one on an empty in-memory schema
+    when there is no database yet."""
+    if os.path.exists(db_path):
+        with open_session(db_path, read_only=True) as session:
+            yield session
+        return
+    print(f"No database at {db_path}; planning a first sync")
+    # the in-memory schema's migration messages are not about db_path
+    with redirect_stdout(io.StringIO()):
+        session = init_db(":memory:")
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def print_sync_plan(
+    start_date: dt.datetime | None = None,
+    *,
+    db_path: str = SQL_FILE,
+    force: bool = False,
+    budget: RequestBudget | None = None,
+    lookback: dt.timedelta = SYNC_LOOKBACK,
+) -> None:
+    """Estimate the Strava API calls a sync from ``start_date`` would make.
+
+    Only reads ``db_path``; without one, plans the first sync against an
+    empty schema.
+    """
+    end_date = dt.datetime.now(dt.timezone.utc)
+    with _plan_session(db_path) as session:
+        if start_date is None:
+            window_start = sync_window_start(session, lookback)
+            start_date = (
+                DEFAULT_START_DATE
+                if window_start is None
+                else epoch_to_datetime(window_start)
+            )
+        plan = plan_sync(
+            session, int(start_date.timestamp()), int(end_date.timestamp()), force=force
+        )
+    print(f"Sync plan for {start_date} .. {end_date:%Y-%m-%d %H:%M:%S%z}")
+    print(f"  known activities in window: {plan.known}")
+    print(f"  estimated new activities:   {plan.estimated_new}")
+    print(
+        f"  API calls: {plan.list_calls} list + {plan.detail_calls} detail "
+        f"= {plan.total_calls}"
+    )
+    if budget is None:
+        return
+    short_left, long_left = budget.remaining()
+    short_size = budget.state.short_limit - budget.reserve
+    long_size = budget.state.long_limit - budget.reserve
+    print(f"  budget left: {short_left} this quarter hour, {long_left} today")
+    if plan.total_calls <= short_left:
+        print("  fits in the current 15-minute window")
+    elif plan.total_calls <= long_left:
+        windows = 1 + -(-(plan.total_calls - short_left) // short_size)
+        print(f"  needs about {windows} 15-minute windows")
+    else:
+        days = 1 + -(-(plan.total_calls - long_left) // long_size)
+        print(f"  exceeds today's budget; needs about {days} days of runs")
+
+
 def run_strava_sync(
     *,
     client_id: str,
     client_secret: str,
     refresh_token: str,
     start_date: dt.datetime | None = None,
+    lookback: dt.timedelta = SYNC_LOOKBACK,
     export_csv: bool = True,
     token_store: StravaTokenStore | None = None,
-) -> None:
-    generator = Generator(SQL_FILE)
-    generator.set_strava_config(client_id, client_secret, refresh_token)
-
-    if start_date is None:
-        with open_session() as session:
-            last_activity = get_latest_activity_datetime(session)
-        start_date = (
-            last_activity + dt.timedelta(seconds=1)
-            if last_activity is not None
-            else DEFAULT_START_DATE
-        )
+    detail_workers: int = DEFAULT_DETAIL_WORKERS,
+    force: bool = False,
+    budget: RequestBudget | None = None,
+    db_path: str = SQL_FILE,
+    csv_path: str = str(CSV_PATH),
+    requests_session: requests.Session | None = None,
+    raw_cache_path: str | None = None,
+    chunk_size: int | None = None,
+    timeout: float | None = None,
+    retries: int = DEFAULT_RETRIES,
+    backfill: tuple[dt.datetime, dt.datetime] | None = None,
+    partition_days: int = BACKFILL_PARTITION_DAYS,
+    access_token: str | None = None,
+    expires_at: int = 0,
+) -> Counter:
+    """Sync from Strava into ``db_path`` and return ``Generator.stats``.
+
+    A still-valid ``access_token`` (with its ``expires_at``) from an earlier
+    run is reused instead of refreshing; ``token_store`` is only written when
+    the tokens changed. With ``raw_cache_path`` the fetched detail payloads
+    are also kept there. ``timeout`` (read timeout, seconds) and ``retries``
+    configure the pooled HTTP session unless ``requests_session`` is given.
+    Without ``start_date`` a new sync window starts ``lookback`` before the
+    end of the last one; each run lists that span again to catch edits.
+
+    With ``backfill=(start, end)`` the range is imported with
+    ``Generator.backfill`` instead, ``detail_workers`` partitions at a time.
+    """
+    if DB_WAL:
+        enable_wal(db_path)
+    raw_cache = RawActivityCache(raw_cache_path) if raw_cache_path else None
+    generator = Generator(
+        db_path,
+        detail_workers=detail_workers,
+        budget=budget,
+        requests_session=requests_session,
+        raw_cache=raw_cache,
+        chunk_size=chunk_size,
+        timeout=timeout,
+        retries=retries,
+    )
+    generator.set_strava_config(
+        client_id, client_secret, refresh_token, access_token, expires_at
+    )
+
+    if backfill is not None:
+
+        def run() -> None:
+            generator.backfill(*backfill, partition_days=partition_days, force=force)
+
+    else:
+        start_date = resolve_start_date(start_date, db_path)
+        print(f"Syncing activities from {start_date or 'the sync watermark'}...")
+
+        def run() -> None:
+            generator.sync(force, start_date=start_date, lookback=lookback)
 
-    print(f"Syncing activities from {start_date}...")
     try:
         try:
-            generator.sync(False, start_date=start_date)
+            try:
+                run()
+            except stravalib.exc.AccessUnauthorized:
+                if not access_token or generator.access_token != access_token:
+                    raise
+                # e.g. revoked before it expired; the journal resumes the window
+                print("Cached Strava access token was rejected; refreshing it.")
+                generator.expires_at = 0
+                run()
         except stravalib.exc.RateLimitExceeded:
             print("Strava API rate limit exceeded. Stopping sync.")
+            generator.stats["rate_limited"] += 1
     finally:
+        generator.stats["http_retries"] = getattr(
+            generator.requests_session, "retried", 0
+        )
         try:
             generator.close()
+            if raw_cache is not None:
+                raw_cache.close()
         finally:
-            if token_store is not None and generator.access_token:
-                token_store.save(generator.refresh_token)
+            if (
+                token_store is not None
+                and generator.access_token
+                and generator.access_token != access_token
+            ):
+                token_store.save(
+                    generator.refresh_token,
+                    generator.access_token,
+                    generator.expires_at,
+                )
+
+    if DB_WAL:
+        # keep the committed data.db self-contained
+        checkpoint(db_path)
 
     if export_csv:
-        export_activities_to_csv()
+        # appending cannot mirror edits to rows already in the file, nor
+        # backfilled activities that sort before its last run_id
+        rewrite = (
+            backfill is not None
+            or generator.stats["updated"]
+            or generator.stats["deleted"]
+        )
+        export_activities_to_csv(db_path, csv_path, incremental=not rewrite)
+    return generator.stats
 
 
 def main(argv: list[str] | None = None) -> None:
@@ -128,27 +506,111 @@ def main(argv: list[str] | None = None) -> None:
         metavar="ISO8601",
         help='Override sync start date (e.g. "2025-01-01T00:00:00+00:00").',
     )
+    parser.add_argument(
+        "--lookback-days",
+        dest="lookback_days",
+        type=float,
+        default=SYNC_LOOKBACK.days,
+        help="Days before the end of the last sync that are listed again to pick "
+        "up edits; each run spends a list request per 200 activities in them.",
+    )
     parser.add_argument(
         "--no-export-csv",
         dest="export_csv",
         action="store_false",
         help="Skip exporting DB rows to pushup_data.csv.",
     )
+    parser.add_argument(
+        "--detail-workers",
+        dest="detail_workers",
+        type=int,
+        default=DEFAULT_DETAIL_WORKERS,
+        help="Activity detail requests to run concurrently (1 = sequential); "
+        "with --backfill, partitions to import concurrently.",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        dest="chunk_size",
+        type=int,
+        default=SYNC_CHUNK_SIZE,
+        help="Activities committed together; an interruption loses at most one "
+        "chunk.",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT[1],
+        metavar="SECONDS",
+        help="Read timeout of each Strava request.",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=DEFAULT_RETRIES,
+        help="Retries of a Strava GET after a connection error, timeout or 5xx.",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Refetch details of activities already synced and unchanged.",
+    )
+    parser.add_argument(
+        "--no-raw-cache",
+        dest="raw_cache",
+        action="store_false",
+        help=f"Do not keep raw activity payloads in {RAW_CACHE_PATH.name}.",
+    )
+    parser.add_argument(
+        "--backfill",
+        type=parse_backfill_range,
+        metavar="FROM..TO",
+        help="Import the history in this range as parallel time partitions; "
+        "rerun the same range to resume an interrupted backfill.",
+    )
+    parser.add_argument(
+        "--partition-days",
+        dest="partition_days",
+        type=parse_partition_days,
+        default=BACKFILL_PARTITION_DAYS,
+        help="Length of the --backfill partitions.",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Only estimate the API calls the sync window needs, then exit.",
+    )
 
     args = parser.parse_args(argv)
+    start_date = dt.datetime.fromisoformat(args.start_date) if args.start_date else None
+    lookback = dt.timedelta(days=args.lookback_days)
+    budget = RequestBudget(RATE_LIMIT_STATE_PATH)
+    if args.plan:
+        print_sync_plan(start_date, force=args.force, budget=budget, lookback=lookback)
+        return
+
     client_id, client_secret, fallback_refresh_token = resolve_strava_secrets(args)
     token_store = StravaTokenStore(STRAVA_TOKEN_PATH, client_secret)
-    refresh_token = token_store.load(fallback_refresh_token)
-
-    start_date = dt.datetime.fromisoformat(args.start_date) if args.start_date else None
+    tokens = token_store.load_tokens(fallback_refresh_token)
 
     run_strava_sync(
         client_id=client_id,
         client_secret=client_secret,
-        refresh_token=refresh_token,
+        refresh_token=tokens.refresh_token,
         start_date=start_date,
+        lookback=lookback,
         export_csv=args.export_csv,
         token_store=token_store,
+        detail_workers=args.detail_workers,
+        force=args.force,
+        budget=budget,
+        raw_cache_path=str(RAW_CACHE_PATH) if args.raw_cache else None,
+        chunk_size=args.chunk_size,
+        timeout=args.timeout,
+        retries=args.retries,
+        backfill=args.backfill,
+        partition_days=args.partition_days,
+        access_token=tokens.access_token,
+        expires_at=tokens.expires_at,
     )
 
 
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 import base64
+import json
 from pathlib import Path
+from typing import NamedTuple
 
 from cryptography.fernet import Fernet, InvalidToken
 from cryptography.hazmat.primitives import hashes
@@ -10,7 +12,21 @@ from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 TOKEN_KEY_INFO = b"pushup-page:strava-refresh-token:v1"
 
 
+class StravaTokens(NamedTuple):
+    refresh_token: str
+    # the last access token and when it expires (epoch seconds), if known
+    access_token: str | None = None
+    expires_at: int = 0
+
+
 class StravaTokenStore:
+    """Encrypted ``.strava-refresh-token.enc``.
+
+    Holds the refresh token and, since access tokens stay valid for six hours,
+    the last access token with its ``expires_at`` so frequent runs can skip the
+    refresh. Files written by older versions contain only the refresh token.
+    """
+
     def __init__(self, path: Path, client_secret: str) -> None:
         self.path = path
         self._fernet = Fernet(self._derive_key(client_secret))
@@ -26,11 +42,14 @@ class StravaTokenStore:
         return base64.urlsafe_b64encode(key)
 
     def load(self, fallback_token: str | None = None) -> str:
+        return self.load_tokens(fallback_token).refresh_token
+
+    def load_tokens(self, fallback_token: str | None = None) -> StravaTokens:
         if self.path.exists():
             encrypted_token = self.path.read_bytes().strip()
             try:
-                return self._fernet.decrypt(encrypted_token).decode("utf-8")
-            except (InvalidToken, ValueError):
+                return self._parse(self._fernet.decrypt(encrypted_token))
+            except (InvalidToken, ValueError, KeyError):
                 if fallback_token:
                     print(
                         "Stored Strava refresh token could not be decrypted; "
@@ -44,15 +63,34 @@ class StravaTokenStore:
                     ) from None
 
         if fallback_token:
-            return fallback_token
+            return StravaTokens(fallback_token)
 
         raise RuntimeError(
             "Missing Strava refresh token. Configure REFRESH_TOKEN or provide a "
             "decryptable encrypted token file."
         )
 
-    def save(self, refresh_token: str) -> None:
-        encrypted_token = self._fernet.encrypt(refresh_token.encode("utf-8"))
+    @staticmethod
+    def _parse(plaintext: bytes) -> StravaTokens:
+        if not plaintext.startswith(b"{"):
+            return StravaTokens(plaintext.decode("utf-8"))
+        data = json.loads(plaintext)
+        return StravaTokens(
+            data["refresh_token"],
+            data.get("access_token"),
+            int(data.get("expires_at") or 0),
+        )
+
+    def save(
+        self,
+        refresh_token: str,
+        access_token: str | None = None,
+        expires_at: int = 0,
+    ) -> None:
+        tokens = {"refresh_token": refresh_token}
+        if access_token:
+            tokens |= {"access_token": access_token, "expires_at": int(expires_at)}
+        encrypted_token = self._fernet.encrypt(json.dumps(tokens).encode("utf-8"))
         temporary_path = self.path.with_suffix(f"{self.path.suffix}.tmp")
         temporary_path.write_bytes(encrypted_token + b"\n")
         temporary_path.replace(self.path)
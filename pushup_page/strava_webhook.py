@@ -0,0 +1,320 @@
+"""Near-real-time sync from Strava push-subscription events.
+
+Strava POSTs an event for every activity an athlete creates, updates or
+deletes to the callback URL of a push subscription
+(<https://developers.strava.com/docs/webhooks/>). ``WebhookServer`` answers the
+subscription's validation GET and queues the activity ids of those events;
+``WebhookWorker`` fetches and stores only those activities through
+``Generator``, so a new session costs one detail request instead of a listing
+plus a window of detail requests.
+
+The queue lives in memory: events that arrive while the receiver is down are
+lost, so keep running the polling ``strava_sync`` now and then as a backstop.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import stravalib
+
+from generator import Generator
+from generator.rate_limit import RequestBudget
+from generator.raw_cache import RawActivityCache
+from pushup_page.config import RAW_CACHE_PATH, SQL_FILE
+from pushup_page.strava_sync import (
+    RATE_LIMIT_STATE_PATH,
+    STRAVA_TOKEN_PATH,
+    resolve_strava_secrets,
+)
+from pushup_page.strava_token import StravaTokenStore
+
+DEFAULT_PORT = 8711
+# wait this long after an event for more to arrive before syncing the batch
+SETTLE_SECONDS = 2.0
+# retry delay after a rate-limit stop that did not say how long to wait
+RATE_LIMIT_RETRY_SECONDS = 15 * 60
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+
+class EventQueue:
+    """Pending activity ids, each with the last action its events asked for.
+
+    Several events for one activity (create, then a rename, ...) collapse into
+    a single fetch.
+    """
+
+    def __init__(self) -> None:
+        self._pending: dict[int, str] = {}
+        self._condition = threading.Condition()
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._pending)
+
+    def put(self, run_id: int, action: str) -> None:
+        with self._condition:
+            self._pending.pop(run_id, None)
+            self._pending[run_id] = action
+            self._condition.notify_all()
+
+    def requeue(self, batch: dict[int, str]) -> None:
+        """Put back a batch that failed, without overriding newer events."""
+        with self._condition:
+            self._pending = batch | self._pending
+            self._condition.notify_all()
+
+    def take(self, timeout: float | None = None, settle: float = 0.0) -> dict:
+        """Wait up to ``timeout`` for events, then ``settle`` seconds more for
+        stragglers, and return everything pending (possibly nothing)."""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._pending, timeout):
+                return {}
+            if settle:
+                # sleeps the full ``settle`` even if more events come in
+                self._condition.wait_for(lambda: False, settle)
+            batch, self._pending = self._pending, {}
+            return batch
+
+
+def event_action(event: dict, subscription_id: int | None = None) -> str | None:
+    """``UPSERT``/``DELETE`` for an activity event we should act on, else ``None``."""
+    if event.get("object_type") != "activity":
+        return None
+    if subscription_id is not None and event.get("subscription_id") != subscription_id:
+        return None
+    aspect_type = event.get("aspect_type")
+    if aspect_type in ("create", "update"):
+        return UPSERT
+    if aspect_type == "delete":
+        return DELETE
+    return None
+
+
+class WebhookServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple[str, int],
+        queue: EventQueue,
+        verify_token: str,
+        subscription_id: int | None = None,
+    ) -> None:
+        super().__init__(address, _WebhookHandler)
+        self.queue = queue
+        self.verify_token = verify_token
+        self.subscription_id = subscription_id
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    server: WebhookServer
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        """Subscription validation: echo ``hub.challenge`` for our token."""
+        query = {
+            key: values[-1]
+            for key, values in parse_qs(urlsplit(self.path).query).items()
+        }
+        if (
+            query.get("hub.mode") != "subscribe"
+            or query.get("hub.verify_token") != self.server.verify_token
+            or "hub.challenge" not in query
+        ):
+            self._reply(403, {"error": "verification failed"})
+            return
+        self._reply(200, {"hub.challenge": query["hub.challenge"]})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            event = json.loads(self.rfile.read(length))
+            action = event_action(event, self.server.subscription_id)
+            run_id = int(event["object_id"]) if action else None
+        except (ValueError, TypeError, KeyError):
+            self._reply(400, {"error": "malformed event"})
+            return
+        if action is not None:
+            print(f"webhook: {event.get('aspect_type')} activity {run_id}")
+            self.server.queue.put(run_id, action)
+        # Strava expects a 200 within two seconds and retries otherwise
+        self._reply(200, {})
+
+    def _reply(self, status: int, body: dict) -> None:
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class WebhookWorker(threading.Thread):
+    """Drains ``queue`` into the database; the only user of ``generator``."""
+
+    def __init__(
+        self,
+        generator: Generator,
+        queue: EventQueue,
+        *,
+        token_store: StravaTokenStore | None = None,
+        settle: float = SETTLE_SECONDS,
+    ) -> None:
+        super().__init__(name="strava-webhook-worker", daemon=True)
+        self.generator = generator
+        self.queue = queue
+        self.token_store = token_store
+        self.settle = settle
+        self.stopping = threading.Event()
+        # set each time a wait for events times out with nothing to do
+        self.idle = threading.Event()
+
+    def stop(self) -> None:
+        self.stopping.set()
+
+    def run(self) -> None:
+        while not self.stopping.is_set():
+            batch = self.queue.take(timeout=0.5, settle=self.settle)
+            if not batch:
+                self.idle.set()
+                continue
+            self.idle.clear()
+            try:
+                self.process(batch)
+            except stravalib.exc.RateLimitExceeded as exc:
+                # stored activities are refetched too; upserts are idempotent
+                self.queue.requeue(batch)
+                wait = exc.timeout or RATE_LIMIT_RETRY_SECONDS
+                print(f"Strava API rate limit exceeded. Retrying in {wait:.0f}s")
+                self.stopping.wait(wait)
+            except Exception as exc:
+                # one bad batch must not take the receiver down
+                self.generator.session.rollback()
+                print(f"webhook: failed to sync {sorted(batch)}: {exc}")
+
+    def process(self, batch: dict[int, str]) -> None:
+        deleted = [run_id for run_id, action in batch.items() if action == DELETE]
+        changed = [run_id for run_id, action in batch.items() if action == UPSERT]
+        if deleted:
+            self.generator.delete_activities(deleted)
+        if changed:
+            if self.generator.ensure_access() and self.token_store is not None:
+                self.token_store.save(
+                    self.generator.refresh_token,
+                    self.generator.access_token,
+                    self.generator.expires_at,
+                )
+            self.generator.sync_activities(changed)
+        stats = self.generator.stats
+        print(
+            f"webhook: {stats['created']} activities created, "
+            f"{stats['updated']} updated, {stats['deleted']} deleted so far"
+        )
+
+
+def serve(
+    *,
+    client_id: str,
+    client_secret: str,
+    refresh_token: str,
+    verify_token: str,
+    access_token: str | None = None,
+    expires_at: int = 0,
+    host: str = "127.0.0.1",
+    port: int = DEFAULT_PORT,
+    subscription_id: int | None = None,
+    token_store: StravaTokenStore | None = None,
+    budget: RequestBudget | None = None,
+    db_path: str = SQL_FILE,
+    raw_cache_path: str | None = None,
+) -> None:
+    """Receive events on ``host:port`` and sync them until interrupted."""
+    raw_cache = RawActivityCache(raw_cache_path) if raw_cache_path else None
+    generator = Generator(db_path, detail_workers=1, budget=budget, raw_cache=raw_cache)
+    generator.set_strava_config(
+        client_id, client_secret, refresh_token, access_token, expires_at
+    )
+    queue = EventQueue()
+    worker = WebhookWorker(generator, queue, token_store=token_store)
+    server = WebhookServer((host, port), queue, verify_token, subscription_id)
+    worker.start()
+    print(f"Listening for Strava webhook events on http://{host}:{port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        worker.stop()
+        worker.join()
+        generator.close()
+        if raw_cache is not None:
+            raw_cache.close()
+        if len(queue):
+            print(f"{len(queue)} queued activities left for the next sync")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Sync push-up activities from Strava webhook events."
+    )
+    parser.add_argument("--client-id", dest="client_id", help="Strava client id")
+    parser.add_argument(
+        "--client-secret", dest="client_secret", help="Strava client secret"
+    )
+    parser.add_argument(
+        "--refresh-token", dest="refresh_token", help="Strava refresh token"
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on.")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--verify-token",
+        dest="verify_token",
+        default=os.getenv("STRAVA_VERIFY_TOKEN"),
+        help="Token given when creating the push subscription "
+        "(default: $STRAVA_VERIFY_TOKEN).",
+    )
+    parser.add_argument(
+        "--subscription-id",
+        dest="subscription_id",
+        type=int,
+        help="Ignore events of other push subscriptions.",
+    )
+
+    args = parser.parse_args(argv)
+    if not args.verify_token:
+        raise SystemExit("Missing verify token: use --verify-token")
+    # the legacy positional arguments of strava_sync are not accepted here
+    args.client_id_arg = args.client_secret_arg = args.refresh_token_arg = None
+    client_id, client_secret, fallback_refresh_token = resolve_strava_secrets(args)
+    token_store = StravaTokenStore(STRAVA_TOKEN_PATH, client_secret)
+    tokens = token_store.load_tokens(fallback_refresh_token)
+
+    serve(
+        client_id=client_id,
+        client_secret=client_secret,
+        refresh_token=tokens.refresh_token,
+        access_token=tokens.access_token,
+        expires_at=tokens.expires_at,
+        verify_token=args.verify_token,
+        host=args.host,
+        port=args.port,
+        subscription_id=args.subscription_id,
+        token_store=token_store,
+        budget=RequestBudget(RATE_LIMIT_STATE_PATH),
+        raw_cache_path=str(RAW_CACHE_PATH),
+    )
+
+
+if __name__ == "__main__":
+    main()
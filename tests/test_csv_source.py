@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+
+from generator.db import ACTIVITY_KEYS
+from pushup_page.config import REPO_ROOT
+from pushup_page.csv_source import (
+    CSV_COLUMNS,
+    iter_csv_activities,
+    load_daily_totals,
+    parse_start_date,
+)
+from pushup_page.stats import DayTotal
+
+
+def test_csv_columns_match_export() -> None:
+    assert CSV_COLUMNS == ACTIVITY_KEYS
+
+
+def test_parse_start_date() -> None:
+    assert parse_start_date("2025-01-02 08:00:00+08:00") == (
+        1735776000,
+        8 * 3600,
+        "2025-01-02",
+    )
+    assert parse_start_date("2025-01-02T00:00:00") == (1735776000, 0, "2025-01-02")
+
+
+def test_load_daily_totals_from_csv(tmp_path) -> None:
+    csv_path = tmp_path / "pushup_data.csv"
+    csv_path.write_text(
+        ",".join(CSV_COLUMNS)
+        + "\r\n"
+        + "1,Push-Ups,2025-01-01 08:00:00+00:00,30,10,0.5,3.0\r\n"
+        + "2,Push-Ups,2025-01-01 20:00:00+00:00,40,20,0.6,\r\n"
+        + "3,Push-Ups,2025-01-03 08:00:00+00:00,50,0,,1.5\r\n"
+        + "4,Push-Ups,,50,5,,1.5\r\n"
+        # malformed rows are skipped: missing and extra fields, bad numbers
+        + "5,Push-Ups,2025-01-03 09:00:00+00:00,50\r\n"
+        + "6,Push-Ups,2025-01-03 10:00:00+00:00,50,5,,1.5,extra\r\n"
+        + "7,Push-Ups,2025-01-03 11:00:00+00:00,fifty,5,,1.5\r\n",
+        encoding="utf-8",
+    )
+
+    activities = list(iter_csv_activities(str(csv_path)))
+    assert [a.run_id for a in activities] == [1, 2, 3]
+    assert activities[1].calories is None
+
+    assert load_daily_totals(str(csv_path)) == [
+        DayTotal("2025-01-01", 30, 2, 70, 3.0),
+        DayTotal("2025-01-03", 0, 1, 50, 1.5),
+    ]
+
+
+def test_csv_summary_does_not_import_the_orm() -> None:
+    code = (
+        "import sys, pushup_page.pushup_summary, pushup_page.csv_source; "
+        "print(any(m.startswith(('sqlalchemy', 'generator')) for m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "False"
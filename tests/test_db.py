@@ -0,0 +1,229 @@
+from __future__ import annotations
+
+import datetime as dt
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.exc import OperationalError
+
+from generator.db import (
+    Activity,
+    DailyTotal,
+    activity_to_row,
+    bulk_upsert_activities,
+    get_engine,
+    get_scoped_session,
+    init_db,
+    rebuild_daily_totals,
+    update_or_create_activity,
+)
+from generator.migrations import LATEST_VERSION
+
+
+def _run_activity(run_id: int, name: str = "Push-Ups Workout") -> SimpleNamespace:
+    return SimpleNamespace(
+        id=run_id,
+        name=name,
+        start_date=dt.datetime(2025, 1, run_id, 8, tzinfo=dt.timezone.utc),
+        elapsed_time=60,
+    )
+
+
+def test_bulk_upsert_activities_counts_created_and_updated(tmp_path) -> None:
+    session = init_db(str(tmp_path / "data.db"))
+    try:
+        created, updated = bulk_upsert_activities(
+            session, [activity_to_row(_run_activity(1), 10, 1.0, 3.0)]
+        )
+        session.commit()
+        assert (created, updated) == (1, 0)
+
+        created, updated = bulk_upsert_activities(
+            session,
+            [
+                activity_to_row(_run_activity(1, "renamed"), 20, 0.9, 6.0),
+                activity_to_row(_run_activity(2), 30, 0.8, 9.0),
+            ],
+        )
+        session.commit()
+        assert (created, updated) == (1, 1)
+
+        first = session.get(Activity, 1)
+        assert (first.name, first.count, first.calories) == ("renamed", 20, 6.0)
+        second = session.get(Activity, 2)
+        assert second.start_date == "2025-01-02 08:00:00+00:00"
+        assert second.start_datetime == dt.datetime(
+            2025, 1, 2, 8, tzinfo=dt.timezone.utc
+        )
+    finally:
+        session.close()
+
+
+def test_bulk_upsert_activities_empty_batch(tmp_path) -> None:
+    session = init_db(str(tmp_path / "data.db"))
+    try:
+        assert bulk_upsert_activities(session, []) == (0, 0)
+    finally:
+        session.close()
+
+
+def test_init_db_reuses_cached_engine(tmp_path) -> None:
+    db_path = tmp_path / "data.db"
+    first = init_db(str(db_path))
+    second = init_db(str(tmp_path / "." / "data.db"))
+    try:
+        assert first is not second
+        assert first.get_bind() is second.get_bind() is get_engine(db_path)
+    finally:
+        first.close()
+        second.close()
+
+
+def test_scoped_session_is_per_thread(tmp_path) -> None:
+    registry = get_scoped_session(tmp_path / "data.db")
+
+    def worker():
+        session = registry()
+        same = registry() is session
+        registry.remove()
+        return session, same
+
+    # asserts run here: a failed assert in the worker would only end that thread
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        worker_session, same = executor.submit(worker).result()
+
+    try:
+        assert same
+        assert registry() is not worker_session
+    finally:
+        registry.remove()
+
+
+def test_wal_mode_lets_readers_run_during_a_write(tmp_path) -> None:
+    db_path = tmp_path / "data.db"
+    writer = init_db(str(db_path), wal=True)
+    reader = init_db(str(db_path), read_only=True)
+    try:
+        assert writer.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert writer.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+
+        bulk_upsert_activities(writer, [activity_to_row(_run_activity(1), 10)])
+        # the write transaction is still open; a WAL reader is not blocked
+        assert reader.execute(select(func.count(Activity.run_id))).scalar() == 0
+        writer.commit()
+        reader.rollback()
+        assert reader.execute(select(func.count(Activity.run_id))).scalar() == 1
+    finally:
+        writer.close()
+        reader.close()
+
+
+def test_read_only_session_rejects_writes(tmp_path) -> None:
+    db_path = tmp_path / "data.db"
+    init_db(str(db_path)).close()
+
+    for options in ({"read_only": True}, {"immutable": True}):
+        session = init_db(str(db_path), **options)
+        try:
+            with pytest.raises(OperationalError, match="readonly"):
+                bulk_upsert_activities(session, [activity_to_row(_run_activity(1))])
+        finally:
+            session.close()
+
+
+def test_read_only_open_migrates_but_never_creates(tmp_path) -> None:
+    db_path = tmp_path / "data.db"
+    with pytest.raises(RuntimeError, match="No database"):
+        init_db(str(db_path), read_only=True)
+    assert not db_path.exists()
+
+    # a checked out data.db from before the migrations
+    with closing(sqlite3.connect(db_path)) as connection:
+        connection.execute(
+            "CREATE TABLE activities (run_id INTEGER PRIMARY KEY, name VARCHAR, "
+            "start_date VARCHAR, elapsed_time INTEGER, count INTEGER, "
+            "avg_time FLOAT, calories FLOAT)"
+        )
+    with pytest.raises(RuntimeError, match="schema version 0"):
+        init_db(str(db_path), immutable=True)
+    with closing(sqlite3.connect(db_path)) as connection:
+        assert connection.execute("PRAGMA user_version").fetchone() == (0,)
+
+    session = init_db(str(db_path), read_only=True)
+    try:
+        assert session.execute(select(func.count(DailyTotal.local_date))).scalar() == 0
+    finally:
+        session.close()
+    with closing(sqlite3.connect(db_path)) as connection:
+        assert connection.execute("PRAGMA user_version").fetchone() == (LATEST_VERSION,)
+    # now current, so an immutable open works too
+    init_db(str(db_path), immutable=True).close()
+
+
+def _daily_totals(session) -> dict[str, tuple]:
+    return {
+        row.local_date: (row.reps, row.sessions, row.elapsed_time, row.calories)
+        for row in session.query(DailyTotal).order_by(DailyTotal.local_date)
+    }
+
+
+def test_daily_totals_follow_bulk_upserts_and_edits(tmp_path) -> None:
+    session = init_db(str(tmp_path / "data.db"))
+    try:
+        same_day = SimpleNamespace(
+            id=3,
+            name="Push-Ups Workout",
+            start_date=dt.datetime(2025, 1, 1, 20, tzinfo=dt.timezone.utc),
+            elapsed_time=30,
+        )
+        bulk_upsert_activities(
+            session,
+            [
+                activity_to_row(_run_activity(1), 10, 1.0, 3.0),
+                activity_to_row(same_day, 5, 1.0, 1.5),
+                activity_to_row(_run_activity(2), 20, 1.0, 6.0),
+            ],
+        )
+        session.commit()
+        assert _daily_totals(session) == {
+            "2025-01-01": (15, 2, 90, 4.5),
+            "2025-01-02": (20, 1, 60, 6.0),
+        }
+
+        # an edited count only moves the difference
+        bulk_upsert_activities(
+            session, [activity_to_row(_run_activity(1), 12, 1.0, 3.5)]
+        )
+        update_or_create_activity(session, _run_activity(2), 25, 1.0, 7.0)
+        update_or_create_activity(session, _run_activity(4), 4, 1.0, 1.0)
+        session.commit()
+        incremental = _daily_totals(session)
+        assert incremental == {
+            "2025-01-01": (17, 2, 90, 5.0),
+            "2025-01-02": (25, 1, 60, 7.0),
+            "2025-01-04": (4, 1, 60, 1.0),
+        }
+
+        assert rebuild_daily_totals(session) == 3
+        session.commit()
+        assert _daily_totals(session) == incremental
+    finally:
+        session.close()
+
+
+def test_update_or_create_activity_failure_keeps_pending_work(tmp_path) -> None:
+    session = init_db(str(tmp_path / "data.db"))
+    try:
+        assert update_or_create_activity(session, _run_activity(1), 10, 1.0, 3.0)
+        broken = _run_activity(2, name=["not", "a", "string"])
+        assert not update_or_create_activity(session, broken, 20, 1.0, 6.0)
+        session.commit()
+
+        assert [activity.run_id for activity in session.query(Activity)] == [1]
+        assert _daily_totals(session) == {"2025-01-01": (10, 1, 60, 3.0)}
+    finally:
+        session.close()
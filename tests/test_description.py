@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import pytest
+
+from generator.description import (
+    FIELDS,
+    ParsedDescription,
+    parse_description,
+    parse_descriptions,
+)
+
+PUUUSH = (
+    "Total Reps: 57\nAverage Time per Push-Up: 0.67s\nBurned Calories: 18.06\n\n"
+    "Data from Puuush App\nhttps://puuush.wsfu.co/andyzhou"
+)
+
+
+def test_parses_the_english_template() -> None:
+    assert parse_description(PUUUSH) == ParsedDescription(57, 0.67, 18.06, ())
+
+
+@pytest.mark.parametrize(
+    "description, expected",
+    [
+        (
+            "Burned Calories: 9\nTotal Reps: 30\nAverage Time per Push-Up: 1s",
+            ParsedDescription(30, 1.0, 9.0, ()),
+        ),
+        (
+            "Total Reps：42\nAverage Time per Push-Up: 0,8s\nBurned Calories: 12,5",
+            ParsedDescription(42, 0.8, 12.5, ()),
+        ),
+        (
+            "Total Reps: many\nBurned Calories: 6.4",
+            ParsedDescription(0, None, 6.4, ("count", "avg_time")),
+        ),
+        # labels not seen in real descriptions are not guessed at
+        ("Wiederholungen gesamt: 20", ParsedDescription(None, None, None, FIELDS)),
+        ("Total Reps: 15", ParsedDescription(15, None, None, ("avg_time", "calories"))),
+        ("Morning run, felt great: 10/10", ParsedDescription(None, None, None, FIELDS)),
+        (None, ParsedDescription(None, None, None, FIELDS)),
+    ],
+)
+def test_alternate_and_partial_descriptions(description, expected) -> None:
+    parsed = parse_description(description)
+    assert parsed == expected
+    assert parsed.has_count == (expected.count is not None)
+
+
+def test_batch_api_matches_single_parses() -> None:
+    descriptions = [PUUUSH, None, "Total Reps: 3"]
+    assert parse_descriptions(descriptions) == [
+        parse_description(description) for description in descriptions
+    ]
@@ -0,0 +1,337 @@
+from __future__ import annotations
+
+import datetime as dt
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from types import SimpleNamespace
+
+import pytest
+import stravalib
+
+import generator as generator_module
+from generator import Generator
+
+
+class SlowClient:
+    def __init__(self, fail_on: int | None = None) -> None:
+        self.fail_on = fail_on
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def get_activity(self, activity_id: int) -> SimpleNamespace:
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            # later ids finish first, so ordering comes from fetch_details
+            time.sleep(0.001 * (10 - activity_id % 10))
+            if activity_id == self.fail_on:
+                raise RuntimeError(f"detail {activity_id} failed")
+            return SimpleNamespace(id=activity_id)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+
+def _generator(tmp_path, workers: int, client) -> Generator:
+    generator = Generator(str(tmp_path / "data.db"), detail_workers=workers)
+    generator.client = client
+    return generator
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_fetch_details_keeps_input_order(tmp_path, workers) -> None:
+    client = SlowClient()
+    generator = _generator(tmp_path, workers, client)
+    activities = [SimpleNamespace(id=i) for i in range(25)]
+
+    pairs = list(generator.fetch_details(activities))
+    generator.close()
+
+    assert [(a.id, d.id) for a, d in pairs] == [(i, i) for i in range(25)]
+    assert client.max_active <= workers
+    if workers > 1:
+        assert client.max_active > 1
+
+
+def test_fetch_details_raises_first_failure_on_caller(tmp_path) -> None:
+    generator = _generator(tmp_path, 4, SlowClient(fail_on=5))
+    activities = [SimpleNamespace(id=i) for i in range(40)]
+
+    seen = []
+    with pytest.raises(RuntimeError, match="detail 5 failed"):
+        for activity, _ in generator.fetch_details(activities):
+            seen.append(activity.id)
+    generator.close()
+
+    assert seen == [0, 1, 2, 3, 4]
+
+
+class PagedClient:
+    """Serves summaries lazily and details with a push-up description."""
+
+    def __init__(self, count: int, rate_limit_after: int | None = None) -> None:
+        self.count = count
+        self.rate_limit_after = rate_limit_after
+        self.listed = 0
+        self.details = 0
+        self.no_count: set[int] = set()
+        # one activity a day, ending yesterday
+        today = dt.datetime.now(dt.timezone.utc).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        self.first = today - dt.timedelta(days=count)
+        self.renamed: set[int] = set()
+        # names SQLite cannot store
+        self.broken: set[int] = set()
+        self.newest_first = False
+
+    def refresh_access_token(self, **kwargs) -> dict:
+        return {"access_token": "access", "refresh_token": "refresh"}
+
+    def get_activities(self, after=None, before=None):
+        # Strava lists ``after`` windows oldest first
+        ids = range(self.count)
+        for i in reversed(ids) if self.newest_first else ids:
+            activity = self._activity(i)
+            if after is not None and activity.start_date <= after:
+                continue
+            if before is not None and activity.start_date >= before:
+                continue
+            self.listed += 1
+            yield activity
+
+    def get_activity(self, activity_id: int) -> SimpleNamespace:
+        if self.rate_limit_after is not None and self.details >= self.rate_limit_after:
+            raise stravalib.exc.RateLimitExceeded("rate limit")
+        self.details += 1
+        return self._activity(activity_id)
+
+    def _activity(self, i: int) -> SimpleNamespace:
+        start = self.first + dt.timedelta(days=i)
+        name = "Evening Push-Ups" if i in self.renamed else "Push-Ups"
+        return SimpleNamespace(
+            id=i,
+            name=[name] if i in self.broken else name,
+            start_date=start,
+            elapsed_time=60,
+            description=(
+                "Felt good"
+                if i in self.no_count
+                else f"Total Reps: {i + 1}\nBurned Calories: 1.5"
+            ),
+        )
+
+
+def _stored(db_path) -> list[tuple]:
+    with closing(sqlite3.connect(db_path)) as connection:
+        return connection.execute(
+            "SELECT run_id, count FROM activities ORDER BY run_id"
+        ).fetchall()
+
+
+def test_sync_pages_through_the_whole_window(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(generator_module, "SYNC_CHUNK_SIZE", 7)
+    client = PagedClient(30)
+    generator = _generator(tmp_path, 4, client)
+
+    generator.sync(False, start_date=client.first - dt.timedelta(days=1))
+    generator.close()
+
+    assert client.listed == 30
+    assert _stored(tmp_path / "data.db") == [(i, i + 1) for i in range(30)]
+
+
+def test_sync_keeps_committed_chunks_on_rate_limit(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(generator_module, "SYNC_CHUNK_SIZE", 5)
+    client = PagedClient(30, rate_limit_after=12)
+    generator = _generator(tmp_path, 1, client)
+
+    with pytest.raises(stravalib.exc.RateLimitExceeded):
+        generator.sync(False)
+    generator.close()
+
+    # the page of summaries is listed up front, its details only as needed
+    assert client.listed == 30
+    assert client.details == 12
+    assert _stored(tmp_path / "data.db") == [(i, i + 1) for i in range(12)]
+
+
+def test_sync_error_propagates_without_flushing_the_open_chunk(
+    tmp_path, monkeypatch
+) -> None:
+    monkeypatch.setattr(generator_module, "SYNC_CHUNK_SIZE", 5)
+    client = PagedClient(30)
+    generator = _generator(tmp_path, 1, client)
+    get_activity = client.get_activity
+
+    def failing_get_activity(activity_id: int):
+        if activity_id == 12:
+            raise RuntimeError("unexpected response")
+        return get_activity(activity_id)
+
+    client.get_activity = failing_get_activity
+    with pytest.raises(RuntimeError, match="unexpected response"):
+        generator.sync(False)
+    generator.close()
+
+    # only whole chunks were committed; 10 and 11 are fetched again next time
+    assert _stored(tmp_path / "data.db") == [(i, i + 1) for i in range(10)]
+
+
+def test_sync_skips_details_of_known_activities(tmp_path) -> None:
+    client = PagedClient(6)
+    client.no_count = {2}
+    generator = _generator(tmp_path, 1, client)
+    generator.sync(False)
+    assert client.details == 6
+    assert generator.stats["no_count"] == 1
+
+    # steady state: nothing new or changed, nothing fetched
+    generator.sync(False)
+    assert client.details == 6
+    assert generator.stats["unchanged"] == 6
+
+    client.renamed = {4}
+    generator.sync(False)
+    assert client.details == 7
+
+    generator.sync(True)
+    generator.close()
+    assert client.details == 13
+    assert [run_id for run_id, _ in _stored(tmp_path / "data.db")] == [0, 1, 3, 4, 5]
+
+
+def test_interrupted_sync_resumes_at_watermark(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(generator_module, "SYNC_CHUNK_SIZE", 5)
+    client = PagedClient(30, rate_limit_after=12)
+    generator = _generator(tmp_path, 4, client)
+    with pytest.raises(stravalib.exc.RateLimitExceeded):
+        generator.sync(False)
+
+    with closing(sqlite3.connect(tmp_path / "data.db")) as connection:
+        watermark, processed, finished_at = connection.execute(
+            "SELECT watermark, processed, finished_at FROM sync_journal"
+        ).fetchone()
+    assert finished_at is None
+    assert processed == 12
+    assert watermark == int((client.first + dt.timedelta(days=11)).timestamp())
+
+    client.rate_limit_after = None
+    client.listed = 0
+    generator.sync(False)
+    generator.close()
+
+    # only activity 11 is listed again (it shares the watermark), not refetched
+    assert client.listed == 19
+    assert client.details == 30
+    assert _stored(tmp_path / "data.db") == [(i, i + 1) for i in range(30)]
+    with closing(sqlite3.connect(tmp_path / "data.db")) as connection:
+        (open_windows,) = connection.execute(
+            "SELECT COUNT(*) FROM sync_journal WHERE finished_at IS NULL"
+        ).fetchone()
+        (open_ids,) = connection.execute(
+            "SELECT COUNT(*) FROM sync_journal_ids"
+        ).fetchone()
+    assert (open_windows, open_ids) == (0, 0)
+
+
+def test_explicit_start_date_or_force_replaces_an_unfinished_window(
+    tmp_path, monkeypatch
+) -> None:
+    monkeypatch.setattr(generator_module, "SYNC_CHUNK_SIZE", 5)
+    client = PagedClient(30, rate_limit_after=12)
+    generator = _generator(tmp_path, 1, client)
+    with pytest.raises(stravalib.exc.RateLimitExceeded):
+        generator.sync(False)
+
+    # an earlier start date than the unfinished window's watermark
+    client.rate_limit_after = None
+    client.listed = 0
+    generator.sync(False, start_date=client.first - dt.timedelta(days=1))
+    assert client.listed == 30
+    assert _stored(tmp_path / "data.db") == [(i, i + 1) for i in range(30)]
+
+    # force starts a window of its own too, at the interrupted one's watermark
+    client.rate_limit_after = client.details + 3
+    with pytest.raises(stravalib.exc.RateLimitExceeded):
+        generator.sync(True, start_date=client.first - dt.timedelta(days=1))
+    client.rate_limit_after = None
+    generator.sync(True)
+    generator.close()
+    with closing(sqlite3.connect(tmp_path / "data.db")) as connection:
+        windows = connection.execute(
+            "SELECT window_start, watermark, finished_at IS NOT NULL "
+            "FROM sync_journal ORDER BY id"
+        ).fetchall()
+    assert len(windows) == 4
+    assert all(finished for _, _, finished in windows)
+    assert windows[3][0] == windows[2][1]
+
+
+def test_sync_skips_only_the_record_that_fails_to_save(tmp_path) -> None:
+    client = PagedClient(8)
+    client.broken = {3}
+    generator = Generator(str(tmp_path / "data.db"), detail_workers=1, chunk_size=4)
+    generator.client = client
+
+    generator.sync(False)
+    assert generator.stats["failed"] == 1
+    assert [run_id for run_id, _ in _stored(tmp_path / "data.db")] == [
+        0,
+        1,
+        2,
+        4,
+        5,
+        6,
+        7,
+    ]
+
+    # the failed activity is not remembered, so it is fetched again
+    client.broken = set()
+    generator.sync(False)
+    generator.close()
+    assert client.details == 9
+    assert _stored(tmp_path / "data.db") == [(i, i + 1) for i in range(8)]
+
+
+def test_watermark_does_not_skip_summaries_listed_newest_first(
+    tmp_path, monkeypatch
+) -> None:
+    monkeypatch.setattr(generator_module, "SYNC_CHUNK_SIZE", 5)
+    client = PagedClient(30, rate_limit_after=12)
+    client.newest_first = True
+    generator = _generator(tmp_path, 1, client)
+    with pytest.raises(stravalib.exc.RateLimitExceeded):
+        generator.sync(False)
+
+    with closing(sqlite3.connect(tmp_path / "data.db")) as connection:
+        (watermark,) = connection.execute(
+            "SELECT watermark FROM sync_journal"
+        ).fetchone()
+    # the page is handled oldest first, so the watermark stops at activity 11
+    assert watermark == int((client.first + dt.timedelta(days=11)).timestamp())
+
+    client.rate_limit_after = None
+    generator.sync(False)
+    generator.close()
+    assert _stored(tmp_path / "data.db") == [(i, i + 1) for i in range(30)]
+
+
+def test_sync_lookback_sets_how_much_is_listed_again(tmp_path) -> None:
+    client = PagedClient(10)
+    generator = _generator(tmp_path, 1, client)
+    generator.sync(False, start_date=client.first - dt.timedelta(days=1))
+
+    client.listed = 0
+    generator.sync(False, lookback=dt.timedelta(days=4))
+    # the last window ended now; only activities 7 .. 9 are less than 4 days old
+    assert client.listed == 3
+
+    client.listed = 0
+    generator.sync(False, lookback=dt.timedelta(0))
+    generator.close()
+    assert client.listed == 0
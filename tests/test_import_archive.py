@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import csv
+import datetime as dt
+import io
+import sqlite3
+import zipfile
+from contextlib import closing
+
+from benchmarks.fake_strava import FakeStrava, make_activities
+from generator.db import SKIP_NO_COUNT, SKIP_NOT_PUSHUPS
+from generator.rate_limit import RequestBudget
+from pushup_page import strava_sync
+from pushup_page.import_archive import import_archive
+
+HEADER = [
+    "Activity ID",
+    "Activity Date",
+    "Activity Name",
+    "Activity Type",
+    "Activity Description",
+    "Elapsed Time",
+    "Distance",
+    # newer exports repeat some columns with another format
+    "Elapsed Time",
+]
+
+
+def _write_archive(path, activities, extra_rows=()) -> None:
+    """A Strava export ZIP whose activities.csv lists ``activities``."""
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(HEADER)
+    for activity in activities:
+        start_date = dt.datetime.strptime(activity["start_date"], "%Y-%m-%dT%H:%M:%SZ")
+        writer.writerow(
+            [
+                activity["id"],
+                start_date.strftime("%b %-d, %Y, %-I:%M:%S %p"),
+                activity["name"],
+                activity["type"],
+                activity["description"] or "",
+                activity["elapsed_time"],
+                "0.00",
+                f"{activity['elapsed_time']}.0",
+            ]
+        )
+    writer.writerows(extra_rows)
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("export_1234/activities.csv", "\ufeff" + text.getvalue())
+        archive.writestr("export_1234/profile.csv", "Athlete ID\n1\n")
+
+
+def test_import_archive_stores_pushup_sessions(tmp_path) -> None:
+    archive_path = tmp_path / "export.zip"
+    _write_archive(
+        archive_path,
+        make_activities(10),
+        extra_rows=[
+            ["not-an-id", "Jan 1, 2025, 7:30:00 AM", "Push-Ups"],
+            ["42", "Jan 2, 2025, 7:30:00 AM", "Push-Ups", "Workout", "", "60"],
+        ],
+    )
+    stats = import_archive(
+        str(archive_path),
+        db_path=str(tmp_path / "data.db"),
+        csv_path=str(tmp_path / "pushup_data.csv"),
+    )
+    assert (stats["created"], stats["unreadable"], stats["no_count"]) == (8, 1, 1)
+
+    with closing(sqlite3.connect(tmp_path / "data.db")) as connection:
+        assert connection.execute(
+            "SELECT run_id, start_date, elapsed_time, count, calories "
+            "FROM activities ORDER BY run_id LIMIT 1"
+        ).fetchone() == (10_000_000_000, "2025-01-01 07:30:00+00:00", 60, 40, 12.0)
+        skipped = dict(
+            connection.execute(
+                "SELECT skip_reason, COUNT(*) FROM known_activities "
+                "WHERE skip_reason IS NOT NULL GROUP BY skip_reason"
+            ).fetchall()
+        )
+    assert skipped == {SKIP_NOT_PUSHUPS: 2, SKIP_NO_COUNT: 1}
+    with open(tmp_path / "pushup_data.csv", newline="", encoding="utf-8") as csvfile:
+        assert len(list(csv.reader(csvfile))) == 9
+
+
+def test_sync_after_import_fetches_only_newer_activities(tmp_path) -> None:
+    activities = make_activities(15)
+    _write_archive(tmp_path / "export.zip", activities[:10])
+    import_archive(
+        str(tmp_path / "export.zip"),
+        db_path=str(tmp_path / "data.db"),
+        export_csv=False,
+    )
+
+    budget = RequestBudget(tmp_path / "rate-limit.json", reserve=0, max_wait=0)
+    with FakeStrava(activities) as fake:
+        stats = strava_sync.run_strava_sync(
+            client_id="client-id",
+            client_secret="client-secret",
+            refresh_token="refresh-token",
+            export_csv=False,
+            budget=budget,
+            db_path=str(tmp_path / "data.db"),
+            requests_session=fake.mount(budget.session()),
+        )
+        # the imported sessions in the lookback window are recognised
+        assert stats["unchanged"] > 0
+        assert fake.requests["detail"] == stats["details"] == 4
+    assert stats["created"] == 4
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import sqlite3
+from contextlib import closing
+
+import pytest
+from sqlalchemy import create_engine
+
+from generator.db import Base, get_engine, init_db
+from generator.migrations import LATEST_VERSION, migrate
+
+
+def _schema(db_path) -> dict[str, set[str]]:
+    with closing(sqlite3.connect(db_path)) as connection:
+        tables = [
+            row[0]
+            for row in connection.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'"
+            )
+        ]
+        return {
+            table: {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+            for table in tables
+        }
+
+
+def _user_version(db_path) -> int:
+    with closing(sqlite3.connect(db_path)) as connection:
+        return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def test_fresh_database_matches_models(tmp_path) -> None:
+    db_path = tmp_path / "data.db"
+    init_db(str(db_path)).close()
+
+    assert _user_version(db_path) == LATEST_VERSION
+    assert _schema(db_path) == {
+        name: {column.name for column in table.columns}
+        for name, table in Base.metadata.tables.items()
+    }
+
+
+def test_migrates_legacy_database_once(tmp_path) -> None:
+    db_path = tmp_path / "data.db"
+    with closing(sqlite3.connect(db_path)) as connection:
+        connection.execute(
+            "CREATE TABLE activities (run_id INTEGER PRIMARY KEY, name VARCHAR, "
+            "start_date VARCHAR, elapsed_time INTEGER, count INTEGER, "
+            "avg_time FLOAT, calories FLOAT)"
+        )
+        connection.execute(
+            "INSERT INTO activities VALUES "
+            "(1, 'push-ups', '2025-01-02 08:00:00+00:00', 10, 12, 1.0, 5.0)"
+        )
+        connection.commit()
+
+    assert migrate(get_engine(db_path)) == LATEST_VERSION
+
+    with closing(sqlite3.connect(db_path)) as connection:
+        assert connection.execute(
+            "SELECT local_date, reps, sessions FROM daily_totals"
+        ).fetchall() == [("2025-01-02", 12, 1)]
+
+    # a current database is left alone
+    content = db_path.read_bytes()
+    engine = create_engine(f"sqlite:///{db_path}")
+    try:
+        assert migrate(engine) == LATEST_VERSION
+    finally:
+        engine.dispose()
+    assert db_path.read_bytes() == content
+
+
+def test_failed_step_leaves_database_untouched(tmp_path, monkeypatch) -> None:
+    from generator import migrations
+
+    def broken(conn) -> None:
+        conn.exec_driver_sql("CREATE TABLE scratch (id INTEGER)")
+        raise RuntimeError("boom")
+
+    db_path = tmp_path / "data.db"
+    steps = list(migrations.MIGRATIONS)
+    steps.append(migrations.Migration(len(steps) + 1, "broken", broken))
+    monkeypatch.setattr(migrations, "MIGRATIONS", steps)
+    monkeypatch.setattr(migrations, "LATEST_VERSION", len(steps))
+
+    with pytest.raises(RuntimeError, match="boom"):
+        get_engine(db_path)
+
+    assert _user_version(db_path) == 0
+    assert _schema(db_path) == {}
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import sqlite3
+from contextlib import closing
+
+from benchmarks.fake_strava import FakeStrava, make_activities
+from pushup_page import multi_sync
+
+CONFIG = """
+jobs = 3
+
+[[accounts]]
+name = "andy"
+client_id = 12345
+client_secret_env = "ANDY_CLIENT_SECRET"
+refresh_token_env = "ANDY_REFRESH_TOKEN"
+start_date = "2025-01-01T00:00:00+00:00"
+
+[[accounts]]
+name = "bea"
+client_id = 12345
+client_secret = "bea-secret"
+refresh_token = "bea-refresh-token"
+db_path = "bea/pushups.db"
+start_date = "2025-01-01T00:00:00+00:00"
+
+[[accounts]]
+name = "carl"
+client_id = 67890
+client_secret = "carl-secret"
+"""
+
+
+def _count(db_path) -> int:
+    with closing(sqlite3.connect(db_path)) as connection:
+        return connection.execute("SELECT COUNT(*) FROM activities").fetchone()[0]
+
+
+def test_sync_accounts_isolates_accounts(tmp_path, monkeypatch, capsys) -> None:
+    monkeypatch.setenv("ANDY_CLIENT_SECRET", "andy-secret")
+    monkeypatch.setenv("ANDY_REFRESH_TOKEN", "andy-refresh-token")
+    config_path = tmp_path / "accounts.toml"
+    config_path.write_text(CONFIG, "utf-8")
+
+    accounts, jobs = multi_sync.load_accounts(config_path)
+    assert [account.name for account in accounts] == ["andy", "bea", "carl"]
+    assert accounts[0].db_path == tmp_path / "accounts" / "andy" / "data.db"
+    assert accounts[1].db_path == tmp_path / "bea" / "pushups.db"
+    assert jobs == 3
+
+    budgets = multi_sync.shared_budgets(accounts, tmp_path)
+    # one budget per Strava application
+    assert budgets["12345"] is not budgets["67890"]
+    with FakeStrava(make_activities(10), latency=0.01) as fake:
+        reports = multi_sync.sync_accounts(
+            accounts,
+            jobs=jobs,
+            budgets=budgets,
+            session_factory=lambda budget: fake.mount(budget.session()),
+        )
+
+    andy, bea, carl = reports
+    # concurrent output stays readable: every line names its account
+    lines = capsys.readouterr().out.splitlines()
+    assert all(line.startswith(("[andy] ", "[bea] ", "[carl] ")) for line in lines)
+    assert sum(line.startswith("[bea] activity ") for line in lines) == 10
+    assert (andy.status, bea.status) == ("ok", "ok")
+    assert andy.stats["created"] == bea.stats["created"] == 8
+    assert _count(accounts[0].db_path) == _count(accounts[1].db_path) == 8
+    assert accounts[0].token_path.exists() and accounts[1].token_path.exists()
+    # no refresh token anywhere: reported, without stopping the others
+    assert carl.status == "failed"
+    assert "Missing Strava refresh token" in carl.error
+
+    budgets["12345"].save()
+    assert budgets["12345"].state.long_usage == fake.requests["api"]
+    assert (tmp_path / ".strava-rate-limit-12345.json").exists()
@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import pytest
+from stravalib.exc import RateLimitExceeded
+
+from generator.db import init_db, remember_activities
+from generator.rate_limit import RequestBudget, plan_sync
+
+DAY = 86400
+
+
+class FakeClock:
+    def __init__(self, now: float) -> None:
+        self.now = now
+        self.slept: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def _budget(tmp_path, clock: FakeClock, **kwargs) -> RequestBudget:
+    return RequestBudget(
+        tmp_path / "rate-limit.json", clock=clock, sleep=clock.sleep, **kwargs
+    )
+
+
+def test_waits_for_next_quarter_hour_when_window_is_spent(tmp_path) -> None:
+    clock = FakeClock(100 * DAY + 60)
+    budget = _budget(tmp_path, clock, reserve=0)
+    budget({"X-ReadRateLimit-Limit": "3,10", "X-ReadRateLimit-Usage": "1,1"}, "GET")
+
+    budget.acquire()
+    budget.acquire()
+    assert clock.slept == []
+
+    budget.acquire()
+    assert clock.slept == [900 - 60 + 1]
+    assert budget.remaining() == (2, 6)
+
+
+def test_waiting_releases_the_lock_and_saves_only_on_window_change(tmp_path) -> None:
+    clock = FakeClock(100 * DAY + 60)
+    budget = _budget(tmp_path, clock, reserve=0)
+    budget({"X-ReadRateLimit-Limit": "2,10", "X-ReadRateLimit-Usage": "0,0"}, "GET")
+    state_path = tmp_path / "rate-limit.json"
+    saved = state_path.read_text("utf-8")
+
+    budget.acquire()
+    budget.acquire()
+    assert state_path.read_text("utf-8") == saved
+
+    def sleep(seconds: float) -> None:
+        assert not budget._lock.locked()
+        clock.sleep(seconds)
+
+    budget._sleep = sleep
+    budget.acquire()
+    assert clock.slept == [900 - 60 + 1]
+    # the new quarter hour was saved, with its first request only on close
+    assert state_path.read_text("utf-8") != saved
+    budget.close()
+    assert _budget(tmp_path, clock, reserve=0).remaining() == (1, 7)
+
+
+def test_budget_persists_and_stops_at_daily_limit(tmp_path) -> None:
+    clock = FakeClock(100 * DAY + 60)
+    budget = _budget(tmp_path, clock, reserve=1)
+    budget({"X-RateLimit-Limit": "100,4", "X-RateLimit-Usage": "2,2"}, "POST")
+    budget.acquire()
+    budget.close()
+
+    restarted = _budget(tmp_path, clock, reserve=1)
+    assert restarted.remaining() == (96, 0)
+    with pytest.raises(RateLimitExceeded) as excinfo:
+        restarted.acquire()
+    assert excinfo.value.timeout == DAY - 60
+
+    clock.now += DAY
+    restarted.acquire()
+    assert restarted.remaining() == (98, 2)
+
+
+def test_plan_counts_known_and_extrapolates_new(tmp_path) -> None:
+    session = init_db(str(tmp_path / "data.db"))
+    start = 100 * DAY
+    remember_activities(
+        session,
+        [
+            {
+                "run_id": i,
+                "fingerprint": str(i),
+                "start_epoch": start + i * DAY // 2,
+                "skip_reason": "not push-ups" if i % 4 == 0 else None,
+            }
+            for i in range(20)
+        ],
+    )
+    session.commit()
+
+    plan = plan_sync(session, start, start + 20 * DAY)
+    assert plan.known == 20
+    # 20 activities over 9.5 days, 10.5 days beyond the last known one
+    assert plan.estimated_new == 23
+    assert plan.list_calls == 1
+    assert plan.detail_calls == 23
+
+    forced = plan_sync(session, start, start + 20 * DAY, force=True)
+    assert forced.detail_calls == 23 + 15
+    session.close()
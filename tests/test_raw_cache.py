@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+from generator.raw_cache import RawActivityCache
+
+
+def test_raw_cache_keeps_versions_and_dedupes_payloads(tmp_path) -> None:
+    with RawActivityCache(tmp_path / "cache.db") as cache:
+        first = cache.put(1, "60:100:Push-Ups", {"id": 1, "name": "Push-Ups"})
+        renamed = cache.put(1, "60:100:Evening", {"id": 1, "name": "Evening"})
+        # the same payload under another key is stored once
+        assert cache.put(2, "60:200:Push-Ups", {"name": "Push-Ups", "id": 1}) == first
+        assert renamed != first
+
+        assert len(cache) == 2
+        assert cache.get(1) == {"id": 1, "name": "Evening"}
+        assert cache.get(3) is None
+        assert list(cache.iter_latest()) == [
+            (1, {"id": 1, "name": "Evening"}),
+            (2, {"id": 1, "name": "Push-Ups"}),
+        ]
+        (payloads,) = cache._connection.execute(
+            "SELECT COUNT(*) FROM payloads"
+        ).fetchone()
+    assert payloads == 2
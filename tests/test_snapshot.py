@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from generator.db import Activity, DailyTotal, init_db, rebuild_daily_totals
+
+np = pytest.importorskip("numpy")
+
+from pushup_page import snapshot  # noqa: E402
+from pushup_page.snapshot import load_snapshot, read_header  # noqa: E402
+
+
+def _add(session, run_id: int, start_date: str, count: int) -> None:
+    session.add(
+        Activity(
+            run_id=run_id,
+            name="push-ups",
+            start_date=start_date,
+            elapsed_time=30,
+            count=count,
+            avg_time=1.0,
+            calories=count / 3,
+        )
+    )
+
+
+def test_snapshot_is_memory_mapped_and_reused(tmp_path) -> None:
+    db_path = str(tmp_path / "data.db")
+    snapshot_dir = tmp_path / "snapshot"
+    session = init_db(db_path)
+    try:
+        _add(session, 2, "2025-01-02 08:00:00+00:00", 20)
+        _add(session, 1, "2025-01-01 08:00:00+00:00", 10)
+        session.commit()
+
+        snapshot = load_snapshot(db_path, snapshot_dir)
+        assert isinstance(snapshot.count, np.memmap)
+        assert snapshot.run_id.tolist() == [1, 2]
+        assert [row.count for row in snapshot.iter_rows()] == [10, 20]
+        source_hash = read_header(snapshot_dir)["source_hash"]
+
+        assert load_snapshot(db_path, snapshot_dir, rebuild=False) is not None
+
+        _add(session, 3, "2025-01-02 20:00:00+00:00", 5)
+        session.commit()
+        assert load_snapshot(db_path, snapshot_dir, rebuild=False) is None
+
+        snapshot = load_snapshot(db_path, snapshot_dir)
+        assert read_header(snapshot_dir)["source_hash"] != source_hash
+        assert len(snapshot) == 3
+        rebuild_daily_totals(session)
+        assert [tuple(day) for day in snapshot.daily_totals()] == pytest.approx(
+            [
+                (d.local_date, d.reps, d.sessions, d.elapsed_time, d.calories)
+                for d in session.query(DailyTotal).order_by(DailyTotal.local_date)
+            ]
+        )
+    finally:
+        session.close()
+
+
+def test_snapshot_of_empty_database(tmp_path) -> None:
+    db_path = str(tmp_path / "data.db")
+    init_db(db_path).close()
+
+    snapshot = load_snapshot(db_path, tmp_path / "snapshot")
+
+    assert len(snapshot) == 0
+    assert snapshot.daily_totals() == []
+
+
+def test_snapshot_hashes_only_when_size_or_mtime_change(tmp_path, monkeypatch) -> None:
+    db_path = str(tmp_path / "data.db")
+    snapshot_dir = tmp_path / "snapshot"
+    session = init_db(db_path)
+    try:
+        _add(session, 1, "2025-01-01 08:00:00+00:00", 10)
+        session.commit()
+    finally:
+        session.close()
+    load_snapshot(db_path, snapshot_dir)
+
+    hashed = []
+    original_hash = snapshot.database_hash
+    monkeypatch.setattr(
+        snapshot,
+        "database_hash",
+        lambda path: hashed.append(path) or original_hash(path),
+    )
+    assert load_snapshot(db_path, snapshot_dir, rebuild=False) is not None
+    assert hashed == []
+
+    # same contents, new mtime (e.g. a fresh checkout): hashed once, then trusted
+    stat = os.stat(db_path)
+    os.utime(db_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert load_snapshot(db_path, snapshot_dir, rebuild=False) is not None
+    assert load_snapshot(db_path, snapshot_dir, rebuild=False) is not None
+    assert hashed == [db_path]
@@ -1,7 +1,8 @@
 import datetime as dt
+import sqlite3
 
 from generator.db import Activity, init_db
-from pushup_page.storage import get_latest_activity_datetime
+from pushup_page.storage import get_latest_activity_datetime, iter_activities
 
 
 def test_get_latest_activity_datetime(tmp_path) -> None:
@@ -37,3 +38,65 @@ def test_get_latest_activity_datetime(tmp_path) -> None:
         assert latest.date() == dt.date(2025, 1, 2)
     finally:
         session.close()
+
+
+def test_init_db_backfills_start_epoch_for_legacy_rows(tmp_path) -> None:
+    db_path = tmp_path / "data.db"
+    with sqlite3.connect(db_path) as connection:
+        connection.execute(
+            "CREATE TABLE activities (run_id INTEGER PRIMARY KEY, name VARCHAR, "
+            "start_date VARCHAR, elapsed_time INTEGER, count INTEGER, "
+            "avg_time FLOAT, calories FLOAT)"
+        )
+        connection.execute(
+            "INSERT INTO activities VALUES "
+            "(1, 'push-ups', '2025-01-02 08:00:00+08:00', 10, 10, 1.0, 5.0)"
+        )
+
+    session = init_db(str(db_path))
+    try:
+        activity = session.get(Activity, 1)
+        assert activity.start_epoch == int(
+            dt.datetime(2025, 1, 2, tzinfo=dt.timezone.utc).timestamp()
+        )
+        assert activity.utc_offset == 8 * 3600
+        assert activity.start_datetime.isoformat() == "2025-01-02T08:00:00+08:00"
+    finally:
+        session.close()
+
+    with sqlite3.connect(db_path) as connection:
+        indexes = {
+            row[1] for row in connection.execute("PRAGMA index_list(activities)")
+        }
+    assert "ix_activities_start_epoch" in indexes
+
+
+def test_iter_activities_projects_columns_and_filters_range(tmp_path) -> None:
+    session = init_db(str(tmp_path / "data.db"))
+    try:
+        for day in (3, 1, 2):
+            session.add(
+                Activity(
+                    run_id=day,
+                    name="push-ups",
+                    start_date=f"2025-01-0{day}T00:00:00+00:00",
+                    elapsed_time=10,
+                    count=day * 10,
+                    avg_time=1.0,
+                    calories=5.0,
+                )
+            )
+        session.commit()
+
+        rows = list(iter_activities(session, ("run_id", "count"), chunk_size=1))
+        assert [tuple(row) for row in rows] == [(1, 10), (2, 20), (3, 30)]
+
+        rows = iter_activities(
+            session,
+            ("run_id",),
+            start=dt.datetime(2025, 1, 2),
+            end=dt.datetime(2025, 1, 3, tzinfo=dt.timezone.utc),
+        )
+        assert [row.run_id for row in rows] == [2]
+    finally:
+        session.close()
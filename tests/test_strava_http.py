@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import socket
+
+import pytest
+import requests
+
+from benchmarks.fake_strava import STRAVA_URL, FakeStrava, make_activities
+from generator.rate_limit import RequestBudget
+from generator.strava_http import StravaSession
+
+
+def _session(fake, budget=None, **kwargs):
+    delays = []
+    session = StravaSession(budget, sleep=delays.append, jitter=lambda: 1.0, **kwargs)
+    return fake.mount(session), delays
+
+
+def test_retries_transient_errors_with_backoff(tmp_path) -> None:
+    budget = RequestBudget(tmp_path / "rate-limit.json", reserve=0)
+    with FakeStrava(make_activities(1), error_rate=1.0, error_status=503) as fake:
+        session, delays = _session(fake, budget, retries=3, backoff=0.5)
+        response = session.get(f"{STRAVA_URL}/api/v3/activities/10000000000")
+
+        # the last answer is returned once the retries are used up
+        assert response.status_code == 503
+        assert fake.requests["error"] == 4
+        assert delays == [0.5, 1.0, 2.0]
+        assert session.retried == 3
+        # every attempt took a token from the budget
+        assert budget.state.long_usage == 4
+
+
+def test_recovers_from_dropped_connections() -> None:
+    with FakeStrava(make_activities(3), drop_rate=0.5, seed=1) as fake:
+        session, _ = _session(fake, retries=10)
+        for activity in fake.activities:
+            url = f"{STRAVA_URL}/api/v3/activities/{activity['id']}"
+            assert session.get(url).json()["id"] == activity["id"]
+        assert session.retried == fake.requests["dropped"] > 0
+
+
+def test_retries_only_idempotent_requests() -> None:
+    # a port nobody listens on: every attempt fails to connect
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        url = f"http://127.0.0.1:{sock.getsockname()[1]}/api/v3/activities"
+    delays = []
+    session = StravaSession(retries=2, sleep=delays.append)
+
+    with pytest.raises(requests.ConnectionError):
+        session.post(url, data={})
+    assert delays == []
+    with pytest.raises(requests.ConnectionError):
+        session.get(url)
+    assert len(delays) == session.retried == 2
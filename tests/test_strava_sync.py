@@ -1,10 +1,21 @@
 from __future__ import annotations
 
+import argparse
+import csv
 import datetime as dt
+import sqlite3
+from collections import Counter
+from contextlib import closing
+from types import SimpleNamespace
 
 import pytest
 
-from pushup_page import strava_sync
+from benchmarks.fake_strava import FakeStrava, make_activities
+from generator import Generator
+from generator.db import ACTIVITY_KEYS
+from generator.rate_limit import RequestBudget
+from generator.raw_cache import RawActivityCache
+from pushup_page import db_tools, strava_sync
 from pushup_page.strava_token import StravaTokenStore
 
 
@@ -12,18 +23,21 @@ def test_persists_rotated_token_when_sync_fails(monkeypatch, tmp_path) -> None:
     class FakeGenerator:
         instance = None
 
-        def __init__(self, db_path: str) -> None:
+        def __init__(self, db_path: str, **kwargs) -> None:
             self.access_token = ""
             self.refresh_token = ""
+            self.expires_at = 0
             self.closed = False
+            self.stats = Counter()
+            self.requests_session = SimpleNamespace(retried=2)
             FakeGenerator.instance = self
 
         def set_strava_config(
-            self, client_id: str, client_secret: str, refresh_token: str
+            self, client_id: str, client_secret: str, refresh_token: str, *args
         ) -> None:
             self.refresh_token = refresh_token
 
-        def sync(self, force: bool, start_date: dt.datetime | None = None) -> None:
+        def sync(self, force: bool, start_date=None, *, lookback=None) -> None:
             self.access_token = "access-token"
             self.refresh_token = "rotated-token"
             raise RuntimeError("activity sync failed")
@@ -46,4 +60,400 @@ def test_persists_rotated_token_when_sync_fails(monkeypatch, tmp_path) -> None:
 
     assert FakeGenerator.instance is not None
     assert FakeGenerator.instance.closed
+    # counted even though the sync failed
+    assert FakeGenerator.instance.stats["http_retries"] == 2
     assert token_store.load() == "rotated-token"
+
+
+def _create_activities_db(db_path, rows) -> None:
+    with closing(sqlite3.connect(db_path)) as connection:
+        connection.execute(
+            "CREATE TABLE activities (run_id INTEGER PRIMARY KEY, name VARCHAR, "
+            "start_date VARCHAR, elapsed_time INTEGER, count INTEGER, "
+            "avg_time FLOAT, calories FLOAT)"
+        )
+        connection.executemany(
+            "INSERT INTO activities VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+        )
+        connection.commit()
+
+
+def test_export_activities_to_csv_appends_only_new_rows(tmp_path) -> None:
+    db_path = str(tmp_path / "data.db")
+    csv_path = tmp_path / "pushup_data.csv"
+    first = (1, "Push-Ups", "2025-01-01 08:00:00+00:00", 30, 10, 0.5, 3.1)
+    second = (2, "Push-Ups", "2025-01-02 08:00:00+00:00", 40, 20, 0.6, None)
+    _create_activities_db(db_path, [first])
+
+    assert strava_sync.export_activities_to_csv(db_path, str(csv_path)) == 1
+    original = csv_path.read_bytes()
+    assert strava_sync.export_activities_to_csv(db_path, str(csv_path)) == 0
+
+    with closing(sqlite3.connect(db_path)) as connection:
+        connection.execute(
+            "INSERT INTO activities VALUES (?, ?, ?, ?, ?, ?, ?)", second
+        )
+        connection.commit()
+
+    assert strava_sync.export_activities_to_csv(db_path, str(csv_path)) == 1
+    content = csv_path.read_bytes()
+    assert content.startswith(original)
+    assert content[len(original) :] == (
+        b"2,Push-Ups,2025-01-02 08:00:00+00:00,40,20,0.6,\r\n"
+    )
+
+
+def test_export_activities_to_csv_rewrites_changed_rows(tmp_path) -> None:
+    db_path = str(tmp_path / "data.db")
+    csv_path = tmp_path / "pushup_data.csv"
+    _create_activities_db(
+        db_path,
+        [
+            (1, "Push-Ups", "2025-01-01 08:00:00+00:00", 30, 10, 0.5, 3.1),
+            (2, "Push-Ups", "2025-01-02 08:00:00+00:00", 40, 20, 0.6, 6.2),
+        ],
+    )
+    strava_sync.export_activities_to_csv(db_path, str(csv_path))
+
+    with closing(sqlite3.connect(db_path)) as connection:
+        connection.execute("UPDATE activities SET count = 11 WHERE run_id = 1")
+        connection.commit()
+    # only the file's last row is checked, so an older edit needs a full export
+    assert strava_sync.export_activities_to_csv(db_path, str(csv_path)) == 0
+    assert (
+        strava_sync.export_activities_to_csv(db_path, str(csv_path), incremental=False)
+        == 2
+    )
+
+    with closing(sqlite3.connect(db_path)) as connection:
+        connection.execute("UPDATE activities SET count = 21 WHERE run_id = 2")
+        connection.commit()
+    # the last row changed: rewritten without being asked
+    assert strava_sync.export_activities_to_csv(db_path, str(csv_path)) == 2
+
+    with open(csv_path, newline="", encoding="utf-8") as csvfile:
+        rows = list(csv.reader(csvfile))
+    assert rows[0] == ACTIVITY_KEYS
+    assert [row[4] for row in rows[1:]] == ["11", "21"]
+    assert not (tmp_path / "pushup_data.csv.tmp").exists()
+
+
+def test_export_activities_to_csv_removes_a_failed_rewrite(
+    tmp_path, monkeypatch
+) -> None:
+    db_path = str(tmp_path / "data.db")
+    csv_path = tmp_path / "pushup_data.csv"
+    _create_activities_db(
+        db_path, [(1, "Push-Ups", "2025-01-01 08:00:00+00:00", 30, 10, 0.5, 3.1)]
+    )
+    strava_sync.export_activities_to_csv(db_path, str(csv_path))
+    original = csv_path.read_bytes()
+
+    def broken_rows(connection, after_run_id=None):
+        yield ["1"]
+        raise sqlite3.OperationalError("disk I/O error")
+
+    monkeypatch.setattr(strava_sync, "_iter_export_rows", broken_rows)
+    with pytest.raises(sqlite3.OperationalError):
+        strava_sync.export_activities_to_csv(db_path, str(csv_path), incremental=False)
+    assert csv_path.read_bytes() == original
+    assert not (tmp_path / "pushup_data.csv.tmp").exists()
+
+
+def _sync_against(fake, tmp_path, **kwargs):
+    budget = RequestBudget(tmp_path / "rate-limit.json", reserve=0, max_wait=0)
+    kwargs.setdefault("refresh_token", "refresh-token")
+    return strava_sync.run_strava_sync(
+        client_id="client-id",
+        client_secret="client-secret",
+        budget=budget,
+        db_path=str(tmp_path / "data.db"),
+        csv_path=str(tmp_path / "pushup_data.csv"),
+        requests_session=fake.mount(budget.session()),
+        **kwargs,
+    )
+
+
+def test_run_strava_sync_end_to_end(tmp_path) -> None:
+    with FakeStrava(make_activities(25)) as fake:
+        stats = _sync_against(fake, tmp_path)
+        assert (stats["created"], stats["details"]) == (20, 20)
+        assert fake.requests["list"] == 1
+
+        # nothing changed upstream: only the list is fetched again
+        stats = _sync_against(fake, tmp_path)
+        assert (stats["created"], stats["details"]) == (0, 0)
+        assert fake.requests["detail"] == 20
+
+    with open(tmp_path / "pushup_data.csv", newline="", encoding="utf-8") as csvfile:
+        rows = list(csv.reader(csvfile))
+    assert len(rows) == 21
+    assert rows[1][:2] == ["10000000000", "Push-Ups"]
+
+
+def _csv_matches_db(tmp_path) -> bool:
+    with open(tmp_path / "pushup_data.csv", newline="", encoding="utf-8") as csvfile:
+        rows = list(csv.reader(csvfile))[1:]
+    with closing(sqlite3.connect(tmp_path / "data.db")) as connection:
+        stored = connection.execute(
+            f"{strava_sync.EXPORT_QUERY} ORDER BY run_id"
+        ).fetchall()
+    return rows == [strava_sync._format_row(row) for row in stored]
+
+
+def test_export_notices_edits_made_by_other_processes(tmp_path) -> None:
+    activities = make_activities(25)
+    with FakeStrava(activities) as fake:
+        _sync_against(fake, tmp_path)
+        # deleted upstream and applied by the webhook receiver, not this sync
+        removed = activities.pop(0)
+        generator = Generator(str(tmp_path / "data.db"))
+        try:
+            assert generator.delete_activities([removed["id"]]) == 1
+        finally:
+            generator.close()
+        stats = _sync_against(fake, tmp_path)
+        assert (stats["updated"], stats["deleted"]) == (0, 0)
+    assert _csv_matches_db(tmp_path)
+
+    # e.g. ``db reparse``: an older row changes in place
+    with closing(sqlite3.connect(tmp_path / "data.db")) as connection:
+        connection.execute(
+            "UPDATE activities SET count = count + 1 "
+            "WHERE run_id = (SELECT MIN(run_id) FROM activities)"
+        )
+        connection.commit()
+        (stored,) = connection.execute("SELECT COUNT(*) FROM activities").fetchone()
+    assert (
+        strava_sync.export_activities_to_csv(
+            str(tmp_path / "data.db"), str(tmp_path / "pushup_data.csv")
+        )
+        == stored
+    )
+    assert _csv_matches_db(tmp_path)
+    # and nothing is rewritten once the file caught up
+    assert (
+        strava_sync.export_activities_to_csv(
+            str(tmp_path / "data.db"), str(tmp_path / "pushup_data.csv")
+        )
+        == 0
+    )
+
+
+def test_run_strava_sync_stops_cleanly_at_the_rate_limit(tmp_path) -> None:
+    with FakeStrava(make_activities(25), rate_limits=(10, 1000)) as fake:
+        stats = _sync_against(fake, tmp_path, export_csv=False, detail_workers=1)
+        assert fake.requests["rate_limited"] == 0
+        assert fake.requests["api"] == 10
+
+    with closing(sqlite3.connect(tmp_path / "data.db")) as connection:
+        (stored,) = connection.execute("SELECT COUNT(*) FROM activities").fetchone()
+        (finished_at,) = connection.execute(
+            "SELECT finished_at FROM sync_journal"
+        ).fetchone()
+    assert stored == stats["created"] == 9
+    assert finished_at is None
+
+
+def test_reparse_rebuilds_activities_from_the_raw_cache(tmp_path) -> None:
+    cache_path = str(tmp_path / "strava-cache.db")
+    activities = make_activities(10)
+    with FakeStrava(activities) as fake:
+        _sync_against(fake, tmp_path, export_csv=False, raw_cache_path=cache_path)
+        requests_made = dict(fake.requests)
+    # the detail responses are kept as Strava sent them
+    cache = RawActivityCache(cache_path)
+    cached = {run_id: payload for run_id, payload in cache.iter_latest()}
+    cache.close()
+    assert cached == {
+        activity["id"]: activity
+        for activity in activities
+        if "push-ups" in activity["name"].lower()
+    }
+
+    with closing(sqlite3.connect(tmp_path / "data.db")) as connection:
+        expected = connection.execute(
+            "SELECT run_id, count, avg_time, calories FROM activities"
+        ).fetchall()
+        # as if the parser had missed the numbers
+        connection.execute("UPDATE activities SET count = 0, calories = 0")
+        connection.execute("UPDATE daily_totals SET reps = 0, calories = 0")
+        connection.commit()
+
+    stats = db_tools.run_reparse(str(tmp_path / "data.db"), cache_path)
+    assert (stats["created"], stats["updated"]) == (0, 8)
+    assert dict(fake.requests) == requests_made
+    with closing(sqlite3.connect(tmp_path / "data.db")) as connection:
+        assert (
+            connection.execute(
+                "SELECT run_id, count, avg_time, calories FROM activities"
+            ).fetchall()
+            == expected
+        )
+        (reps,) = connection.execute("SELECT SUM(reps) FROM daily_totals").fetchone()
+    assert reps == sum(row[1] for row in expected)
+
+
+def test_print_sync_plan_only_reads_the_database(tmp_path, capsys) -> None:
+    db_path = tmp_path / "data.db"
+    strava_sync.print_sync_plan(db_path=str(db_path))
+    assert "planning a first sync" in capsys.readouterr().out
+    assert list(tmp_path.iterdir()) == []
+
+    with FakeStrava(make_activities(25)) as fake:
+        _sync_against(fake, tmp_path, export_csv=False)
+    stored = db_path.read_bytes()
+    capsys.readouterr()
+    strava_sync.print_sync_plan(
+        dt.datetime(2000, 1, 1, tzinfo=dt.timezone.utc), db_path=str(db_path)
+    )
+    assert "known activities in window: 25" in capsys.readouterr().out
+    assert db_path.read_bytes() == stored
+
+
+def test_run_strava_sync_reuses_a_cached_access_token(tmp_path) -> None:
+    token_path = tmp_path / "strava-token.enc"
+    token_store = StravaTokenStore(token_path, "client-secret")
+    with FakeStrava(make_activities(5)) as fake:
+        _sync_against(fake, tmp_path, export_csv=False, token_store=token_store)
+        tokens = token_store.load_tokens()
+        assert tokens.access_token == "fake-access-token"
+        encrypted = token_path.read_bytes()
+
+        _sync_against(
+            fake,
+            tmp_path,
+            export_csv=False,
+            token_store=token_store,
+            refresh_token=tokens.refresh_token,
+            access_token=tokens.access_token,
+            expires_at=tokens.expires_at,
+        )
+        assert (fake.requests["token"], fake.requests["list"]) == (1, 2)
+    # nothing changed, so nothing is written (and committed by the workflow)
+    assert token_path.read_bytes() == encrypted
+
+
+def test_run_strava_sync_retries_transient_failures(tmp_path) -> None:
+    budget = RequestBudget(tmp_path / "rate-limit.json", reserve=0)
+    with FakeStrava(make_activities(25), error_rate=0.2, drop_rate=0.2) as fake:
+        stats = strava_sync.run_strava_sync(
+            client_id="client-id",
+            client_secret="client-secret",
+            refresh_token="refresh-token",
+            export_csv=False,
+            # one request at a time, so the seeded failures are repeatable
+            detail_workers=1,
+            budget=budget,
+            db_path=str(tmp_path / "data.db"),
+            requests_session=fake.mount(
+                budget.session(retries=5, sleep=lambda seconds: None)
+            ),
+        )
+        failures = fake.requests["error"] + fake.requests["dropped"]
+        assert failures > 0
+        assert stats["http_retries"] == failures
+        assert stats["created"] == 20
+        assert budget.state.long_usage == fake.requests["api"]
+
+
+def test_parse_backfill_range() -> None:
+    start, end = strava_sync.parse_backfill_range("2024-01-01..2024-12-31")
+    assert start == dt.datetime(2024, 1, 1, tzinfo=dt.timezone.utc)
+    # a plain end date includes that day
+    assert end == dt.datetime(2025, 1, 1, tzinfo=dt.timezone.utc)
+
+    assert strava_sync.parse_backfill_range("20240101..20241231") == (start, end)
+
+    _, end = strava_sync.parse_backfill_range("2024-01-01..2024-06-01T12:00:00+02:00")
+    assert end == dt.datetime(2024, 6, 1, 10, tzinfo=dt.timezone.utc)
+
+    with pytest.raises(argparse.ArgumentTypeError):
+        strava_sync.parse_backfill_range("2024-01-01")
+    with pytest.raises(argparse.ArgumentTypeError):
+        strava_sync.parse_backfill_range("2024-02-01..2024-01-01")
+
+
+def test_partition_days_must_be_positive(tmp_path) -> None:
+    assert strava_sync.parse_partition_days("7") == 7
+    for value in ("0", "-3", "week"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            strava_sync.parse_partition_days(value)
+
+    generator = Generator(str(tmp_path / "data.db"))
+    try:
+        with pytest.raises(ValueError, match="at least 1"):
+            generator.backfill(
+                dt.datetime(2025, 1, 1, tzinfo=dt.timezone.utc),
+                dt.datetime(2025, 2, 1, tzinfo=dt.timezone.utc),
+                partition_days=0,
+            )
+    finally:
+        generator.close()
+
+
+def test_backfilled_activities_reach_the_csv(tmp_path) -> None:
+    recent = make_activities(10)
+    older = make_activities(10, start=dt.datetime(2024, 3, 1, tzinfo=dt.timezone.utc))
+    for activity in older:
+        # uploaded before the recent ones, so they sort first in the CSV too
+        activity["id"] -= 1_000
+    with FakeStrava(older + recent) as fake:
+        _sync_against(fake, tmp_path)
+        # a range older than every row already in the CSV
+        backfill = strava_sync.parse_backfill_range("2024-03-01..2024-03-31")
+        stats = _sync_against(fake, tmp_path, backfill=backfill)
+    assert stats["created"] == 8
+    assert _csv_matches_db(tmp_path)
+    with closing(sqlite3.connect(tmp_path / "data.db")) as connection:
+        (stored,) = connection.execute("SELECT COUNT(*) FROM activities").fetchone()
+    assert stored == 16
+
+
+def test_backfill_resumes_partition_by_partition(tmp_path) -> None:
+    backfill = strava_sync.parse_backfill_range("2025-01-01..2025-02-19")
+    with FakeStrava(make_activities(50), rate_limits=(30, 1000)) as fake:
+        stats = _sync_against(
+            fake,
+            tmp_path,
+            export_csv=False,
+            detail_workers=3,
+            backfill=backfill,
+            partition_days=10,
+        )
+        assert stats["rate_limited"] == 1
+        assert fake.requests["rate_limited"] == 0
+
+        with closing(sqlite3.connect(tmp_path / "data.db")) as connection:
+            partitions = connection.execute(
+                "SELECT watermark, processed, finished_at FROM backfill_partitions"
+            ).fetchall()
+            (stored,) = connection.execute("SELECT COUNT(*) FROM activities").fetchone()
+        assert len(partitions) == 5
+        assert 0 < stored == stats["created"] < 40
+        unfinished = [row for row in partitions if row[2] is None]
+        assert unfinished
+
+        # a later run with budget to spare: only unfinished partitions are listed
+        fake.rate_limits = (600, 30_000)
+        (tmp_path / "rate-limit.json").unlink()
+        lists = fake.requests["list"]
+        stats = _sync_against(
+            fake,
+            tmp_path,
+            detail_workers=3,
+            backfill=backfill,
+            partition_days=10,
+        )
+        assert fake.requests["list"] - lists == len(unfinished)
+        assert stats["rate_limited"] == 0
+        assert stats["partitions"] == len(unfinished)
+
+    with closing(sqlite3.connect(tmp_path / "data.db")) as connection:
+        (stored,) = connection.execute("SELECT COUNT(*) FROM activities").fetchone()
+        (open_partitions,) = connection.execute(
+            "SELECT COUNT(*) FROM backfill_partitions WHERE finished_at IS NULL"
+        ).fetchone()
+    assert (stored, open_partitions) == (40, 0)
+    with open(tmp_path / "pushup_data.csv", newline="", encoding="utf-8") as csvfile:
+        assert len(list(csv.reader(csvfile))) == 41
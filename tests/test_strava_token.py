@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import pytest
 
-from pushup_page.strava_token import StravaTokenStore
+from pushup_page.strava_token import StravaTokens, StravaTokenStore
 
 
 def test_round_trip(tmp_path) -> None:
@@ -35,3 +35,22 @@ def test_requires_a_refresh_token(tmp_path) -> None:
 
     with pytest.raises(RuntimeError, match="Missing Strava refresh token"):
         store.load()
+
+
+def test_round_trip_with_access_token(tmp_path) -> None:
+    store = StravaTokenStore(tmp_path / "strava-token.enc", "client-secret")
+
+    store.save("refresh-token", "access-token", 1_767_225_600)
+
+    assert store.load_tokens() == StravaTokens(
+        "refresh-token", "access-token", 1_767_225_600
+    )
+    assert store.load() == "refresh-token"
+
+
+def test_loads_token_files_holding_only_the_refresh_token(tmp_path) -> None:
+    token_path = tmp_path / "strava-token.enc"
+    store = StravaTokenStore(token_path, "client-secret")
+    token_path.write_bytes(store._fernet.encrypt(b"refresh-token") + b"\n")
+
+    assert store.load_tokens() == StravaTokens("refresh-token")
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import pytest
+import requests
+
+from benchmarks.fake_strava import FakeStrava, make_activities
+from generator import Generator
+from pushup_page import strava_webhook
+from pushup_page.strava_webhook import (
+    DELETE,
+    UPSERT,
+    EventQueue,
+    WebhookServer,
+    WebhookWorker,
+)
+
+
+def _event(object_id: int, aspect_type: str = "create", **extra) -> dict:
+    return {
+        "object_type": "activity",
+        "object_id": object_id,
+        "aspect_type": aspect_type,
+        "owner_id": 1,
+        "subscription_id": 7,
+        "event_time": 1_735_716_600,
+        "updates": {},
+    } | extra
+
+
+def test_event_action() -> None:
+    assert strava_webhook.event_action(_event(1)) == UPSERT
+    assert strava_webhook.event_action(_event(1, "update")) == UPSERT
+    assert strava_webhook.event_action(_event(1, "delete")) == DELETE
+    assert strava_webhook.event_action(_event(1, object_type="athlete")) is None
+    assert strava_webhook.event_action(_event(1), subscription_id=8) is None
+
+
+def test_event_queue_keeps_the_last_action_per_activity() -> None:
+    queue = EventQueue()
+    queue.put(1, UPSERT)
+    queue.put(2, UPSERT)
+    queue.put(1, DELETE)
+    assert queue.take(timeout=0) == {2: UPSERT, 1: DELETE}
+    assert queue.take(timeout=0) == {}
+
+    queue.put(3, DELETE)
+    queue.requeue({3: UPSERT, 4: UPSERT})
+    assert queue.take(timeout=0) == {3: DELETE, 4: UPSERT}
+
+
+@pytest.fixture
+def receiver(tmp_path):
+    activities = make_activities(5)
+    with FakeStrava(activities) as fake:
+        generator = Generator(
+            str(tmp_path / "data.db"), detail_workers=1, requests_session=fake.session()
+        )
+        generator.set_strava_config("client-id", "client-secret", "refresh-token")
+        queue = EventQueue()
+        worker = WebhookWorker(generator, queue, settle=0)
+        server = WebhookServer(("127.0.0.1", 0), queue, "verify-me")
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        worker.start()
+        thread.start()
+        host, port = server.server_address[:2]
+        try:
+            yield fake, f"http://{host}:{port}/", worker
+        finally:
+            server.shutdown()
+            server.server_close()
+            worker.stop()
+            worker.join()
+            generator.close()
+
+
+def _post(url: str, worker: WebhookWorker, event: dict) -> None:
+    assert requests.post(url, json=event, timeout=5).status_code == 200
+    deadline = time.monotonic() + 5
+    while len(worker.queue) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # the batch is taken; the worker goes idle only once it is processed
+    worker.idle.clear()
+    assert worker.idle.wait(5)
+
+
+def _stored(db_path) -> list[tuple]:
+    with closing(sqlite3.connect(db_path)) as connection:
+        return connection.execute(
+            "SELECT run_id, count FROM activities ORDER BY run_id"
+        ).fetchall()
+
+
+def test_subscription_validation(receiver) -> None:
+    _, url, _ = receiver
+    params = {
+        "hub.mode": "subscribe",
+        "hub.challenge": "15f7d1a91c1f40f8a748fd134752feb3",
+        "hub.verify_token": "verify-me",
+    }
+    response = requests.get(url, params=params, timeout=5)
+    assert response.json() == {"hub.challenge": "15f7d1a91c1f40f8a748fd134752feb3"}
+
+    params["hub.verify_token"] = "wrong"
+    assert requests.get(url, params=params, timeout=5).status_code == 403
+
+
+def test_events_sync_only_the_named_activities(receiver, tmp_path) -> None:
+    fake, url, worker = receiver
+    first_id = fake.activities[0]["id"]
+
+    _post(url, worker, _event(first_id))
+    assert _stored(tmp_path / "data.db") == [(first_id, 40)]
+    assert (fake.requests["list"], fake.requests["detail"]) == (0, 1)
+
+    fake.activities[0]["description"] = "Total Reps: 45"
+    _post(url, worker, _event(first_id, "update"))
+    _post(url, worker, _event(fake.activities[4]["id"]))  # a run, not stored
+    assert _stored(tmp_path / "data.db") == [(first_id, 45)]
+
+    _post(url, worker, _event(first_id, "delete"))
+    assert _stored(tmp_path / "data.db") == []
+    with closing(sqlite3.connect(tmp_path / "data.db")) as connection:
+        (days,) = connection.execute("SELECT COUNT(*) FROM daily_totals").fetchone()
+    assert days == 0
+    assert fake.requests["detail"] == 3